@@ -0,0 +1,28 @@
+"""
+Benchmarks for the functionals package
+
+Each module in this package may be run as a script, e.g.
+
+    python -m functionals.benchmarks.dynamic
+"""
+
+import timeit
+
+
+def per_call(f, number, repeat=5):
+    """
+    return the best time in seconds per call of a nullary callable
+    """
+    return min(timeit.repeat(f, number=number, repeat=repeat)) / number
+
+
+def report(title, rows, baseline=None):
+    """
+    print (name, seconds) rows in nanoseconds, relative to a baseline time
+    """
+    print(title)
+    for name, seconds in rows:
+        line = "  {:<40} {:>12.1f} ns".format(name, seconds * 1e9)
+        if baseline is not None:
+            line += "  {:>6.2f}x".format(seconds / baseline)
+        print(line)
@@ -0,0 +1,37 @@
+"""
+Per-call overhead of Memoizer cache hits compared to a bare function call
+"""
+
+from functionals.benchmarks import per_call, report
+from functionals.dynamic import Memoizer, SynchronizedMemoizer
+from functionals.keys import frozen_key
+
+NUMBER = 200000
+
+
+def bare(a, b=2):
+    return a
+
+
+def main():
+    memoized = Memoizer.decorate(bare)
+    normalized = Memoizer.configure(normalize=True)(bare)
+    keyed = Memoizer.configure(key=frozen_key)(bare)
+    synchronized = SynchronizedMemoizer.decorate(bare)
+    items = [1, 2, 3]
+
+    baseline = per_call(lambda: bare(1, 2), NUMBER)
+    report("cache hit overhead", [
+        ("bare call", baseline),
+        ("positional", per_call(lambda: memoized(1, 2), NUMBER)),
+        ("keyword", per_call(lambda: memoized(1, b=2), NUMBER)),
+        ("normalized positional", per_call(lambda: normalized(1, 2), NUMBER)),
+        ("normalized keyword", per_call(lambda: normalized(1, b=2), NUMBER)),
+        ("frozen_key with a list", per_call(lambda: keyed(items), NUMBER)),
+        ("synchronized positional",
+         per_call(lambda: synchronized(1, 2), NUMBER)),
+    ], baseline=baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""
+Cost of deep pseudo-recursion compared to native recursion
+
+The trampoline is compared against native python recursion (run in a thread
+with a large stack) and against the original queue-based RecursiveCaller
+which is kept here as LegacyRecursiveCaller for reference. The per-step
+overhead is also measured separately for functions which retire with
+"return" and with retire (which since PEP 479 costs an extra exception).
+"""
+
+import sys
+import threading
+import time
+
+from functionals.benchmarks import report
+from functionals.recursive import (Recursor, RecursiveCaller, retire,
+                                   retired_value)
+
+DEPTHS = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]
+STEP_DEPTH = 10 ** 5
+
+
+class LegacyRecursiveCaller(RecursiveCaller):
+    """
+    The original RecursiveCaller which kept its calls in queues and found
+    their generators and callers in dicts keyed by iterator
+    """
+    def __init__(self, recursor, input_args, input_kwargs):
+        super().__init__(recursor, input_args, input_kwargs)
+        self.call_requests = []
+        self.return_requests = []
+        self.returns_to = {}
+        self.generator_of = {}
+
+    def recurse(self):
+        generator = self.recursor.get_successor()
+        iterator = generator(*self.input_args, **self.input_kwargs)
+        self.returns_to[iterator] = None
+        self.generator_of[iterator] = generator
+        self.append_next_request(iterator, None)
+
+        while True:
+            while self.call_requests:
+                iterator, req = self.call_requests.pop(0)
+                req = self._canonicalize_request(req)
+                generator = self.generator_of[iterator]
+                next_generator = self.recursor.get_successor(generator)
+                next_iterator = next_generator(*req.args, **req.kwargs)
+                self.generator_of[next_iterator] = next_generator
+                self.returns_to[next_iterator] = iterator
+                self.append_next_request(next_iterator, None)
+            while self.return_requests:
+                iterator, value = self.return_requests.pop(0)
+                if iterator is None:
+                    return value
+                self.append_next_request(iterator, value)
+
+    def append_next_request(self, iterator, value):
+        try:
+            self.call_requests.append((iterator, iterator.send(value)))
+        except (StopIteration, RuntimeError) as e:
+            self.return_requests.append((self.returns_to.pop(iterator),
+                                         retired_value(e)))
+            del self.generator_of[iterator]
+
+
+class LegacyRecursor(Recursor):
+    def recurse(self, *args, **kwargs):
+        args, kwargs = self.preprocess(args, kwargs)
+        return LegacyRecursiveCaller(self, args, kwargs).recurse()
+
+
+def count_down(n):
+    if n == 0:
+        retire(0)
+    retire(1 + (yield n - 1))
+
+
+def returning_count_down(n):
+    if n == 0:
+        return 0
+    return 1 + (yield n - 1)
+
+
+def native_count_down(n):
+    if n == 0:
+        return 0
+    return 1 + native_count_down(n - 1)
+
+
+def run_native(n):
+    """
+    time native recursion to depth n or return None if it is not possible
+    """
+    result = {}
+
+    def run():
+        start = time.perf_counter()
+        try:
+            native_count_down(n)
+        except (RecursionError, MemoryError):
+            return
+        result['seconds'] = time.perf_counter() - start
+
+    limit = sys.getrecursionlimit()
+    stack_size = threading.stack_size()
+    sys.setrecursionlimit(n + 100)
+    threading.stack_size(2 ** 29)
+    try:
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+    finally:
+        threading.stack_size(stack_size)
+        sys.setrecursionlimit(limit)
+    return result.get('seconds')
+
+
+def run(f, n, repeat=1):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        assert f(n) == n
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    trampoline = Recursor(count_down)
+    legacy = LegacyRecursor(count_down)
+    for depth in DEPTHS:
+        native = run_native(depth)
+        rows = [("trampoline", run(trampoline, depth)),
+                ("legacy trampoline", run(legacy, depth))]
+        if native is None:
+            rows.insert(0, ("native (recursion limit reached)", float('nan')))
+        else:
+            rows.insert(0, ("native", native))
+        report("depth {}".format(depth),
+               [(name, seconds / depth) for name, seconds in rows],
+               baseline=native and native / depth)
+
+    native = run_native(STEP_DEPTH) / STEP_DEPTH
+    report("per-step overhead at depth {}".format(STEP_DEPTH), [
+        ("native", native),
+        ("trampoline, return",
+         run(Recursor(returning_count_down), STEP_DEPTH, 5) / STEP_DEPTH),
+        ("trampoline, retire", run(trampoline, STEP_DEPTH, 5) / STEP_DEPTH),
+    ], baseline=native)
+
+
+if __name__ == '__main__':
+    main()
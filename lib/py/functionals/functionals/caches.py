@@ -0,0 +1,323 @@
+"""
+Memo tables with pluggable eviction policies
+
+A cache maps keys to previously computed values and counts its hits, misses,
+and evictions so that its size can be tuned from real workloads. Every
+policy in this module does its bookkeeping in O(1) per lookup, store, and
+eviction.
+"""
+
+import sys
+import time
+from collections import OrderedDict
+
+
+MISSING = object()
+
+
+class Cache(object):
+    """
+    An unbounded memo table
+
+    Cache is also the base class for eviction policies. A policy overrides
+    the _get/_set/_delete primitives to maintain its own bookkeeping, is_full
+    to say when entries must be evicted, and _pop_victim to remove the entry
+    that the policy would evict next.
+    """
+    def __init__(self):
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def lookup(self, key, default=MISSING, valid=None):
+        """
+        return the value stored for a key or default if there is none
+
+        If valid is given, a stored value for which it returns False is
+        stale: its entry is discarded and the lookup counts as a miss.
+        """
+        try:
+            value = self._get(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        if valid is not None and not valid(value):
+            self.discard(key)
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def store(self, key, value):
+        """
+        store a value for a key, evicting other entries if necessary
+        """
+        self._set(key, value)
+        while self.entries and self.is_full():
+            self.evict()
+
+    def evict(self):
+        """
+        evict the entry chosen by the eviction policy
+        """
+        self._pop_victim()
+        self.evictions += 1
+
+    def discard(self, key):
+        """
+        remove the entry for a key if there is one
+        """
+        if key in self.entries:
+            self._delete(key)
+
+    def discard_matching(self, predicate):
+        """
+        remove the entries whose keys satisfy a predicate
+        """
+        for key in [key for key in self.entries if predicate(key)]:
+            self._delete(key)
+
+    def clear(self):
+        """
+        remove all entries without counting them as evictions
+        """
+        for key in list(self.entries):
+            self._delete(key)
+
+    def is_full(self):
+        return False
+
+    def _get(self, key):
+        return self.entries[key]
+
+    def _set(self, key, value):
+        self.entries[key] = value
+
+    def _delete(self, key):
+        del self.entries[key]
+
+    def _pop_victim(self):
+        raise NotImplementedError
+
+
+class LRUCache(Cache):
+    """
+    A cache holding at most maxsize entries which evicts the least recently
+    used entry first
+    """
+    def __init__(self, maxsize=128):
+        super().__init__()
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+
+    def is_full(self):
+        return len(self.entries) > self.maxsize
+
+    def _get(self, key):
+        value = self.entries[key]
+        self.entries.move_to_end(key)
+        return value
+
+    def _set(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+
+    def _pop_victim(self):
+        self.entries.popitem(last=False)
+
+
+class SizeBoundedCache(LRUCache):
+    """
+    A least recently used cache bounded by an estimate of its size in bytes
+
+    The size of an entry is estimated with sizeof (by default the shallow
+    sys.getsizeof of the value) when it is stored.
+    """
+    def __init__(self, maxbytes, sizeof=sys.getsizeof):
+        super().__init__(maxsize=None)
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self.sizes = {}
+        self.nbytes = 0
+
+    def is_full(self):
+        return self.nbytes > self.maxbytes
+
+    def _set(self, key, value):
+        size = self.sizeof(value)
+        self.nbytes += size - self.sizes.get(key, 0)
+        self.sizes[key] = size
+        super()._set(key, value)
+
+    def _delete(self, key):
+        super()._delete(key)
+        self.nbytes -= self.sizes.pop(key)
+
+    def _pop_victim(self):
+        key, _value = self.entries.popitem(last=False)
+        self.nbytes -= self.sizes.pop(key)
+
+
+class TTLCache(Cache):
+    """
+    A cache whose entries expire ttl seconds after they are stored
+
+    Since every entry lives for the same amount of time, entries expire in
+    the order they were stored so expired entries are always found at the
+    front of the table. A maxsize may also be given in which case the oldest
+    entries are evicted first.
+    """
+    def __init__(self, ttl, maxsize=None, clock=time.monotonic):
+        super().__init__()
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock
+        self.entries = OrderedDict()
+
+    def is_full(self):
+        return self.maxsize is not None and len(self.entries) > self.maxsize
+
+    def _get(self, key):
+        expires, value = self.entries[key]
+        if expires <= self.clock():
+            del self.entries[key]
+            self.evictions += 1
+            raise KeyError(key)
+        return value
+
+    def _set(self, key, value):
+        now = self.clock()
+        self.entries[key] = (now + self.ttl, value)
+        self.entries.move_to_end(key)
+        self._expire(now)
+
+    def _expire(self, now):
+        while self.entries:
+            expires, _value = next(iter(self.entries.values()))
+            if expires > now:
+                break
+            self.evict()
+
+    def _pop_victim(self):
+        self.entries.popitem(last=False)
+
+
+class LFUCache(Cache):
+    """
+    A cache holding at most maxsize entries which evicts the least frequently
+    used entry first (and the least recently used among those)
+
+    Keys are kept in buckets by use count along with the smallest count in
+    use so that the victim is found without searching.
+    """
+    def __init__(self, maxsize=128):
+        super().__init__()
+        self.maxsize = maxsize
+        self.counts = {}
+        self.buckets = {}
+        self.min_count = 0
+
+    def store(self, key, value):
+        # make room before inserting so a new key is not its own victim
+        if key not in self.entries:
+            while self.entries and len(self.entries) >= self.maxsize:
+                self.evict()
+        self._set(key, value)
+
+    def _get(self, key):
+        value = self.entries[key]
+        self._touch(key)
+        return value
+
+    def _set(self, key, value):
+        if key in self.entries:
+            self._touch(key)
+        else:
+            self.counts[key] = 1
+            self.buckets.setdefault(1, OrderedDict())[key] = None
+            self.min_count = 1
+        self.entries[key] = value
+
+    def _delete(self, key):
+        del self.entries[key]
+        self._unbucket(key, self.counts.pop(key))
+
+    def _touch(self, key):
+        count = self.counts[key]
+        self._unbucket(key, count)
+        if self.min_count == count and count not in self.buckets:
+            self.min_count = count + 1
+        self.counts[key] = count + 1
+        self.buckets.setdefault(count + 1, OrderedDict())[key] = None
+
+    def _unbucket(self, key, count):
+        bucket = self.buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[count]
+
+    def _pop_victim(self):
+        if self.min_count not in self.buckets:
+            # only stale after a discard or an eviction that was not
+            # followed by a store
+            self.min_count = min(self.buckets)
+        bucket = self.buckets[self.min_count]
+        key, _ = bucket.popitem(last=False)
+        if not bucket:
+            del self.buckets[self.min_count]
+        del self.entries[key]
+        del self.counts[key]
+
+
+class TieredCache(Cache):
+    """
+    A cache made of several tiers which are consulted in order
+
+    Typically a small, fast tier (e.g. an LRUCache) sits in front of a large,
+    slow one (e.g. a cache persisted on disk). A value found in a later tier
+    is promoted to every tier in front of it and values are stored in all
+    tiers. Each tier applies its own eviction policy and keeps its own
+    statistics while the hits and misses of the TieredCache are those of the
+    tiers as a whole.
+    """
+    def __init__(self, *tiers):
+        super().__init__()
+        self.tiers = tiers
+
+    def __len__(self):
+        return len(self.tiers[-1])
+
+    def __contains__(self, key):
+        return any(key in tier for tier in self.tiers)
+
+    def store(self, key, value):
+        for tier in self.tiers:
+            tier.store(key, value)
+
+    def discard(self, key):
+        for tier in self.tiers:
+            tier.discard(key)
+
+    def discard_matching(self, predicate):
+        for tier in self.tiers:
+            tier.discard_matching(predicate)
+
+    def clear(self):
+        for tier in self.tiers:
+            tier.clear()
+
+    def _get(self, key):
+        for depth, tier in enumerate(self.tiers):
+            value = tier.lookup(key)
+            if value is not MISSING:
+                for front_tier in self.tiers[:depth]:
+                    front_tier.store(key, value)
+                return value
+        raise KeyError(key)
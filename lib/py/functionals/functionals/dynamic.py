@@ -2,21 +2,142 @@
 Tools for dynamic programming
 """
 
-from functionals.wrappers import OptionlessDecorator
+import asyncio
+import threading
+from concurrent.futures import Future
 
+from functionals.caches import Cache, MISSING
+from functionals.keys import make_key, SignatureKeyMaker, user_key_maker
+from functionals.wrappers import ConfigurableDecorator
 
-class Memoizer(OptionlessDecorator):
+
+class Memoizer(ConfigurableDecorator):
     """
     A decorator for memoizing functions
+
+    Results are kept in a cache from functionals.caches. By default the cache
+    is unbounded but a bounded one may be configured instead, e.g.
+
+        @Memoizer.configure(cache=LRUCache(maxsize=1024))
+        def f(x):
+            ...
+
+    The hits, misses and evictions of the cache are available on the
+    decorator itself.
+
+    By default calls are keyed on their arguments as given. With
+    normalize=True arguments are first bound to the function's signature so
+    that f(1, b=2) and f(1, 2) share a result. Alternatively a key function,
+    called with the same arguments as the memoized function, may compute the
+    key itself (see functionals.keys.frozen_key for unhashable arguments).
     """
-    def __init__(self, f):
+    def __init__(self, f, cache=None, key=None, normalize=False):
         super().__init__(f)
-        self.previous = {}
+        self.cache = Cache() if cache is None else cache
+        if key is not None:
+            self.make_key = user_key_maker(key)
+        elif normalize:
+            self.make_key = SignatureKeyMaker(f)
+        else:
+            self.make_key = make_key
 
     def __call__(self, *args, **kwargs):
-        key = args, frozenset(kwargs.items())
-        if key in self.previous:
-            return self.previous[key]
-        result = self.f(*args, **kwargs)
-        self.previous[key] = result
+        key = self.make_key(args, kwargs)
+        result = self.cache.lookup(key)
+        if result is MISSING:
+            result = self.f(*args, **kwargs)
+            self.cache.store(key, result)
+        return result
+
+    @property
+    def hits(self):
+        return self.cache.hits
+
+    @property
+    def misses(self):
+        return self.cache.misses
+
+    @property
+    def evictions(self):
+        return self.cache.evictions
+
+
+class SynchronizedMemoizer(Memoizer):
+    """
+    A Memoizer which may be called from many threads at once
+
+    All access to the cache is serialized with a lock. Calls are also
+    single-flight: the first caller for a key computes the result while later
+    callers for the same key block until it is available (or re-raise the
+    exception the first caller got, in which case nothing is cached).
+    """
+    def __init__(self, f, **options):
+        super().__init__(f, **options)
+        self.lock = threading.Lock()
+        self.in_flight = {}
+
+    def __call__(self, *args, **kwargs):
+        key = self.make_key(args, kwargs)
+        with self.lock:
+            result = self.cache.lookup(key)
+            if result is not MISSING:
+                return result
+            leading = key not in self.in_flight
+            if leading:
+                self.in_flight[key] = threading.get_ident(), Future()
+            thread, flight = self.in_flight[key]
+
+        if not leading:
+            if thread == threading.get_ident():
+                # a call re-entering itself can not wait on its own result
+                return self.f(*args, **kwargs)
+            return flight.result()
+
+        try:
+            result = self.f(*args, **kwargs)
+        except BaseException as e:
+            with self.lock:
+                del self.in_flight[key]
+            flight.set_exception(e)
+            raise
+
+        with self.lock:
+            self.cache.store(key, result)
+            del self.in_flight[key]
+        flight.set_result(result)
+        return result
+
+
+class AsyncMemoizer(Memoizer):
+    """
+    A Memoizer for coroutine functions
+
+    Calling the decorator returns a coroutine whose awaited result is the
+    awaited result of the memoized function, which is what gets cached.
+    Concurrent awaits for the same key share a single task so the function
+    is only awaited once. If that task fails nothing is cached and every
+    waiter gets the exception.
+    """
+    def __init__(self, f, **options):
+        super().__init__(f, **options)
+        self.in_flight = {}
+
+    async def __call__(self, *args, **kwargs):
+        key = self.make_key(args, kwargs)
+        result = self.cache.lookup(key)
+        if result is not MISSING:
+            return result
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._compute(key, args, kwargs))
+            self.in_flight[key] = task
+        # a waiter that is cancelled must not cancel the other waiters
+        return await asyncio.shield(task)
+
+    async def _compute(self, key, args, kwargs):
+        try:
+            result = await self.f(*args, **kwargs)
+        finally:
+            del self.in_flight[key]
+        self.cache.store(key, result)
         return result
@@ -1,3 +1,4 @@
+from functionals.caches import LRUCache
 from functionals.dynamic import Memoizer
 
 
@@ -6,3 +7,10 @@ def fib(n):
     if n in [0, 1]:
         return n
     return fib(n-1) + fib(n-2)
+
+
+@Memoizer.configure(cache=LRUCache(maxsize=3))
+def bounded_fib(n):
+    if n in [0, 1]:
+        return n
+    return bounded_fib(n-1) + bounded_fib(n-2)
@@ -2,7 +2,9 @@
 Example uses of the functionals.recursive module
 """
 
-from functionals.recursive import CyclicRecursor, retire, Recursor
+from functionals.caches import Cache
+from functionals.recursive import (CyclicRecursor, recurse_all, retire,
+                                   Recursor)
 
 
 class MetaCircularEvaluator(CyclicRecursor):
@@ -30,9 +32,7 @@ class MetaCircularEvaluator(CyclicRecursor):
         Make a recursive call to the eval function for each part in the
         expression and make the corresponding function call
         """
-        evaluated = []
-        for part in expression:
-            evaluated.append((yield part))
+        evaluated = yield recurse_all(*expression)
         retire(evaluated[0](*evaluated[1:]))
 
     def __init__(self, eval_function=lisp_eval, apply_function=lisp_apply):
@@ -60,3 +60,25 @@ def fib(n):
     if n in [0, 1]:
         retire(n)
     retire((yield n-1) + (yield n-2))
+
+
+@Recursor.decorate
+def batch_fib(n):
+    """
+    An example of making independent recursive calls which may be evaluated
+    in parallel
+    """
+    if n in [0, 1]:
+        retire(n)
+    left, right = yield recurse_all(n-1, n-2)
+    retire(left + right)
+
+
+@Recursor.configure(memo=Cache())
+def memo_fib(n):
+    """
+    An example of pseudo-recursive dynamic programming
+    """
+    if n in [0, 1]:
+        retire(n)
+    retire((yield n-1) + (yield n-2))
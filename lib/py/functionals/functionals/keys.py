@@ -0,0 +1,97 @@
+"""
+Tools for building cache keys from the arguments of a call
+
+A key maker is a callable taking the positional argument tuple and keyword
+argument dict of a call and returning a hashable key for it.
+"""
+
+import inspect
+
+
+class KwargsMark(object):
+    """
+    The type of the marker separating positional from keyword arguments in a
+    key (there is only ever one instance, KWARGS_MARK)
+    """
+    def __repr__(self):
+        return 'KWARGS_MARK'
+
+    def __reduce__(self):
+        return 'KWARGS_MARK'
+
+
+KWARGS_MARK = KwargsMark()
+
+
+def make_key(args, kwargs):
+    """
+    make the key for a call from its arguments as given
+
+    Calls without keyword arguments (the common case) use their argument
+    tuple as the key so no allocation is needed.
+    """
+    if not kwargs:
+        return args
+    return args + (KWARGS_MARK, frozenset(kwargs.items()))
+
+
+class SignatureKeyMaker(object):
+    """
+    A key maker which normalizes arguments against a function's signature
+
+    Arguments are bound to the function's parameters and defaults are filled
+    in so that calls such as f(1, b=2), f(1, 2) and (if the default of b is
+    2) f(1) share a key. Calls which only pass every positional parameter
+    positionally skip the binding.
+    """
+    positional_kinds = (inspect.Parameter.POSITIONAL_ONLY,
+                        inspect.Parameter.POSITIONAL_OR_KEYWORD)
+
+    def __init__(self, f):
+        self.signature = inspect.signature(f)
+        kinds = [param.kind for param in self.signature.parameters.values()]
+        if all(kind in self.positional_kinds or
+               kind == inspect.Parameter.VAR_KEYWORD for kind in kinds):
+            self.npositional = sum(kind in self.positional_kinds
+                                   for kind in kinds)
+        else:
+            self.npositional = None
+
+    def __call__(self, args, kwargs):
+        if not kwargs and len(args) == self.npositional:
+            return args
+        bound = self.signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        return make_key(bound.args, bound.kwargs)
+
+
+def user_key_maker(key):
+    """
+    adapt a key function, called like the memoized function, to a key maker
+    """
+    def make_user_key(args, kwargs):
+        return key(*args, **kwargs)
+    return make_user_key
+
+
+def freeze(o):
+    """
+    return a hashable equivalent of lists, dicts, and sets (recursively)
+    """
+    if isinstance(o, (list, tuple)):
+        return tuple(map(freeze, o))
+    if isinstance(o, dict):
+        return frozenset((key, freeze(value)) for key, value in o.items())
+    if isinstance(o, (set, frozenset)):
+        return frozenset(map(freeze, o))
+    return o
+
+
+def frozen_key(*args, **kwargs):
+    """
+    a key function for calls with unhashable arguments (see freeze)
+
+    Note that a list and a tuple with the same items get the same key.
+    """
+    return make_key(freeze(args),
+                    {name: freeze(value) for name, value in kwargs.items()})
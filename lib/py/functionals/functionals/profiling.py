@@ -0,0 +1,146 @@
+"""
+Tools for seeing where pseudo-recursive evaluations spend their time
+"""
+
+import time
+from collections import Counter
+
+
+class RecursionProfiler(object):
+    """
+    Records statistics about the evaluations of a CyclicRecursor
+
+    A profiler is attached with the recursor's profiler option, e.g.
+
+        profiler = RecursionProfiler()
+
+        @Recursor.configure(profiler=profiler)
+        def f(n):
+            ...
+
+    and accumulates, over every evaluation of the recursor, the number of
+    frames created for each generator, the time spent in each generator's
+    frames (its "time") and the time from the entry of the outermost frame of
+    a generator to its retirement (its "cumulative time"), the maximum depth
+    of the pseudo-recursion, and the peak number of frames alive at once
+    (which also counts the frames evaluating batches). Recursors without a
+    profiler do not pay for any of this. The requests of batches evaluated
+    in an executor (see CyclicRecursor.recurse_in) are not profiled, their
+    time being that of the frame waiting for them.
+
+    Time is also recorded per stack of generators so that it can be exported
+    in the collapsed-stack format read by flamegraph tools. Recursion is
+    folded in these stacks: a generator which is already on the stack brings
+    it back to that generator's position rather than growing it, so
+    f;g;f;g is recorded as f;g.
+    """
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.calls = Counter()
+        self.times = Counter()
+        self.cumulative_times = Counter()
+        self.max_depth = 0
+        self.peak_frames = 0
+
+        # stack nodes are (parent node, generator) pairs with the root at 0
+        self.nodes = [(None, None)]
+        self.children = {}
+        self.folds = [{}]
+        self.node_times = Counter()
+        self.start()
+
+    def start(self):
+        """
+        reset the state of the evaluation in progress
+        """
+        self.path = []
+        self.depth = 0
+        self.active = Counter()
+        self.entered = {}
+
+    def enter(self, generator, is_batch=False):
+        """
+        record the creation of a frame
+        """
+        parent = self.path[-1][0] if self.path else 0
+        if is_batch:
+            self.path.append((parent, None))
+        else:
+            node = (self.folds[parent].get(generator) or
+                    self.children.get((parent, generator)) or
+                    self._add_node(parent, generator))
+            self.path.append((node, generator))
+            self.calls[generator] += 1
+            self.depth += 1
+            self.max_depth = max(self.max_depth, self.depth)
+            if not self.active[generator]:
+                self.entered[generator] = self.clock()
+            self.active[generator] += 1
+        self.peak_frames = max(self.peak_frames, len(self.path))
+
+    def exit(self):
+        """
+        record the retirement of the newest frame
+        """
+        _node, generator = self.path.pop()
+        if generator is None:
+            return
+        self.depth -= 1
+        self.active[generator] -= 1
+        if not self.active[generator]:
+            self.cumulative_times[generator] += (self.clock() -
+                                                 self.entered.pop(generator))
+
+    def spend(self, seconds):
+        """
+        record time spent in the newest frame
+        """
+        node = self.path[-1][0]
+        self.node_times[node] += seconds
+        self.times[self.nodes[node][1]] += seconds
+
+    def _add_node(self, parent, generator):
+        node = len(self.nodes)
+        self.nodes.append((parent, generator))
+        self.children[parent, generator] = node
+        folds = dict(self.folds[parent])
+        folds[generator] = node
+        self.folds.append(folds)
+        return node
+
+    def stack_of(self, node):
+        """
+        return the names of the generators on the stack of a node
+        """
+        names = []
+        while node:
+            node, generator = self.nodes[node]
+            names.append(generator.__qualname__)
+        return names[::-1]
+
+    def as_dict(self):
+        """
+        export the statistics as a dict
+        """
+        return {
+            'generators': {
+                generator.__qualname__: {
+                    'calls': self.calls[generator],
+                    'time': self.times[generator],
+                    'cumulative_time': self.cumulative_times[generator],
+                }
+                for generator in self.calls
+            },
+            'max_depth': self.max_depth,
+            'peak_frames': self.peak_frames,
+        }
+
+    def collapsed_stacks(self):
+        """
+        export the time spent per stack in the collapsed-stack format, one
+        "f;g;h microseconds" line per stack
+        """
+        return "".join(
+            "{} {}\n".format(";".join(self.stack_of(node)),
+                             int(seconds * 1e6))
+            for node, seconds in sorted(self.node_times.items()) if node)
@@ -8,15 +8,22 @@ a pseudo-recursive one a programmer may run the function without an explicit
 recursion depth limit using the tools in this module.
 """
 
-from contextlib import contextmanager
+import copy
+import pickle
+import sys
+from concurrent.futures import ThreadPoolExecutor
 
-from functionals.wrappers import OptionlessDecorator
+from functionals.caches import MISSING
+from functionals.keys import make_key
+from functionals.wrappers import ConfigurableDecorator
 
 
 class CallRequest(object):
     """
     A canonical representation of a function's request for a recursive call
     """
+    __slots__ = ('args', 'kwargs')
+
     def __init__(self, *args, **kwargs):
         self.args = args
         self.kwargs = kwargs
@@ -29,91 +36,325 @@ def recurse(*args, **kwargs):
     return CallRequest(*args, **kwargs)
 
 
+class BatchRequest(object):
+    """
+    A request for several independent recursive calls
+    """
+    __slots__ = ('requests', )
+
+    def __init__(self, requests):
+        self.requests = requests
+
+
+def recurse_all(*requests):
+    """
+    Create a request for several independent recursive calls
+
+    Each request may be a CallRequest (see recurse) or a single argument. The
+    values of the calls are sent back together as a tuple in the same order.
+    The calls may be evaluated in parallel (see CyclicRecursor.recurse_in).
+    """
+    return BatchRequest(requests)
+
+
 def retire(value):
     """
     The equivalent of "return" for a pseudo-recursive definition
+
+    Since PEP 479 a plain return statement is noticeably cheaper since the
+    StopIteration raised here is re-raised as a RuntimeError.
     """
     raise StopIteration(value)
 
 
+# deprecated: recursions no longer raise this (RecursiveCaller.recurse
+# returns the original call's value) but the name is kept for code which
+# catches it
 class StopRecursion(StopIteration):
     """
-    Raised when the original function call has retired
+    Formerly raised when the original function call had retired
     """
     pass
 
 
+def retired_value(error):
+    """
+    return the value a generator retired with from the error it raised
+
+    Since PEP 479 the StopIteration raised by retire inside a generator
+    reaches the caller as the cause of a RuntimeError. Any other error is
+    re-raised.
+    """
+    if isinstance(error, StopIteration):
+        return error.value
+    if isinstance(error.__cause__, StopIteration):
+        return error.__cause__.value
+    raise error
+
+
+def gather(requests):
+    """
+    A pseudo-recursive function which evaluates a batch of requests in turn
+    """
+    values = []
+    for request in requests:
+        values.append((yield request))
+    return tuple(values)
+
+
+def evaluate(recursor, generator_index, args, kwargs, executor=None,
+             split_depth=1):
+    """
+    Evaluate a single request of a batch (e.g. in an executor's worker)
+
+    Batches requested by the evaluation itself are evaluated in the
+    executor if one is given (see RecursiveCaller.call_all) and in turn
+    otherwise. split_depth is the number of batches the request is nested
+    in. The memo table is not used since the evaluations of a batch run at
+    the same time and memo tables are not thread-safe; the caller which
+    submitted the batch consults and fills it instead. Neither is the
+    profiler, whose state is that of a single evaluation, so the time spent
+    in the workers is recorded as time of the frame which submitted the
+    batch.
+    """
+    generator = recursor.generators[generator_index]
+    return RecursiveCaller(recursor, args, kwargs, generator, executor,
+                           memo=None, profiler=None,
+                           split_depth=split_depth).recurse()
+
+
+gather_code = gather.__code__
+
+
 class RecursiveCaller(object):
     """
     Manages a single call to a pseudo-recursive function
+
+    Calls in progress are kept on an explicit continuation stack of frames.
+    Only the frame on top of the stack can make progress: it is resumed with
+    the value returned for its last request and either yields a new request,
+    in which case a frame for its successor is pushed on top of it, or
+    retires, in which case it is popped and its value is sent to the frame
+    beneath it. Every step takes constant time regardless of the depth of
+    the pseudo-recursion.
+
+    A frame is a (generator, iterator, key) tuple where key is the key under
+    which the value of the frame will be memoized, if any.
+
+    If the recursor has a memo table, requests already solved in it are
+    answered without creating a generator and every retired frame stores its
+    value in it.
+
+    The requests of a batch (see recurse_all) are evaluated in turn by a
+    frame of their own unless an executor is given, in which case each one
+    is evaluated in the executor and the frame waits for all of them.
+
+    If the recursor has a profiler (see functionals.profiling) the
+    evaluation runs in a separate, instrumented loop.
     """
-    def __init__(self, recursor, input_args, input_kwargs):
+    def __init__(self, recursor, input_args, input_kwargs, generator=None,
+                 executor=None, memo=MISSING, profiler=MISSING,
+                 split_depth=0):
         self.recursor = recursor
-        self.call_requests = []
-        self.return_requests = []
         self.input_args = input_args
         self.input_kwargs = input_kwargs
-        self.returns_to = {}
-        self.generator_of = {}
-
-    def call_and_log(self, generator, args, kwargs):
-        iterator = generator(*args, **kwargs)
-        self.generator_of[iterator] = generator
-        return iterator
+        self.generator = generator or recursor.get_successor()
+        self.executor = executor
+        self.split_depth = split_depth
+        self.stack = []
+        self.memo = recursor.memo if memo is MISSING else memo
+        self._worker_recursor = None
+        self.in_flight = set()
+        self.profiler = (recursor.profiler if profiler is MISSING
+                         else profiler)
 
     def recurse(self):
-        generator = self.recursor.get_successor()
-        iterator = self.call_and_log(generator,
-                                     self.input_args,
-                                     self.input_kwargs)
-
-        self.returns_to[iterator] = None
-        self.generator_of[iterator] = generator
-
-        self.append_next_request(iterator)
-
+        if self.profiler is not None:
+            return self._recurse_profiled()
+
+        # this loop runs once per pseudo-recursive step so it is inlined and
+        # binds everything it needs locally. The frame being resumed is kept
+        # in local variables and only its callers are kept on the stack.
+        stack = self.stack
+        push = stack.append
+        pop = stack.pop
+        successors = self.recursor.successors
+        fast = self.memo is None
+        requests = (CallRequest, BatchRequest)
+
+        value = self.call(self.generator, CallRequest(*self.input_args,
+                                                      **self.input_kwargs))
+        if not stack:
+            return value
+        generator, iterator, key = pop()
         while True:
             try:
-                self._do_call_requests()
-                self._do_return_requests()
-            except StopRecursion as s:
-                return s.value
-
-    def _do_call_requests(self):
-        while self.call_requests:
-            iterator, req = self.call_requests.pop(0)
-            req = self._canonicalize_request(req)
-            generator = self.generator_of[iterator]
-            next_generator = self.recursor.get_successor(generator)
-            next_iterator = next_generator(*req.args, **req.kwargs)
-            self.generator_of[next_iterator] = next_generator
-            self.returns_to[next_iterator] = iterator
-            self.append_next_request(next_iterator)
-
-    def _do_return_requests(self):
-        while self.return_requests:
-            iterator, value = self.return_requests.pop(0)
-            if iterator is None:
-                raise StopRecursion(value)
-            self.send_and_append_next_request(iterator, value)
-
-    @contextmanager
-    def check_for_retires(self, iterator):
-        try:
-            yield
-        except StopIteration as s:
-            self.return_requests.append((self.returns_to[iterator], s.value))
-            del self.returns_to[iterator]
-            del self.generator_of[iterator]
-
-    def append_next_request(self, iterator):
-        with self.check_for_retires(iterator):
-            self.call_requests.append((iterator, next(iterator)))
-
-    def send_and_append_next_request(self, iterator, value):
-        with self.check_for_retires(iterator):
-            next_request = iterator.send(value)
-            self.call_requests.append((iterator, next_request))
+                request = iterator.send(value)
+            except StopIteration as s:
+                value = s.value
+            except RuntimeError as e:
+                value = retired_value(e)
+            else:
+                next_generator = successors[generator]
+                if fast and not isinstance(request, requests):
+                    push((generator, iterator, key))
+                    generator = next_generator
+                    iterator = next_generator(request)
+                    key = None
+                    value = None
+                    continue
+                push((generator, iterator, key))
+                if isinstance(request, BatchRequest):
+                    value = self.call_all(generator, next_generator, request)
+                else:
+                    value = self.call(next_generator,
+                                      self._canonicalize_request(request))
+                generator, iterator, key = pop()
+                continue
+
+            if key is not None:
+                self.settle(key, value)
+            if not stack:
+                return value
+            generator, iterator, key = pop()
+
+    def _recurse_profiled(self):
+        stack = self.stack
+        successors = self.recursor.successors
+        profiler = self.profiler
+        clock = profiler.clock
+        profiler.start()
+
+        value = self.call(self.generator, CallRequest(*self.input_args,
+                                                      **self.input_kwargs))
+        if stack:
+            profiler.enter(self.generator)
+        while stack:
+            generator, iterator, key = stack[-1]
+            depth = len(stack)
+            start = clock()
+            try:
+                request = iterator.send(value)
+            except (StopIteration, RuntimeError) as e:
+                value = retired_value(e)
+                profiler.spend(clock() - start)
+                stack.pop()
+                profiler.exit()
+                if key is not None:
+                    self.settle(key, value)
+                continue
+
+            next_generator = successors[generator]
+            if isinstance(request, BatchRequest):
+                value = self.call_all(generator, next_generator, request)
+            else:
+                value = self.call(next_generator,
+                                  self._canonicalize_request(request))
+            profiler.spend(clock() - start)
+            if len(stack) > depth:
+                new_generator, new_iterator, _key = stack[-1]
+                profiler.enter(new_generator,
+                               is_batch=new_iterator.gi_code is gather_code)
+        return value
+
+    def settle(self, key, value):
+        """
+        memoize the value of a retired frame
+        """
+        self.memo.store(key, value)
+        self.in_flight.remove(key)
+
+    def call(self, generator, request):
+        """
+        push a frame for a request
+
+        Returns the value of the request if it is already in the memo table
+        and None otherwise.
+        """
+        key = None
+        if self.memo is not None:
+            key = self._memo_key(generator, request)
+            value = self.memo.lookup(key)
+            if value is not MISSING:
+                return value
+            # frames are evaluated depth first so a request that is still
+            # in flight can only have been made by one of its own callees
+            if key in self.in_flight:
+                raise RecursionError("Pseudo-recursive call depends on itself",
+                                     generator, request.args, request.kwargs)
+            self.in_flight.add(key)
+        iterator = generator(*request.args, **request.kwargs)
+        self.stack.append((generator, iterator, key))
+        return None
+
+    def call_all(self, generator, next_generator, batch):
+        """
+        push a frame for a batch of requests or, if there is an executor,
+        evaluate them in it and return their values
+        """
+        requests = list(map(self._canonicalize_request, batch.requests))
+        if self.executor is None:
+            # the batch frame poses as the requesting generator so that its
+            # requests go to the same successor
+            self.stack.append((generator, gather(requests), None))
+            return None
+
+        index = self.recursor.generators.index(next_generator)
+        values = [self._lookup(next_generator, request)
+                  for request in requests]
+        worker_recursor = self.worker_recursor()
+        # workers in threads submit their own batches to the same pool, up
+        # to the recursor's max_split_depth, but those in other processes
+        # can not reach it
+        split_depth = self.split_depth + 1
+        nested_executor = None
+        if (isinstance(self.executor, ThreadPoolExecutor) and
+                split_depth < self.recursor.max_split_depth):
+            nested_executor = self.executor
+        futures = {
+            i: self.executor.submit(evaluate, worker_recursor, index,
+                                    request.args, request.kwargs,
+                                    nested_executor, split_depth)
+            for i, request in enumerate(requests) if values[i] is MISSING
+        }
+        for i, future in futures.items():
+            if future.cancel():
+                # a request no worker has started is evaluated here rather
+                # than waited for, so that callers waiting in the pool's
+                # threads can not leave it without a thread to run it
+                values[i] = evaluate(worker_recursor, index, requests[i].args,
+                                     requests[i].kwargs, nested_executor,
+                                     split_depth)
+            else:
+                values[i] = future.result()
+            if self.memo is not None:
+                self.memo.store(self._memo_key(next_generator, requests[i]),
+                                values[i])
+        return tuple(values)
+
+    def worker_recursor(self):
+        """
+        return the recursor sent to the executor: a copy without the memo
+        table and profiler, which the workers do not use (see evaluate) and
+        which should not be pickled along with every request (recursors
+        pickled by reference are sent as they are)
+        """
+        if self._worker_recursor is None:
+            worker_recursor = copy.copy(self.recursor)
+            if worker_recursor is not self.recursor:
+                worker_recursor.memo = None
+                worker_recursor.profiler = None
+            self._worker_recursor = worker_recursor
+        return self._worker_recursor
+
+    def _lookup(self, generator, request):
+        if self.memo is None:
+            return MISSING
+        return self.memo.lookup(self._memo_key(generator, request))
+
+    @staticmethod
+    def _memo_key(generator, request):
+        return generator, make_key(request.args, request.kwargs)
 
     def _canonicalize_request(self, request):
         if isinstance(request, CallRequest):
@@ -139,14 +380,29 @@ class CyclicRecursor(object):
     second generator whose results are sent back to the first generator. Call
     requests from the second generator will result in calls to the third
     generator and so on.
+
+    A memo table (any cache from functionals.caches) may be given to share
+    the values of identical requests across and within calls, which makes
+    pseudo-recursive dynamic programming possible. A profiler (see
+    functionals.profiling) may be given to record statistics about calls.
     """
-    pack = lambda *args, **kwargs: (args, kwargs)
-    identity = lambda x: x
+    # how many levels of nested batches recurse_in spreads over a pool
+    max_split_depth = 4
+
+    # defined with def rather than lambda so that recursors can be pickled
+    def pack(*args, **kwargs):
+        return args, kwargs
+
+    def identity(x):
+        return x
 
-    def __init__(self, generators, preprocessor=pack, postprocessor=identity):
+    def __init__(self, generators, preprocessor=pack, postprocessor=identity,
+                 memo=None, profiler=None):
         self.generators = generators
         self.preprocessor = preprocessor
         self.postprocessor = postprocessor
+        self.memo = memo
+        self.profiler = profiler
         self.successors = {
             generators[i]: generators[i+1]
             for i in range(len(generators) - 1)
@@ -158,6 +414,27 @@ class CyclicRecursor(object):
         recursive_caller = RecursiveCaller(self, args, kwargs)
         return self.postprocessor(recursive_caller.recurse())
 
+    def recurse_in(self, executor, *args, **kwargs):
+        """
+        recurse, evaluating the requests of batches in an executor
+
+        With a thread pool the batches requested by the workers are also
+        evaluated in the pool, down to max_split_depth nested batches, below
+        which a worker evaluates the batches it requests in turn (since
+        submitting many small requests costs more than it gains).
+
+        With a process pool the recursor, arguments, and values must be
+        picklable (a decorated recursor must be defined at the top level of
+        a module) and memo tables are not shared with the workers. Workers
+        can not reach the pool so only the batches requested in this
+        process are spread over it: the parallelism is the width of those
+        batches and a worker evaluates the batches it requests in turn.
+        """
+        args, kwargs = self.preprocess(args, kwargs)
+        recursive_caller = RecursiveCaller(self, args, kwargs,
+                                           executor=executor)
+        return self.postprocessor(recursive_caller.recurse())
+
     def preprocess(self, args, kwargs):
         result = self.preprocessor(*args, **kwargs)
         if isinstance(result, tuple):
@@ -172,13 +449,43 @@ class CyclicRecursor(object):
         return self.successors.get(generator)
 
 
-class Recursor(CyclicRecursor, OptionlessDecorator):
+class Recursor(CyclicRecursor, ConfigurableDecorator):
     """
     A decorator denoting a pseudo-recursive function
+
+    Results may be memoized with Recursor.configure(memo=Cache()) and calls
+    profiled with Recursor.configure(profiler=RecursionProfiler()).
     """
-    def __init__(self, f):
-        CyclicRecursor.__init__(self, [f])
-        OptionlessDecorator.__init__(self, f)
+    def __init__(self, f, memo=None, profiler=None):
+        CyclicRecursor.__init__(self, [f], memo=memo, profiler=profiler)
+        ConfigurableDecorator.__init__(self, f)
 
     def __call__(self, *args, **kwargs):
         return self.recurse(*args, **kwargs)
+
+    def __reduce_ex__(self, protocol):
+        # a decorated function is pickled by reference, like any function
+        if '__wrapped__' in self.__dict__:
+            if not self._is_global():
+                raise pickle.PicklingError(
+                    "Recursor {}.{} can only be pickled (e.g. sent to a "
+                    "process pool) if it is defined at the top level of a "
+                    "module or class".format(self.__module__,
+                                             self.__qualname__))
+            return self.__qualname__
+        return super().__reduce_ex__(protocol)
+
+    def __copy__(self):
+        # likewise a decorated function is copied as itself
+        if '__wrapped__' in self.__dict__:
+            return self
+        copied = object.__new__(type(self))
+        copied.__dict__.update(self.__dict__)
+        return copied
+
+    def _is_global(self):
+        # whether the recursor is found under its qualified name
+        o = sys.modules.get(self.__module__)
+        for name in self.__qualname__.split('.'):
+            o = getattr(o, name, None)
+        return o is self
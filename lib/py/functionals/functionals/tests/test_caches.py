@@ -0,0 +1,163 @@
+from unittest import TestCase
+
+from functionals.caches import (Cache, LFUCache, LRUCache, MISSING,
+                                SizeBoundedCache, TieredCache, TTLCache)
+
+
+class CacheTestCase(TestCase):
+    def assertHolds(self, cache, keys):
+        self.assertEqual(set(cache.entries), set(keys))
+
+
+class UnboundedCaching(CacheTestCase):
+    def test_lookup_and_store(self):
+        cache = Cache()
+        self.assertIs(cache.lookup('a'), MISSING)
+        cache.store('a', None)
+        self.assertIsNone(cache.lookup('a'))
+        self.assertEqual((cache.hits, cache.misses, cache.evictions),
+                         (1, 1, 0))
+
+    def test_stale_values(self):
+        cache = Cache()
+        cache.store('a', 1)
+        self.assertIs(cache.lookup('a', valid=lambda value: value > 1),
+                      MISSING)
+        self.assertNotIn('a', cache)
+        cache.store('a', 2)
+        self.assertEqual(cache.lookup('a', valid=lambda value: value > 1), 2)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_discard_and_clear(self):
+        cache = Cache()
+        cache.store('a', 1)
+        cache.store('b', 2)
+        cache.discard('a')
+        cache.discard('missing')
+        self.assertHolds(cache, ['b'])
+        cache.store('ab', 3)
+        cache.discard_matching(lambda key: key.startswith('a'))
+        self.assertHolds(cache, ['b'])
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+
+class LRUEviction(CacheTestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.store('a', 1)
+        cache.store('b', 2)
+        cache.lookup('a')
+        cache.store('c', 3)
+        self.assertHolds(cache, ['a', 'c'])
+        self.assertEqual(cache.evictions, 1)
+
+    def test_size_bound(self):
+        cache = SizeBoundedCache(maxbytes=10, sizeof=len)
+        cache.store('a', 'xxxx')
+        cache.store('b', 'xxxx')
+        cache.store('c', 'xxxx')
+        self.assertHolds(cache, ['b', 'c'])
+        self.assertEqual(cache.nbytes, 8)
+        cache.store('b', 'x')
+        self.assertEqual(cache.nbytes, 5)
+        cache.discard('c')
+        self.assertEqual(cache.nbytes, 1)
+
+
+class TTLEviction(CacheTestCase):
+    def setUp(self):
+        self.now = 0
+        self.cache = TTLCache(ttl=10, clock=lambda: self.now)
+
+    def test_expired_entries_miss(self):
+        self.cache.store('a', 1)
+        self.now = 9
+        self.assertEqual(self.cache.lookup('a'), 1)
+        self.now = 10
+        self.assertIs(self.cache.lookup('a'), MISSING)
+        self.assertEqual(self.cache.evictions, 1)
+
+    def test_store_purges_expired_entries(self):
+        self.cache.store('a', 1)
+        self.now = 5
+        self.cache.store('b', 2)
+        self.now = 12
+        self.cache.store('c', 3)
+        self.assertHolds(self.cache, ['b', 'c'])
+
+    def test_maxsize(self):
+        cache = TTLCache(ttl=10, maxsize=1, clock=lambda: self.now)
+        cache.store('a', 1)
+        cache.store('b', 2)
+        self.assertHolds(cache, ['b'])
+
+
+class LFUEviction(CacheTestCase):
+    def test_evicts_least_frequently_used(self):
+        cache = LFUCache(maxsize=2)
+        cache.store('a', 1)
+        cache.store('b', 2)
+        cache.lookup('a')
+        cache.lookup('a')
+        cache.lookup('b')
+        cache.store('c', 3)
+        self.assertHolds(cache, ['a', 'c'])
+        cache.store('d', 4)
+        self.assertHolds(cache, ['a', 'd'])
+
+    def test_ties_evict_least_recently_used(self):
+        cache = LFUCache(maxsize=2)
+        cache.store('a', 1)
+        cache.store('b', 2)
+        cache.store('c', 3)
+        self.assertHolds(cache, ['b', 'c'])
+
+    def test_evict_after_discard(self):
+        cache = LFUCache(maxsize=3)
+        cache.store('a', 1)
+        cache.store('b', 2)
+        cache.lookup('b')
+        cache.discard('a')
+        cache.evict()
+        self.assertEqual(len(cache), 0)
+
+
+class TieredCaching(CacheTestCase):
+    def setUp(self):
+        self.front = LRUCache(maxsize=1)
+        self.back = Cache()
+        self.cache = TieredCache(self.front, self.back)
+
+    def test_stores_in_all_tiers(self):
+        self.cache.store('a', 1)
+        self.cache.store('b', 2)
+        self.assertHolds(self.front, ['b'])
+        self.assertHolds(self.back, ['a', 'b'])
+
+    def test_promotes_on_lookup(self):
+        self.cache.store('a', 1)
+        self.cache.store('b', 2)
+        self.assertEqual(self.cache.lookup('a'), 1)
+        self.assertHolds(self.front, ['a'])
+        self.assertIs(self.cache.lookup('c'), MISSING)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_stale_values(self):
+        self.cache.store('a', 1)
+        self.assertIs(self.cache.lookup('a', valid=lambda value: False),
+                      MISSING)
+        self.assertNotIn('a', self.cache)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 1))
+
+    def test_discard(self):
+        self.cache.store('a', 1)
+        self.cache.discard('a')
+        self.assertNotIn('a', self.cache)
+
+    def test_discard_matching(self):
+        for key in ['a', 'ab', 'b']:
+            self.cache.store(key, 1)
+        self.cache.discard_matching(lambda key: key.startswith('a'))
+        self.assertHolds(self.front, ['b'])
+        self.assertHolds(self.back, ['b'])
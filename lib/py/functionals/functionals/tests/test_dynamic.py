@@ -1,6 +1,13 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from unittest import TestCase
 
-from functionals.examples.dynamic import fib
+from functionals.dynamic import (AsyncMemoizer, Memoizer,
+                                 SynchronizedMemoizer)
+from functionals.examples.dynamic import bounded_fib, fib
+from functionals.keys import frozen_key
 
 
 class MemoizerTestCase(TestCase):
@@ -10,3 +17,154 @@ class MemoizerTestCase(TestCase):
 class BasicMemoization(MemoizerTestCase):
     def test_fib(self):
         self.assertEqual(354224848179261915075, fib(100))
+
+
+class BoundedMemoization(MemoizerTestCase):
+    def test_bounded_fib(self):
+        self.assertEqual(354224848179261915075, bounded_fib(100))
+        self.assertEqual(len(bounded_fib.cache), 3)
+
+    def test_counters(self):
+        bounded_fib.cache.clear()
+        before = bounded_fib.hits, bounded_fib.misses, bounded_fib.evictions
+        bounded_fib(10)
+        after = bounded_fib.hits, bounded_fib.misses, bounded_fib.evictions
+        self.assertEqual([b - a for a, b in zip(before, after)], [8, 11, 8])
+
+
+class KeyedMemoization(MemoizerTestCase):
+    def setUp(self):
+        self.calls = []
+
+    def record(self, a, b=2):
+        self.calls.append((a, b))
+        return len(self.calls)
+
+    def test_keyword_calls(self):
+        memoized = Memoizer.decorate(self.record)
+        self.assertEqual([memoized(1), memoized(1, 2), memoized(1, b=2),
+                          memoized(1, b=2)], [1, 2, 3, 3])
+
+    def test_normalized_calls(self):
+        memoized = Memoizer.configure(normalize=True)(self.record)
+        self.assertEqual([memoized(1), memoized(1, 2), memoized(1, b=2),
+                          memoized(a=1)], [1, 1, 1, 1])
+
+    def test_key_function(self):
+        memoized = Memoizer.configure(key=frozen_key)(self.record)
+        self.assertEqual([memoized([1]), memoized([1]), memoized({})],
+                         [1, 1, 2])
+
+
+class SynchronizedMemoization(MemoizerTestCase):
+    def setUp(self):
+        self.calls = []
+
+        @SynchronizedMemoizer.decorate
+        def slow_square(x):
+            self.calls.append(x)
+            time.sleep(0.05)
+            if x < 0:
+                raise ValueError(x)
+            return x * x
+
+        self.slow_square = slow_square
+
+    def call_concurrently(self, *args):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            return list(pool.map(self.slow_square, args))
+
+    def test_single_flight(self):
+        self.assertEqual(self.call_concurrently(*[3] * 8), [9] * 8)
+        self.assertEqual(self.calls, [3])
+        self.assertEqual(self.slow_square.in_flight, {})
+
+    def test_distinct_keys_run_concurrently(self):
+        # each call waits for the others so the barrier breaks (after its
+        # timeout) unless all four calls are running at once
+        barrier = threading.Barrier(4, timeout=10)
+
+        @SynchronizedMemoizer.decorate
+        def square(x):
+            barrier.wait()
+            return x * x
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            squares = list(pool.map(square, [1, 2, 3, 4]))
+        self.assertEqual(squares, [1, 4, 9, 16])
+        self.assertFalse(barrier.broken)
+
+    def test_failures_are_shared_and_not_cached(self):
+        with self.assertRaises(ValueError):
+            self.call_concurrently(*[-1] * 8)
+        self.assertEqual(self.calls, [-1])
+        self.assertEqual(len(self.slow_square.cache), 0)
+        with self.assertRaises(ValueError):
+            self.slow_square(-1)
+        self.assertEqual(self.calls, [-1, -1])
+
+    def test_recursion(self):
+        @SynchronizedMemoizer.decorate
+        def sync_fib(n):
+            if n in [0, 1]:
+                return n
+            return sync_fib(n-1) + sync_fib(n-2)
+
+        threads = [threading.Thread(target=sync_fib, args=(100,))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sync_fib(100), 354224848179261915075)
+        self.assertEqual(len(sync_fib.cache), 101)
+
+
+class AsyncMemoization(MemoizerTestCase):
+    def setUp(self):
+        self.calls = []
+
+        @AsyncMemoizer.decorate
+        async def lookup(x):
+            self.calls.append(x)
+            await asyncio.sleep(0.01)
+            if x < 0:
+                raise ValueError(x)
+            return x * x
+
+        self.lookup = lookup
+
+    def gather(self, *args):
+        async def gather():
+            return await asyncio.gather(*map(self.lookup, args))
+        return asyncio.run(gather())
+
+    def test_caches_awaited_result(self):
+        self.assertEqual(self.gather(3), [9])
+        self.assertEqual(self.gather(3), [9])
+        self.assertEqual(self.calls, [3])
+
+    def test_coalesces_concurrent_awaits(self):
+        self.assertEqual(self.gather(3, 3, 4, 3), [9, 9, 16, 9])
+        self.assertEqual(self.calls, [3, 4])
+        self.assertEqual(self.lookup.in_flight, {})
+
+    def test_failures_are_not_cached(self):
+        with self.assertRaises(ValueError):
+            self.gather(-1, -1)
+        self.assertEqual(self.calls, [-1])
+        with self.assertRaises(ValueError):
+            self.gather(-1)
+        self.assertEqual(self.calls, [-1, -1])
+        self.assertEqual(len(self.lookup.cache), 0)
+
+    def test_cancelled_waiter_does_not_cancel_others(self):
+        async def cancel_one():
+            first = asyncio.ensure_future(self.lookup(5))
+            second = asyncio.ensure_future(self.lookup(5))
+            await asyncio.sleep(0)
+            first.cancel()
+            return await second
+
+        self.assertEqual(asyncio.run(cancel_one()), 25)
+        self.assertEqual(self.calls, [5])
@@ -0,0 +1,45 @@
+import pickle
+from unittest import TestCase
+
+from functionals.keys import (frozen_key, KWARGS_MARK, make_key,
+                              SignatureKeyMaker)
+
+
+def f(a, b=2, *args, c=3, **kwargs):
+    pass
+
+
+def g(a, b=2):
+    pass
+
+
+class KeyMaking(TestCase):
+    def test_positional_fast_path(self):
+        args = (1, 2)
+        self.assertIs(make_key(args, {}), args)
+
+    def test_keywords_are_marked(self):
+        self.assertNotEqual(make_key((1, 2), {}), make_key((1,), {'b': 2}))
+        self.assertEqual(make_key((1,), {'b': 2, 'c': 3}),
+                         make_key((1,), {'c': 3, 'b': 2}))
+
+    def test_mark_survives_pickling(self):
+        self.assertIs(pickle.loads(pickle.dumps(KWARGS_MARK)), KWARGS_MARK)
+
+    def test_signature_normalization(self):
+        make_g_key = SignatureKeyMaker(g)
+        args = (1, 2)
+        self.assertIs(make_g_key(args, {}), args)
+        self.assertEqual(make_g_key((1,), {'b': 2}), args)
+        self.assertEqual(make_g_key((), {'a': 1}), args)
+
+    def test_signature_normalization_with_var_args(self):
+        make_f_key = SignatureKeyMaker(f)
+        self.assertEqual(make_f_key((1,), {}), make_f_key((1, 2), {'c': 3}))
+        self.assertNotEqual(make_f_key((1,), {}), make_f_key((1, 2, 3), {}))
+        self.assertNotEqual(make_f_key((1,), {}), make_f_key((1,), {'d': 4}))
+
+    def test_frozen_key(self):
+        self.assertEqual(frozen_key([1, {'a': [2]}], b={3}),
+                         frozen_key([1, {'a': [2]}], b={3}))
+        hash(frozen_key([1, {'a': [2]}], b={3}))
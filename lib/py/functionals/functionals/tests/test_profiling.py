@@ -0,0 +1,79 @@
+import itertools
+import operator
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+from functionals.examples.recursive import (batch_fib, fib,
+                                            MetaCircularEvaluator)
+from functionals.profiling import RecursionProfiler
+from functionals.recursive import RecursiveCaller, Recursor
+
+
+class ProfilerTestCase(TestCase):
+    def setUp(self):
+        # every reading of the clock advances it by a microsecond
+        ticks = itertools.count()
+        self.profiler = RecursionProfiler(clock=lambda: next(ticks) * 1e-6)
+
+
+class ProfileRecursion(ProfilerTestCase):
+    def test_counts_and_depth(self):
+        profiled_fib = Recursor(fib.f, profiler=self.profiler)
+        self.assertEqual(profiled_fib(10), 55)
+        stats = self.profiler.as_dict()
+        self.assertEqual(stats['generators']['fib']['calls'], 177)
+        self.assertEqual(stats['max_depth'], 10)
+        self.assertEqual(stats['peak_frames'], 10)
+
+    def test_times(self):
+        profiled_fib = Recursor(fib.f, profiler=self.profiler)
+        profiled_fib(5)
+        stats = self.profiler.as_dict()['generators']['fib']
+        self.assertGreater(stats['time'], 0)
+        self.assertGreaterEqual(stats['cumulative_time'], stats['time'])
+
+    def test_batch_frames(self):
+        profiled_fib = Recursor(batch_fib.f, profiler=self.profiler)
+        self.assertEqual(profiled_fib(10), 55)
+        stats = self.profiler.as_dict()
+        self.assertEqual(stats['generators']['batch_fib']['calls'], 177)
+        self.assertEqual(stats['max_depth'], 10)
+        self.assertEqual(stats['peak_frames'], 19)
+
+    def test_batches_in_executors(self):
+        profiled_fib = Recursor(batch_fib.f, profiler=self.profiler)
+        with ThreadPoolExecutor(4) as pool:
+            for _ in range(3):
+                self.assertEqual(profiled_fib.recurse_in(pool, 15), 610)
+        # the workers are not profiled, only the frames which submit them
+        stats = self.profiler.as_dict()
+        self.assertEqual(stats['generators']['batch_fib']['calls'], 3)
+        self.assertEqual(stats['max_depth'], 1)
+        # nor is the profiler sent to them
+        caller = RecursiveCaller(profiled_fib, (15, ), {})
+        self.assertIsNone(caller.worker_recursor().profiler)
+
+    def test_accumulates_over_calls(self):
+        profiled_fib = Recursor(fib.f, profiler=self.profiler)
+        profiled_fib(1)
+        profiled_fib(1)
+        self.assertEqual(self.profiler.calls[fib.f], 2)
+
+
+class ExportCollapsedStacks(ProfilerTestCase):
+    def test_mutual_recursion_is_folded(self):
+        evaluator = MetaCircularEvaluator()
+        evaluator.profiler = self.profiler
+        expression = (operator.add,
+                      (operator.mul, (operator.add, 5, 5), 20),
+                      (operator.mul, 10, 30))
+        self.assertEqual(evaluator.evaluate(expression), 500)
+
+        stacks = [line.rsplit(" ", 1)[0]
+                  for line in self.profiler.collapsed_stacks().splitlines()]
+        self.assertEqual(stacks, [
+            "MetaCircularEvaluator.lisp_eval",
+            "MetaCircularEvaluator.lisp_eval;"
+            "MetaCircularEvaluator.lisp_apply",
+        ])
+        self.assertEqual(self.profiler.max_depth, 7)
@@ -1,10 +1,31 @@
 import hashlib
 import operator
+import pickle
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 from unittest import TestCase
 
+from functionals.caches import Cache, LFUCache
 from functionals.examples.recursive import (MetaCircularEvaluator,
-                                            factorial, fib)
+                                            batch_fib, factorial, fib,
+                                            memo_fib)
+from functionals.recursive import recurse, recurse_all, Recursor
+
+
+def setUpModule():
+    # python 3.11 limits int to str conversions to 4300 digits by default
+    global max_str_digits
+    if hasattr(sys, 'set_int_max_str_digits'):
+        max_str_digits = sys.get_int_max_str_digits()
+        sys.set_int_max_str_digits(0)
+
+
+def tearDownModule():
+    if hasattr(sys, 'set_int_max_str_digits'):
+        sys.set_int_max_str_digits(max_str_digits)
 
 
 class MCETestCase(TestCase):
@@ -58,3 +79,160 @@ class BasicRecursing(RecursorTestCase):
     def test_parallel_recursive_calls(self):
         self.assertEqual([fib(n) for n in range(10)],
                          [0, 1, 1, 2, 3, 5, 8, 13, 21, 34])
+
+    def test_return_statement(self):
+        @Recursor.decorate
+        def count_down(n):
+            if n == 0:
+                return 0
+            return 1 + (yield n - 1)
+
+        self.assertEqual(count_down(100000), 100000)
+
+    def test_errors_propagate(self):
+        @Recursor.decorate
+        def fail_at_bottom(n):
+            if n == 0:
+                raise ValueError(n)
+            yield n - 1
+
+        with self.assertRaises(ValueError):
+            fail_at_bottom(10)
+
+
+class MemoizedRecursing(RecursorTestCase):
+    def test_memoized_fib(self):
+        self.assertEqual(memo_fib(10000) % 10 ** 10, 9947366875)
+        self.assertEqual(memo_fib(100), 354224848179261915075)
+
+    def test_solved_requests_skip_generators(self):
+        calls = []
+
+        @Recursor.configure(memo=Cache())
+        def counted_fib(n):
+            calls.append(n)
+            if n in [0, 1]:
+                return n
+            return (yield n-1) + (yield n-2)
+
+        self.assertEqual(counted_fib(30), 832040)
+        self.assertEqual(sorted(calls), list(range(31)))
+        self.assertEqual(counted_fib(30), 832040)
+        self.assertEqual(len(calls), 31)
+
+    def test_cycles_are_reported(self):
+        @Recursor.configure(memo=Cache())
+        def cycle(n):
+            return (yield (n + 1) % 3)
+
+        with self.assertRaises(RecursionError):
+            cycle(0)
+
+    def test_failed_calls_are_not_memoized(self):
+        memo = Cache()
+
+        @Recursor.configure(memo=memo)
+        def fail_at_bottom(n):
+            if n == 0:
+                raise ValueError(n)
+            yield n - 1
+
+        with self.assertRaises(ValueError):
+            fail_at_bottom(3)
+        self.assertEqual(len(memo), 0)
+
+
+class BatchRecursing(RecursorTestCase):
+    expression = (operator.add,
+                  (operator.mul, (operator.add, 5, 5), 20),
+                  (operator.mul, 10, 30))
+
+    def test_sequential_batches(self):
+        self.assertEqual([batch_fib(n) for n in range(10)],
+                         [0, 1, 1, 2, 3, 5, 8, 13, 21, 34])
+
+    def test_mixed_requests(self):
+        @Recursor.decorate
+        def count(n, step=1):
+            if n <= 0:
+                return 0
+            left, right = yield recurse_all(recurse(n - 2, step=2), n - 1)
+            return step + left + right
+
+        self.assertEqual(count(5), 16)
+
+    def test_thread_pool(self):
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            self.assertEqual(batch_fib.recurse_in(pool, 15), 610)
+            evaluator = MetaCircularEvaluator()
+            self.assertEqual(evaluator.recurse_in(pool, self.expression), 500)
+
+    def test_process_pool(self):
+        with ProcessPoolExecutor(max_workers=2) as pool:
+            self.assertEqual(batch_fib.recurse_in(pool, 15), 610)
+            evaluator = MetaCircularEvaluator()
+            self.assertEqual(evaluator.recurse_in(pool, self.expression), 500)
+
+    def test_nested_batches_in_thread_pool(self):
+        threads = set()
+
+        @Recursor.decorate
+        def slow_fib(n):
+            if n < 2:
+                threads.add(threading.get_ident())
+                time.sleep(0.005)
+                return n
+            a, b = yield recurse_all(n - 1, n - 2)
+            return a + b
+
+        # the workers' own batches also go to the pool, which does not
+        # deadlock even with fewer threads than waiting callers
+        for workers in [1, 2, 4]:
+            threads.clear()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                self.assertEqual(slow_fib.recurse_in(pool, 8), 21)
+        # more threads than the outermost batch has requests took part
+        self.assertGreater(len(threads), 2)
+
+    def test_local_recursors_in_process_pool(self):
+        @Recursor.decorate
+        def local_fib(n):
+            a, b = yield recurse_all(n - 1, n - 2)
+            return a + b
+
+        with self.assertRaisesRegex(pickle.PicklingError, "top level"):
+            pickle.dumps(local_fib)
+        self.assertIs(pickle.loads(pickle.dumps(batch_fib)), batch_fib)
+
+    def test_memoized_batches(self):
+        memo = Cache()
+        memo_batch_fib = Recursor(batch_fib.f, memo=memo)
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            self.assertEqual(memo_batch_fib.recurse_in(pool, 20), 6765)
+        self.assertEqual(memo.lookup((batch_fib.f, (19,))), 4181)
+
+    def test_threads_share_bounded_memo(self):
+        # the workers do not touch the memo table, which is not thread-safe
+        for _ in range(10):
+            memo = LFUCache(maxsize=8)
+            memo_batch_fib = Recursor(batch_fib.f, memo=memo)
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                self.assertEqual(memo_batch_fib.recurse_in(pool, 22), 17711)
+            # only the top call and its batch of two consult the memo
+            self.assertEqual(memo.misses, 3)
+
+    def test_memo_not_sent_to_workers(self):
+        submitted = []
+
+        class RecordingExecutor(ThreadPoolExecutor):
+            def submit(self, f, recursor, *args):
+                submitted.append(recursor)
+                return super().submit(f, recursor, *args)
+
+        memo = Cache()
+        memo_batch_fib = Recursor(batch_fib.f, memo=memo)
+        with RecordingExecutor(max_workers=2) as pool:
+            self.assertEqual(memo_batch_fib.recurse_in(pool, 10), 55)
+        self.assertTrue(submitted)
+        self.assertTrue(all(recursor.memo is None for recursor in submitted))
+        self.assertIsNot(memo_batch_fib.memo, None)
@@ -22,3 +22,19 @@ class OptionlessDecorator(object):
     @classmethod
     def decorate(cls, f):
         return wraps(f)(cls(f))
+
+
+class ConfigurableDecorator(OptionlessDecorator):
+    """
+    A super-class for function wrappers which accept keyword options
+
+    In addition to "decorate", ConfigurableDecorator provides the class method
+    "configure" which returns a decorator that wraps a function with an
+    instance of the ConfigurableDecorator initialized with the given options.
+    """
+
+    @classmethod
+    def configure(cls, **options):
+        def decorate(f):
+            return wraps(f)(cls(f, **options))
+        return decorate
@@ -7,5 +7,6 @@ setup(name='functionals',
       author='Ryan Abrams',
       author_email='rdabrams@gmail.com',
       url='https://github.com/caervs/functionals',
-      packages=['functionals', 'functionals.tests', 'functionals.examples'],
+      packages=['functionals', 'functionals.tests', 'functionals.examples',
+                'functionals.benchmarks'],
 )
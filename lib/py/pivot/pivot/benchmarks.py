@@ -0,0 +1,80 @@
+"""
+benchmarks for the pivot package (run with python -m pivot.benchmarks)
+"""
+
+import inspect
+
+from replicate.benchmarks import best_of, report
+
+from pivot.lexicon.expression import OperationalExpression, Variable
+
+CONSTRUCTIONS = 1000000
+
+
+def legacy_init(self, *args, **kwargs):
+    """
+    Replicable.__init__ as it was before preprocessor dispatch was cached,
+    reflecting on every preprocessor for every instantiation
+    """
+    processors = [self.primary_preprocessor] + list(self.preprocessors)
+    selected_preprocessor = None
+    for preprocessor in processors:
+        try:
+            context = inspect.getcallargs(preprocessor, *args, **kwargs)
+            selected_preprocessor = preprocessor
+        except Exception:
+            pass
+
+    if not selected_preprocessor:
+        raise TypeError("Invalid instantiation arguments", args, kwargs)
+
+    processed_attrs = selected_preprocessor(*args, **kwargs)
+    if processed_attrs is None:
+        processed_attrs = context
+    for attr_name, attr in processed_attrs.items():
+        setattr(self, attr_name, attr)
+
+
+class LegacyVariable(Variable):
+    __init__ = legacy_init
+
+
+class LegacyOperationalExpression(OperationalExpression):
+    __init__ = legacy_init
+
+
+def construct_variables(variable_class, count=CONSTRUCTIONS):
+    for _ in range(count):
+        variable_class('x')
+
+
+def construct_expressions(expression_class, count=CONSTRUCTIONS):
+    x, y = Variable('x'), Variable('y')
+    for _ in range(count):
+        expression_class('+', x, y)
+
+
+def construction():
+    """
+    compare constructing expressions with and without cached dispatch
+    """
+    report("construct {} Variables".format(CONSTRUCTIONS), [
+        ("cached dispatch", best_of(lambda: construct_variables(Variable))),
+        ("getcallargs per call",
+         best_of(lambda: construct_variables(LegacyVariable), 1)),
+    ])
+    report("construct {} OperationalExpressions".format(CONSTRUCTIONS), [
+        ("cached dispatch",
+         best_of(lambda: construct_expressions(OperationalExpression))),
+        ("getcallargs per call",
+         best_of(lambda: construct_expressions(LegacyOperationalExpression),
+                 1)),
+    ])
+
+
+def main():
+    construction()
+
+
+if __name__ == '__main__':
+    main()
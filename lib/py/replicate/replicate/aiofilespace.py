@@ -0,0 +1,156 @@
+"""
+an asyncio interface to filespaces
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from replicate.filespace import Filespace
+
+
+class AsyncFilespace(object):
+    """
+    provides awaitable versions of the operations of a Filespace
+
+    File I/O and (de)serialization run in an executor (by default a pool of
+    max_workers threads, shut down by close) so that they do not block the
+    event loop. At most per_directory operations on the entries of any one
+    directory run at once, so that a busy directory does not take up the
+    whole executor. Concurrent gets of the same item are served by a single
+    read whose value they all share (so it should not be changed).
+
+    The operations on an item run one at a time, in the order they were
+    started, so a read never sees a write in progress. set and delete start
+    their write when they are called (returning a future of it) so a get
+    made after them, even without awaiting them, reads what they wrote.
+
+    Subspaces are AsyncFilespaces sharing the executor and the limits.
+    """
+    def __init__(self, filespace, executor=None, max_workers=8,
+                 per_directory=4):
+        if not isinstance(filespace, Filespace):
+            filespace = Filespace(filespace)
+        self.filespace = filespace
+        self.owns_executor = executor is None
+        if self.owns_executor:
+            executor = ThreadPoolExecutor(max_workers)
+        self.executor = executor
+        self.per_directory = per_directory
+        self._limits = {}
+        self._reads = {}
+        # the lock of each path with operations, and how many there are
+        self._paths = {}
+
+    async def get(self, item):
+        """
+        return the value of an item
+        """
+        path = self.filespace / item
+        read = self._reads.get(path)
+        if read is None:
+            read = asyncio.ensure_future(
+                self._in_order(path, self.filespace.__getitem__, item))
+            self._reads[path] = read
+            read.add_done_callback(functools.partial(self._forget, path))
+        # a cancelled get does not cancel the read the others wait for
+        value = await asyncio.shield(read)
+        if isinstance(value, Filespace):
+            return self._subspace(value)
+        return value
+
+    def set(self, item, value):
+        """
+        set the value of an item, returning a future of the write
+        """
+        return self._write(item, self.filespace.__setitem__, item, value)
+
+    def delete(self, item):
+        """
+        delete an item, returning a future of the deletion
+        """
+        return self._write(item, self.filespace.__delitem__, item)
+
+    def _write(self, item, f, *args):
+        path = self.filespace / item
+        self._reads.pop(path, None)
+        return asyncio.ensure_future(self._in_order(path, f, *args))
+
+    async def contains(self, item):
+        """
+        return whether there is an entry for an item
+        """
+        # a task, so that it runs after the operations started before it
+        return await asyncio.ensure_future(self._in_order(
+            self.filespace / item, self.filespace.__contains__, item))
+
+    async def keys(self):
+        """
+        return the keys of the filespace in sorted order
+        """
+        return await self._run(self.filespace / '', self._list,
+                               self.filespace.keys)
+
+    async def glob(self, pattern):
+        """
+        return the keys matching a pattern (see Filespace.glob)
+        """
+        return await self._run(self.filespace / '', self._list,
+                               self.filespace.glob, pattern)
+
+    @staticmethod
+    def _list(f, *args):
+        return list(f(*args))
+
+    def close(self):
+        """
+        shut down the executor if it is the filespace's own
+        """
+        if self.owns_executor:
+            self.executor.shutdown()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    async def _run(self, path, f, *args):
+        # run a call in the executor within the limit of a path's directory
+        directory = os.path.dirname(path)
+        limit = self._limits.get(directory)
+        if limit is None:
+            limit = self._limits[directory] = asyncio.Semaphore(
+                self.per_directory)
+        async with limit:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.executor, functools.partial(f, *args))
+
+    async def _in_order(self, path, f, *args):
+        # run a call once the calls on the same path started before it
+        # are done
+        entry = self._paths.get(path)
+        if entry is None:
+            entry = self._paths[path] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                return await self._run(path, f, *args)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._paths[path]
+
+    def _forget(self, path, read):
+        if self._reads.get(path) is read:
+            del self._reads[path]
+
+    def _subspace(self, filespace):
+        subspace = type(self)(filespace, self.executor,
+                              per_directory=self.per_directory)
+        subspace._limits = self._limits
+        subspace._reads = self._reads
+        subspace._paths = self._paths
+        return subspace
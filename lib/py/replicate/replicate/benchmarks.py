@@ -0,0 +1,345 @@
+"""
+benchmarks for the replicate package (run with python -m replicate.benchmarks)
+"""
+
+import asyncio
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from functionals.caches import LRUCache
+
+from replicate import binary, examples
+from replicate.aiofilespace import AsyncFilespace
+from replicate.encoder import Encoder
+from replicate.filespace import FSYNC_FULL, Filespace
+from replicate.replicator import Replicator
+
+DECK_SIZE = 100000
+FILESPACE_SIZE = 10000
+ARTIFACT_SIZE = 1 << 27
+SCALAR_SIZE = 12 << 20
+
+
+def best_of(f, repeat=3):
+    """
+    return the best time in seconds of calling a nullary callable
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def report(title, rows):
+    """
+    print (name, seconds) rows relative to the first row
+    """
+    print(title)
+    baseline = rows[0][1]
+    for name, seconds in rows:
+        print("  {:<30} {:>10.3f} s  {:>7.2f}x".format(name, seconds,
+                                                       seconds / baseline))
+
+
+def make_deck(size=DECK_SIZE):
+    suits = ['clubs', 'diamonds', 'hearts', 'spades']
+    return examples.Deck([examples.Card(i, suits[i % 4])
+                          for i in range(size)], 'Acme')
+
+
+def serialization():
+    """
+    compare the direct and pseudo-recursive paths with plain json
+    """
+    deck = make_deck()
+    replicator = Replicator()
+    trampoline = Replicator()
+    trampoline.codec = None
+    compact = Replicator(serializer=binary.dumps, deserializer=binary.loads)
+    plain = {'cards': [{'rank': card.rank, 'suit': card.suit}
+                       for card in deck.cards], 'brand': deck.brand}
+    encoded = replicator.serialize(deck)
+    compact_encoded = compact.serialize(deck)
+
+    report("serialize a deck of {} cards".format(DECK_SIZE), [
+        ("json.dumps of plain dicts", best_of(lambda: json.dumps(plain))),
+        ("direct", best_of(lambda: replicator.serialize(deck))),
+        ("trampoline", best_of(lambda: trampoline.serialize(deck), 1)),
+        ("direct, binary", best_of(lambda: compact.serialize(deck))),
+    ])
+    report("deserialize a deck of {} cards".format(DECK_SIZE), [
+        ("json.loads", best_of(lambda: json.loads(encoded))),
+        ("direct", best_of(lambda: replicator.deserialize(encoded))),
+        ("trampoline", best_of(lambda: trampoline.deserialize(encoded), 1)),
+        ("direct, binary",
+         best_of(lambda: compact.deserialize(compact_encoded))),
+    ])
+    print("encoded size: {} bytes as json, {} bytes as binary".format(
+        len(encoded), len(compact_encoded)))
+
+
+def peak_memory(f):
+    """
+    return the peak memory in bytes allocated while calling a nullary
+    callable
+    """
+    tracemalloc.start()
+    try:
+        f()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+class NullFile(object):
+    """
+    a file discarding what is written to it
+    """
+    def write(self, text):
+        return len(text)
+
+
+def streaming():
+    """
+    compare writing and reading files with and without streaming
+    """
+    deck = make_deck()
+    replicator = Replicator()
+    encoded = replicator.serialize(deck)
+
+    def write_whole():
+        NullFile().write(replicator.serialize(deck))
+
+    def read_whole():
+        replicator.deserialize(io.StringIO(encoded).read())
+
+    rows = [
+        ("serialize then write", write_whole),
+        ("dump", lambda: replicator.dump(deck, NullFile())),
+        ("read then deserialize", read_whole),
+        ("load", lambda: replicator.load(io.StringIO(encoded))),
+    ]
+    print("write and read a deck of {} cards".format(DECK_SIZE))
+    for name, f in rows:
+        print("  {:<30} {:>10.3f} s  {:>7.1f} MB peak".format(
+            name, best_of(f), peak_memory(f) / 1e6))
+
+    # a long scalar spans many of the chunks load reads
+    encoded = replicator.serialize(os.urandom(SCALAR_SIZE))
+    report("read a string of {:.0f} MB".format(len(encoded) / 1e6), [
+        ("read then deserialize", best_of(
+            lambda: replicator.deserialize(io.StringIO(encoded).read()))),
+        ("load", best_of(lambda: replicator.load(io.StringIO(encoded)))),
+    ])
+
+
+def lazy_loading():
+    """
+    compare eager and lazy deserialization when only one part is used
+    """
+    deck = make_deck()
+    eager = Replicator()
+    lazy = Replicator(lazy=True)
+    encoded = eager.serialize(deck)
+    report("deserialize a deck of {} cards and read its brand".format(
+        DECK_SIZE), [
+        ("eager", best_of(lambda: eager.deserialize(encoded).brand)),
+        ("lazy", best_of(lambda: lazy.deserialize(encoded).brand)),
+    ])
+
+
+def parallel_serialization():
+    """
+    compare serializing independent objects one by one and in a pool
+    """
+    cards = make_deck().cards
+    replicator = Replicator()
+    encoded = [replicator.serialize(card) for card in cards]
+
+    def deserialize_one_by_one():
+        for encoded_card in encoded:
+            replicator.deserialize(encoded_card)
+
+    report("serialize {} independent cards".format(DECK_SIZE), [
+        ("one by one",
+         best_of(lambda: [replicator.serialize(card) for card in cards])),
+        ("serialize_many",
+         best_of(lambda: list(replicator.serialize_many(cards,
+                                                        chunksize=2048)))),
+    ])
+    report("deserialize {} independent cards".format(DECK_SIZE), [
+        ("one by one", best_of(deserialize_one_by_one)),
+        ("deserialize_many",
+         best_of(lambda: list(replicator.deserialize_many(encoded,
+                                                          chunksize=2048)))),
+    ])
+
+
+class UncachedEncoder(Encoder):
+    """
+    an Encoder resolving types as it did before they were cached
+    """
+    def decode_type(self, encoded_type):
+        if encoded_type in self.constructors_by_typeid:
+            return self.constructors_by_typeid[encoded_type]
+        return self.decode_default_identifier(encoded_type)
+
+
+def type_resolution():
+    """
+    compare decoding with and without the cache of resolved types
+    """
+    pairs = [(i, i) for i in range(DECK_SIZE)]
+    cached = Replicator()
+    uncached = Replicator(encoder=UncachedEncoder())
+    encoded = cached.serialize(pairs)
+    report("deserialize {} tuples".format(DECK_SIZE), [
+        ("cached types", best_of(lambda: cached.deserialize(encoded))),
+        ("import per object", best_of(lambda: uncached.deserialize(encoded))),
+    ])
+
+
+def filespace_reads():
+    """
+    compare reading the entries of a filespace one by one and in bulk
+    """
+    working_dir = tempfile.mkdtemp()
+    try:
+        filespace = Filespace(working_dir)
+        names = ["card{}".format(i) for i in range(FILESPACE_SIZE)]
+        filespace.put_many(zip(names, make_deck(FILESPACE_SIZE).cards))
+        indexed = Filespace(working_dir, cache_index=True)
+        report("read {} entries of a filespace".format(FILESPACE_SIZE), [
+            ("one by one", best_of(lambda: [filespace[n] for n in names])),
+            ("one by one, indexed",
+             best_of(lambda: [indexed[n] for n in names])),
+            ("get_many", best_of(lambda: filespace.get_many(names))),
+        ])
+    finally:
+        shutil.rmtree(working_dir)
+
+
+def mapped_reads():
+    """
+    compare reading large filespace entries with and without memory maps
+    """
+    working_dir = tempfile.mkdtemp()
+    try:
+        replicator = Replicator(serializer=binary.dumps,
+                                deserializer=binary.loads)
+        filespace = Filespace(working_dir, replicator)
+        mapped = Filespace(working_dir, replicator, memory_map=True)
+        filespace["text"] = "x" * ARTIFACT_SIZE
+        filespace["buffer"] = memoryview(bytes(ARTIFACT_SIZE))
+        rows = [
+            ("plain file, read", lambda: filespace["text"]),
+            ("plain file, mapped", lambda: mapped["text"]),
+            ("encoded buffer, read", lambda: filespace["buffer"]),
+            ("encoded buffer, mapped", lambda: mapped["buffer"]),
+        ]
+        print("read entries of {} MB".format(ARTIFACT_SIZE >> 20))
+        for name, f in rows:
+            print("  {:<30} {:>10.3f} s  {:>7.1f} MB peak".format(
+                name, best_of(f), peak_memory(f) / 1e6))
+    finally:
+        shutil.rmtree(working_dir)
+
+
+def durable_writes(size=1000):
+    """
+    compare writing many small entries in place, atomically, and in groups
+    """
+    working_dir = tempfile.mkdtemp()
+    try:
+        cards = make_deck(size).cards
+        names = ["card{}".format(i) for i in range(size)]
+        in_place = Filespace(working_dir)
+        atomic = Filespace(working_dir, atomic=True)
+        durable = Filespace(working_dir, atomic=True, fsync=FSYNC_FULL)
+
+        def one_by_one(filespace):
+            for name, card in zip(names, cards):
+                filespace[name] = card
+
+        report("write {} entries of a filespace".format(size), [
+            ("in place", best_of(lambda: one_by_one(in_place))),
+            ("atomic", best_of(lambda: one_by_one(atomic))),
+            ("atomic, fsync", best_of(lambda: one_by_one(durable))),
+            ("atomic, fsync, put_many",
+             best_of(lambda: durable.put_many(zip(names, cards)))),
+        ])
+    finally:
+        shutil.rmtree(working_dir)
+
+
+def cached_reads(lookups=1000):
+    """
+    compare looking up a filespace entry repeatedly with and without a
+    cache of the values read
+    """
+    working_dir = tempfile.mkdtemp()
+    try:
+        filespace = Filespace(working_dir)
+        cached = Filespace(working_dir, cache=LRUCache(16))
+        filespace["config"] = make_deck(1000)
+
+        def look_up(filespace):
+            for _ in range(lookups):
+                filespace["config"]
+
+        report("look up an entry of 1000 cards {} times".format(lookups), [
+            ("uncached", best_of(lambda: look_up(filespace))),
+            ("cached", best_of(lambda: look_up(cached))),
+        ])
+    finally:
+        shutil.rmtree(working_dir)
+
+
+def async_reads(size=1000):
+    """
+    compare reading filespace entries one by one with concurrent gets of an
+    AsyncFilespace, for distinct entries and for a single hot entry
+    """
+    working_dir = tempfile.mkdtemp()
+    try:
+        filespace = Filespace(working_dir)
+        names = ["card{}".format(i) for i in range(size)]
+        filespace.put_many(zip(names, make_deck(size).cards))
+
+        async def gather(names):
+            async with AsyncFilespace(filespace) as async_filespace:
+                await asyncio.gather(*map(async_filespace.get, names))
+
+        report("read {} entries of a filespace".format(size), [
+            ("one by one", best_of(lambda: [filespace[n] for n in names])),
+            ("AsyncFilespace, distinct",
+             best_of(lambda: asyncio.run(gather(names)))),
+            ("AsyncFilespace, one hot entry",
+             best_of(lambda: asyncio.run(gather(names[:1] * size)))),
+        ])
+    finally:
+        shutil.rmtree(working_dir)
+
+
+def main():
+    serialization()
+    streaming()
+    lazy_loading()
+    parallel_serialization()
+    type_resolution()
+    filespace_reads()
+    mapped_reads()
+    durable_writes()
+    cached_reads()
+    async_reads()
+
+
+if __name__ == '__main__':
+    main()
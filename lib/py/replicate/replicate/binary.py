@@ -0,0 +1,480 @@
+"""
+a compact binary wire format for encoded objects
+
+dumps and loads are drop-in replacements for json.dumps and json.loads as
+the serializer and deserializer of a Replicator, e.g.
+
+    replicator = Replicator(serializer=binary.dumps,
+                            deserializer=binary.loads)
+
+and convert the python primitives made by an Encoder to and from bytes. The
+layout follows msgpack: every value starts with a tag byte and small
+integers, short strings, and small containers fit their size (or value) in
+the tag itself. Unlike msgpack, larger integers and lengths are varints
+(little-endian base 128, with integers zigzag-encoded) and every dict of the
+form {'type': ..., 'parts': ...} is written as an object whose type is an
+index in a table of type identifiers at the head of the stream, so that the
+identifier of each type is written once however many instances there are.
+
+A stream is laid out as
+
+    MAGIC
+    varint number of types
+    each type identifier as a varint length followed by utf-8 bytes
+    the encoded value
+
+Values round-trip as they would through json except that tuples come back
+as lists but dict keys are not converted to strings.
+
+A Replicator using this format encodes objects with a BinaryCodec, which
+writes objects and reads them back without going through the {'type': ...,
+'parts': ...} dicts but otherwise makes the same stream as dumps, except
+that the buffers of bytes-like objects (see composer.BufferAction) are
+written as bytes rather than as base64 text.
+"""
+
+import struct
+from itertools import chain
+
+from replicate.composer import BufferAction
+from replicate.direct import DirectCodec
+
+MAGIC = b'RPB\x01'
+
+# tags (as in msgpack, fixints, fixmaps, fixarrays, and fixstrs keep their
+# value or size in the low bits of the tag)
+POSITIVE_FIXINT = 0x00
+FIXMAP = 0x80
+FIXARRAY = 0x90
+FIXSTR = 0xa0
+NIL = 0xc0
+FALSE = 0xc2
+TRUE = 0xc3
+BIN = 0xc4
+FLOAT = 0xcb
+INT = 0xd0
+OBJECT = 0xd4
+STR = 0xd9
+ARRAY = 0xdc
+MAP = 0xde
+NEGATIVE_FIXINT = 0xe0
+
+FIXMAP_MAX = 0x0f
+FIXARRAY_MAX = 0x0f
+FIXSTR_MAX = 0x1f
+
+OBJECT_KEYS = frozenset(['type', 'parts'])
+
+MISSING = object()
+
+float_struct = struct.Struct('>d')
+
+
+class DecodeError(ValueError):
+    """
+    raised when bytes are not a valid stream
+    """
+
+
+def write_varint(n, out):
+    """
+    append an unsigned integer to a bytearray as a varint
+    """
+    while n > 0x7f:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def read_varint(data, pos):
+    """
+    read a varint from bytes, returning it and the position after it
+    """
+    n = shift = 0
+    while True:
+        try:
+            byte = data[pos]
+        except IndexError:
+            raise DecodeError("Truncated varint", pos) from None
+        pos += 1
+        n |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+
+def zigzag(n):
+    return n << 1 if n >= 0 else (-n << 1) - 1
+
+
+def unzigzag(n):
+    return n >> 1 if not n & 1 else -((n + 1) >> 1)
+
+
+class Writer(object):
+    """
+    writes one encoded value as a stream
+    """
+    def __init__(self):
+        self.body = bytearray()
+        self.type_indexes = {}
+        # the encodings of strings, which are mostly dict keys and the
+        # same few values written over and over
+        self.strs = {}
+
+    def getvalue(self):
+        header = bytearray(MAGIC)
+        write_varint(len(self.type_indexes), header)
+        for type_id in self.type_indexes:
+            encoded_type_id = type_id.encode()
+            write_varint(len(encoded_type_id), header)
+            header += encoded_type_id
+        return bytes(header + self.body)
+
+    def write(self, o):
+        """
+        append the encoding of a value to the body of the stream
+
+        Containers are written with an explicit stack of the iterators over
+        their items rather than recursively so that values nested deeper
+        than the interpreter's recursion limit can be written.
+        """
+        items = self.write_item(o)
+        if items is None:
+            return
+        pending = [items]
+        while pending:
+            for o in pending[-1]:
+                items = self.write_item(o)
+                if items is not None:
+                    pending.append(items)
+                    break
+            else:
+                pending.pop()
+
+    def write_item(self, o):
+        """
+        append the encoding of a scalar, or of the header of a container in
+        which case an iterator over the values to write after it is returned
+        """
+        out = self.body
+        o_type = type(o)
+        if o_type is str:
+            encoded = self.strs.get(o)
+            if encoded is None:
+                encoded = self.strs[o] = self.encode_str(o)
+            out += encoded
+        elif o_type is int:
+            if 0 <= o <= 0x7f:
+                out.append(o)
+            elif -0x20 <= o < 0:
+                out.append(o & 0xff)
+            else:
+                out.append(INT)
+                write_varint(zigzag(o), out)
+        elif o_type is dict:
+            if (len(o) == 2 and OBJECT_KEYS.issuperset(o) and
+                    type(o['type']) is str):
+                type_index = self.type_indexes.setdefault(
+                    o['type'], len(self.type_indexes))
+                out.append(OBJECT)
+                write_varint(type_index, out)
+                return iter((o['parts'], ))
+            self.write_header(len(o), FIXMAP, FIXMAP_MAX, MAP)
+            return chain.from_iterable(o.items())
+        elif o_type is list or o_type is tuple:
+            self.write_header(len(o), FIXARRAY, FIXARRAY_MAX, ARRAY)
+            return iter(o)
+        elif o is None:
+            out.append(NIL)
+        elif o is True:
+            out.append(TRUE)
+        elif o is False:
+            out.append(FALSE)
+        elif o_type is float:
+            out.append(FLOAT)
+            out += float_struct.pack(o)
+        elif isinstance(o, (bytes, bytearray, memoryview)):
+            if o_type is memoryview:
+                o = o.cast('B')
+            out.append(BIN)
+            write_varint(len(o), out)
+            out += o
+        else:
+            raise TypeError("Object of type {} is not binary serializable"
+                            .format(o_type.__name__))
+        return None
+
+    def write_header(self, size, fixtag, fixmax, tag):
+        if size <= fixmax:
+            self.body.append(fixtag | size)
+        else:
+            self.body.append(tag)
+            write_varint(size, self.body)
+
+    @staticmethod
+    def encode_str(s):
+        encoded = s.encode()
+        if len(encoded) <= FIXSTR_MAX:
+            return bytes([FIXSTR | len(encoded)]) + encoded
+        header = bytearray([STR])
+        write_varint(len(encoded), header)
+        return bytes(header) + encoded
+
+
+class Reader(object):
+    """
+    reads the encoded value of a stream
+
+    Bytes are read as copies unless views is true, in which case they are
+    read as memoryviews of the data, which then must not be changed.
+    """
+    def __init__(self, data, views=False):
+        self.views = views
+        self.data = memoryview(data).cast('B') if not isinstance(
+            data, (bytes, bytearray)) else data
+        if self.data[:len(MAGIC)] != MAGIC:
+            raise DecodeError("Not a binary replicate stream")
+        self.pos = len(MAGIC)
+        ntypes = self.read_varint()
+        self.type_ids = [self.read_str(self.read_varint())
+                         for _ in range(ntypes)]
+
+    def read_varint(self):
+        pos = self.pos
+        if pos < len(self.data) and self.data[pos] < 0x80:
+            self.pos = pos + 1
+            return self.data[pos]
+        n, self.pos = read_varint(self.data, pos)
+        return n
+
+    def read_str(self, size):
+        end = self.pos + size
+        if end > len(self.data):
+            raise DecodeError("Truncated string", self.pos)
+        s = str(self.data[self.pos:end], 'utf-8')
+        self.pos = end
+        return s
+
+    def read(self):
+        """
+        read the next value of the stream
+
+        Like Writer.write, containers are read with an explicit stack (of
+        [container, is an object, number of values left, pending key]
+        frames). Objects are the only containers holding a single value as
+        maps hold a key and a value per entry.
+        """
+        value, size = self.read_item()
+        if not size:
+            return value
+        stack = [[value, size == 1 and type(value) is dict, size, MISSING]]
+        while True:
+            value, size = self.read_item()
+            if size:
+                stack.append([value, size == 1 and type(value) is dict, size,
+                              MISSING])
+                continue
+            while True:
+                frame = stack[-1]
+                container = frame[0]
+                if frame[1]:
+                    container['parts'] = value
+                elif type(container) is list:
+                    container.append(value)
+                elif frame[3] is MISSING:
+                    frame[3] = value
+                else:
+                    container[frame[3]] = value
+                    frame[3] = MISSING
+                frame[2] -= 1
+                if frame[2]:
+                    break
+                stack.pop()
+                if not stack:
+                    return container
+                value = container
+
+    def read_item(self):
+        """
+        read a scalar, returning it and None, or the header of a container,
+        returning the empty container and the number of values to read into
+        it (a key and a value for each entry of a map)
+        """
+        pos = self.pos
+        try:
+            tag = self.data[pos]
+        except IndexError:
+            raise DecodeError("Truncated stream", pos) from None
+        self.pos = pos + 1
+
+        if tag < FIXMAP:
+            return tag, None
+        if tag >= FIXSTR and tag < NIL:
+            return self.read_str(tag & FIXSTR_MAX), None
+        if tag < FIXARRAY:
+            return {}, 2 * (tag & FIXMAP_MAX)
+        if tag < FIXSTR:
+            return [], tag & FIXARRAY_MAX
+        if tag >= NEGATIVE_FIXINT:
+            return tag - 0x100, None
+        if tag == OBJECT:
+            type_index = self.read_varint()
+            try:
+                type_id = self.type_ids[type_index]
+            except IndexError:
+                raise DecodeError("Unknown type index", type_index) from None
+            return {'type': type_id, 'parts': None}, 1
+        if tag == INT:
+            return unzigzag(self.read_varint()), None
+        if tag == STR:
+            return self.read_str(self.read_varint()), None
+        if tag == ARRAY:
+            return [], self.read_varint()
+        if tag == MAP:
+            return {}, 2 * self.read_varint()
+        if tag == NIL:
+            return None, None
+        if tag == TRUE:
+            return True, None
+        if tag == FALSE:
+            return False, None
+        if tag == FLOAT:
+            end = self.pos + float_struct.size
+            if end > len(self.data):
+                raise DecodeError("Truncated float", self.pos)
+            value, = float_struct.unpack(self.data[self.pos:end])
+            self.pos = end
+            return value, None
+        if tag == BIN:
+            size = self.read_varint()
+            end = self.pos + size
+            if end > len(self.data):
+                raise DecodeError("Truncated bytes", self.pos)
+            if self.views:
+                value = memoryview(self.data)[self.pos:end]
+            else:
+                value = bytes(self.data[self.pos:end])
+            self.pos = end
+            return value, None
+        raise DecodeError("Unknown tag", tag, pos)
+
+
+def dumps(o):
+    """
+    serialize python primitives as bytes
+    """
+    writer = Writer()
+    writer.write(o)
+    return writer.getvalue()
+
+
+def loads(data):
+    """
+    deserialize python primitives from bytes made by dumps
+    """
+    reader = Reader(data)
+    o = reader.read()
+    if reader.pos != len(reader.data):
+        raise DecodeError("Trailing data", reader.pos)
+    return o
+
+
+class BinaryCodec(DirectCodec):
+    """
+    a DirectCodec writing objects directly in the binary format
+
+    Buffers are written without being copied and read as memoryviews of the
+    serialized data, so that e.g. a memoryview or numpy array decodes as a
+    view of the data rather than a copy of it.
+    """
+    def serialize(self, o):
+        writer = Writer()
+        self.write(writer, o, {})
+        return writer.getvalue()
+
+    def deserialize(self, serialized_o):
+        reader = Reader(serialized_o, views=True)
+        o = self.read(reader, [None] * len(reader.type_ids))
+        if reader.pos != len(reader.data):
+            raise DecodeError("Trailing data", reader.pos)
+        return o
+
+    def write(self, writer, o, type_indexes, depth=0):
+        """
+        write an object, keeping the type index of each class written in
+        type_indexes
+        """
+        action = self.composer.get_action(o)
+        if action is None:
+            writer.write(o)
+            return
+        if depth > self.max_depth:
+            raise RecursionError("Object is nested too deeply", depth)
+
+        o_type = type(o)
+        type_index = type_indexes.get(o_type)
+        if type_index is None:
+            type_index = type_indexes[o_type] = writer.type_indexes.setdefault(
+                self.encoder.encode_type(o_type), len(writer.type_indexes))
+        writer.body.append(OBJECT)
+        write_varint(type_index, writer.body)
+
+        if type(action) is BufferAction:
+            # the raw parts of a buffer are all primitives
+            writer.write(action.raw_parts(o))
+            return
+        parts = self.composer._do_action(action, o)
+        if hasattr(parts, 'items'):
+            writer.write_header(len(parts), FIXMAP, FIXMAP_MAX, MAP)
+            for key, part in parts.items():
+                writer.write(key)
+                self.write(writer, part, type_indexes, depth + 1)
+        else:
+            writer.write_header(len(parts), FIXARRAY, FIXARRAY_MAX, ARRAY)
+            for part in parts:
+                self.write(writer, part, type_indexes, depth + 1)
+
+    def read(self, reader, types, depth=0):
+        """
+        read an object, keeping the decoded types of the stream's type table
+        in types
+        """
+        data = reader.data
+        if reader.pos >= len(data) or data[reader.pos] != OBJECT:
+            return reader.read()
+        if depth > self.max_depth:
+            raise RecursionError("Object is nested too deeply", depth)
+
+        reader.pos += 1
+        type_index = reader.read_varint()
+        try:
+            o_type = types[type_index]
+        except IndexError:
+            raise DecodeError("Unknown type index", type_index) from None
+        if o_type is None:
+            o_type = types[type_index] = self.encoder.decode_type(
+                reader.type_ids[type_index])
+
+        if reader.pos >= len(data):
+            raise DecodeError("Truncated stream", reader.pos)
+        tag = data[reader.pos]
+        reader.pos += 1
+        if FIXMAP <= tag < FIXARRAY or tag == MAP:
+            size = (tag & FIXMAP_MAX if tag != MAP else reader.read_varint())
+            parts = {}
+            for _ in range(size):
+                key = reader.read()
+                parts[key] = self.read(reader, types, depth + 1)
+        elif FIXARRAY <= tag < FIXSTR or tag == ARRAY:
+            size = (tag & FIXARRAY_MAX if tag != ARRAY
+                    else reader.read_varint())
+            parts = [self.read(reader, types, depth + 1)
+                     for _ in range(size)]
+        else:
+            # the parts of objects are always containers when written by a
+            # composer but any value decodes like a json dict would
+            reader.pos -= 1
+            return {'type': reader.type_ids[type_index],
+                    'parts': reader.read()}
+        return self.composer.construct(o_type, parts)
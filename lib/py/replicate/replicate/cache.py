@@ -0,0 +1,105 @@
+"""
+tools for persisting memoized results in a Filespace
+"""
+
+import hashlib
+import os
+
+from functionals.caches import Cache
+from functionals.keys import KWARGS_MARK
+
+from replicate.filespace import Filespace, atomic_open
+
+# stands for KWARGS_MARK in the encoding of a key: keys are hashable so
+# they hold no dicts, and encoded objects are dicts with a 'type'
+KWARGS_TAG = {'mark': 'kwargs'}
+
+
+class FilespaceCache(Cache):
+    """
+    a memo table whose entries are encoded files in a Filespace
+
+    Each entry is named after a stable hash of its key so that separate
+    processes (and later runs) agree on where a result lives. Values are only
+    read from disk when they are looked up and are written atomically (see
+    atomic_open, with the filespace's fsync policy), so processes sharing
+    the directory never see a partially written entry.
+
+    To keep recent results in memory as well, put a memory cache in front of
+    it, e.g.
+
+        cache = TieredCache(LRUCache(1024), FilespaceCache(path))
+
+        @Memoizer.configure(cache=cache)
+        def f(x):
+            ...
+    """
+    def __init__(self, filespace):
+        super().__init__()
+        if not isinstance(filespace, Filespace):
+            os.makedirs(filespace, exist_ok=True)
+            filespace = Filespace(filespace)
+        self.filespace = filespace
+        self.replicator = filespace.replicator
+
+    def __len__(self):
+        return sum(1 for name in os.listdir(self.filespace.root_dir)
+                   if self.filespace.is_encoded_file(name))
+
+    def __contains__(self, key):
+        return os.path.exists(self.path_of(key))
+
+    def clear(self):
+        for name in os.listdir(self.filespace.root_dir):
+            if self.filespace.is_encoded_file(name):
+                os.remove(self.filespace / name)
+
+    def digest(self, key):
+        """
+        return a hash of a key which is stable across processes
+        """
+        encoded_key = self.replicator.serialize(self._canonicalize(key))
+        if not self.replicator.binary:
+            encoded_key = encoded_key.encode()
+        return hashlib.sha256(encoded_key).hexdigest()
+
+    def path_of(self, key):
+        """
+        return the path of the file holding the entry for a key
+        """
+        return self.filespace / (self.digest(key) +
+                                 self.filespace.encoded_suffix)
+
+    def _canonicalize(self, key):
+        # sets have no stable iteration order so they are replaced by lists
+        # sorted on the encoding of their elements
+        if key is KWARGS_MARK:
+            return KWARGS_TAG
+        if isinstance(key, tuple):
+            return tuple(map(self._canonicalize, key))
+        if isinstance(key, (set, frozenset)):
+            return sorted(map(self._canonicalize, key),
+                          key=self.replicator.serialize)
+        return key
+
+    def _get(self, key):
+        name = self.digest(key)
+        if not os.path.exists(self.filespace /
+                              (name + self.filespace.encoded_suffix)):
+            raise KeyError(key)
+        return self.filespace[name]
+
+    def _set(self, key, value):
+        mode = 'wb' if self.replicator.binary else 'w'
+        with atomic_open(self.path_of(key), mode,
+                         self.filespace.fsync) as f:
+            self.replicator.dump(value, f)
+
+    def _delete(self, key):
+        try:
+            os.remove(self.path_of(key))
+        except FileNotFoundError:
+            pass
+
+    def discard(self, key):
+        self._delete(key)
@@ -2,11 +2,116 @@
 decompose/recompose objects in the replication process
 """
 
+import datetime
+from base64 import b64decode, b64encode
+from fractions import Fraction
+
 from replicate.replicable import Replicable
 
 from functionals.recursive import retire
 
 
+class BufferAction(object):
+    """
+    an action decomposing an object whose contents are a buffer
+
+    Called as an action it returns the parts of the object with its buffer
+    encoded as base64 text, which any serializer can write. raw_parts returns
+    the buffer itself (a memoryview of the object's memory, without a copy)
+    for formats which can write bytes (see binary.BinaryCodec). Constructors
+    of these types accept either form.
+    """
+    def __init__(self, raw_parts):
+        self.raw_parts = raw_parts
+
+    def __call__(self, o):
+        parts = self.raw_parts(o)
+        if hasattr(parts, 'items'):
+            return {key: self.encode_buffer(part)
+                    for key, part in parts.items()}
+        return [self.encode_buffer(part) for part in parts]
+
+    @staticmethod
+    def encode_buffer(part):
+        if isinstance(part, memoryview):
+            return b64encode(part).decode('ascii')
+        return part
+
+
+def decode_buffer(data):
+    """
+    return the buffer of a part decoded from either form of a BufferAction
+    """
+    if isinstance(data, str):
+        return b64decode(data)
+    return data
+
+
+def raw_bytes_parts(o):
+    view = memoryview(o)
+    if not view.c_contiguous:
+        # e.g. a strided slice, whose bytes must be gathered
+        return [memoryview(view.tobytes())]
+    return [view.cast('B')]
+
+
+bytes_parts = BufferAction(raw_bytes_parts)
+
+
+def construct_bytes(o_type, parts):
+    data, = parts
+    data = decode_buffer(data)
+    if o_type is memoryview:
+        return memoryview(data)
+    return o_type(data)
+
+
+def raw_ndarray_parts(a):
+    if a.dtype.hasobject or a.dtype.fields is not None:
+        raise TypeError("Only arrays of plain values can be decomposed",
+                        a.dtype)
+    if not a.flags.c_contiguous:
+        a = a.copy()
+    return {
+        'dtype': a.dtype.str,
+        'shape': list(a.shape),
+        'data': memoryview(a.reshape(-1).view('u1')),
+    }
+
+
+ndarray_parts = BufferAction(raw_ndarray_parts)
+
+
+def construct_ndarray(o_type, parts):
+    import numpy
+
+    # the array is a view of the decoded buffer (read-only if it is bytes)
+    data = numpy.frombuffer(decode_buffer(parts['data']),
+                            dtype=parts['dtype'])
+    return data.reshape(parts['shape'])
+
+
+def fraction_parts(o):
+    return [o.numerator, o.denominator]
+
+
+def timedelta_parts(o):
+    return [o.days, o.seconds, o.microseconds]
+
+
+def isoformat_parts(o):
+    return [o.isoformat()]
+
+
+def construct_isoformat(o_type, parts):
+    isoformat, = parts
+    return o_type.fromisoformat(isoformat)
+
+
+def construct_from_args(o_type, parts):
+    return o_type(*parts)
+
+
 class Composer(object):
     """
     decomposes and recomposes objects in the replication process
@@ -15,29 +120,96 @@ class Composer(object):
     (or tuples of types) to actions which should be taken to decompose
     instances of those types. The action may be None in which case nothing
     is done, a callable which is called on the object, or an attribute
-    name which is gotten from the object.
+    name which is gotten from the object. The composition_scheme similarly
+    maps types to functions constructing an object of a type from its
+    parts, for the types which are not constructed by calling them on
+    their parts.
+
+    The action of an object is that of the first class of its method
+    resolution order in the scheme, so a subclass may be given an action
+    other than that of its bases, and is cached by type. Types of optional
+    libraries are keyed by their global identifier in deferred_scheme, as
+    (action, constructor) pairs, so that the libraries are not imported.
+    More types may be added with register.
     """
     decomposition_scheme = {
-        (int, float, str): None,
-        (list, set, tuple): list,
+        (int, float, str, bool, type(None)): None,
+        (list, set, frozenset, tuple): list,
         dict: None,
         Replicable: 'parts',
+        (bytes, bytearray, memoryview): bytes_parts,
+        Fraction: fraction_parts,
+        (datetime.datetime, datetime.date, datetime.time): isoformat_parts,
+        datetime.timedelta: timedelta_parts,
+    }
+    composition_scheme = {
+        (bytes, bytearray, memoryview): construct_bytes,
+        (datetime.datetime, datetime.date,
+         datetime.time): construct_isoformat,
+        (Fraction, datetime.timedelta): construct_from_args,
+    }
+    deferred_scheme = {
+        'numpy.ndarray': (ndarray_parts, construct_ndarray),
     }
 
     def __init__(self):
+        self.actions = self._by_type(self.decomposition_scheme)
+        self.constructors = self._by_type(self.composition_scheme)
         self._action_cache = {}
+        self._constructor_cache = {}
+
+    def __getstate__(self):
+        # the caches may hold types which can not be pickled (e.g. proxies)
+        state = dict(self.__dict__)
+        state['_action_cache'] = {}
+        state['_constructor_cache'] = {}
+        return state
+
+    @staticmethod
+    def _by_type(scheme):
+        by_type = {}
+        for types, value in scheme.items():
+            if not isinstance(types, tuple):
+                types = (types, )
+            for o_type in types:
+                by_type[o_type] = value
+        return by_type
+
+    def register(self, o_type, action, constructor=None):
+        """
+        decompose instances of a type (and its subclasses) with an action
+        and construct them from their parts with a constructor if one is
+        given
+        """
+        self.actions[o_type] = action
+        if constructor is not None:
+            self.constructors[o_type] = constructor
+        self._action_cache.clear()
+        self._constructor_cache.clear()
+
+    def _lookup(self, o_type, by_type):
+        # the value for the first class of a type's mro which has one
+        for klass in getattr(o_type, '__mro__', ()):
+            if klass in by_type:
+                return by_type[klass]
+            identifier = "{}.{}".format(klass.__module__, klass.__qualname__)
+            if identifier in self.deferred_scheme:
+                action, constructor = self.deferred_scheme[identifier]
+                self.actions[klass] = action
+                self.constructors[klass] = constructor
+                return by_type[klass]
+        return None
 
     def get_action(self, o):
         """
         get the action for an object to be decomposed
         """
-        if type(o) in self._action_cache:
+        try:
             return self._action_cache[type(o)]
-
-        for types, action in self.decomposition_scheme.items():
-            if isinstance(o, types):
-                self._action_cache[type(o)] = action
-                return action
+        except KeyError:
+            action = self._action_cache[type(o)] = self._lookup(
+                type(o), self.actions)
+            return action
 
     def decompose(self, o):
         """
@@ -67,8 +239,52 @@ class Composer(object):
         if isinstance(o, dict):
             for key, part in o.items():
                 unencoded[key] = (yield part)
-            retire(o_type(**unencoded))
         else:
             for part in o:
                 unencoded.append((yield part))
-            retire(o_type(unencoded))
+        retire(self.construct(o_type, unencoded))
+
+    def allocate(self, o_type):
+        """
+        return an empty object of a type to be completed by construct, or
+        None if objects of the type can only be constructed whole
+
+        Allocating an object before its parts are recomposed lets parts
+        refer back to it, e.g. to rebuild cycles.
+        """
+        if o_type is list:
+            return []
+        if isinstance(o_type, type) and issubclass(o_type, Replicable):
+            return o_type.__new__(o_type)
+        return None
+
+    def get_constructor(self, o_type):
+        """
+        get the function constructing objects of a type from their parts,
+        or None if the type is called on its parts
+        """
+        try:
+            return self._constructor_cache[o_type]
+        except KeyError:
+            constructor = self._constructor_cache[o_type] = self._lookup(
+                o_type, self.constructors)
+            return constructor
+
+    def construct(self, o_type, parts, o=None):
+        """
+        construct an object of a type from its recomposed parts, completing
+        an object made by allocate if one is given
+        """
+        if o is not None:
+            if o_type is list:
+                o.extend(parts)
+                return o
+            return o_type.from_parts(parts, o)
+        constructor = self.get_constructor(o_type)
+        if constructor is not None:
+            return constructor(o_type, parts)
+        if isinstance(parts, dict):
+            if issubclass(o_type, Replicable):
+                return o_type.from_parts(parts)
+            return o_type(**parts)
+        return o_type(parts)
@@ -0,0 +1,102 @@
+"""
+a generator-free fast path for encoding and decoding objects
+"""
+
+import json
+
+from replicate.composer import Composer
+from replicate.encoder import Encoder
+
+
+class DirectCodec(object):
+    """
+    encodes and decodes objects with plain recursive calls
+
+    The results are the same as those of the Composer/Encoder cycles used by
+    Replicator but since no generators or call requests are made for each
+    part the codec is much faster. In exchange it is bound by the call
+    stack: a RecursionError is raised for objects nested more than max_depth
+    levels deep (or which would exceed the interpreter's recursion limit),
+    in which case the pseudo-recursive cycles should be used instead.
+
+    serialize and deserialize also convert the encoded primitives to and
+    from their wire format with dumps and loads. Codecs for particular wire
+    formats may override them to skip the intermediate primitives. Codecs
+    which can also write objects to files and read them from files
+    incrementally set streams and implement dump and load.
+    """
+    max_depth = 256
+    streams = False
+
+    def __init__(self, composer, encoder, dumps=json.dumps, loads=json.loads):
+        self.composer = composer
+        self.encoder = encoder
+        self.dumps = dumps
+        self.loads = loads
+
+    @staticmethod
+    def supports(composer, encoder):
+        """
+        return whether the codec is equivalent to a composer and encoder's
+        pseudo-recursive cycles (i.e. whether they are not customized)
+        """
+        return (type(composer).decompose is Composer.decompose and
+                type(composer).compose is Composer.compose and
+                type(encoder).encode is Encoder.encode and
+                type(encoder).decode is Encoder.decode)
+
+    def serialize(self, o):
+        """
+        encode an object in the wire format
+        """
+        return self.dumps(self.encode(o))
+
+    def deserialize(self, serialized_o):
+        """
+        decode an object from the wire format
+        """
+        return self.decode(self.loads(serialized_o))
+
+    def encode(self, o, depth=0):
+        """
+        decompose and encode an object as python primitives
+        """
+        action = self.composer.get_action(o)
+        if action is None:
+            return o
+        if depth > self.max_depth:
+            raise RecursionError("Object is nested too deeply", depth)
+
+        parts = self.composer._do_action(action, o)
+        encoded_parts = type(parts)()
+        if hasattr(parts, 'items'):
+            for key, part in parts.items():
+                encoded_parts[key] = self.encode(part, depth + 1)
+        else:
+            for part in parts:
+                encoded_parts.append(self.encode(part, depth + 1))
+
+        return {
+            'type': self.encoder.encode_type(type(o)),
+            'parts': encoded_parts,
+        }
+
+    def decode(self, encoded_o, depth=0):
+        """
+        decode and recompose an object encoded as python primitives
+        """
+        if not isinstance(encoded_o, dict):
+            return encoded_o
+        if depth > self.max_depth:
+            raise RecursionError("Object is nested too deeply", depth)
+
+        o_type = self.encoder.decode_type(encoded_o['type'])
+        parts = encoded_o['parts']
+        decoded_parts = type(parts)()
+        if isinstance(parts, dict):
+            for key, part in parts.items():
+                decoded_parts[key] = self.decode(part, depth + 1)
+        else:
+            for part in parts:
+                decoded_parts.append(self.decode(part, depth + 1))
+        return self.composer.construct(o_type, decoded_parts)
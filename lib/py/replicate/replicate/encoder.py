@@ -4,16 +4,51 @@ tools to encode replicable objects as python primitives
 
 
 import importlib
+import inspect
 
+from functionals.caches import LRUCache, MISSING
 from functionals.recursive import retire
 
 
+class UnresolvedType(object):
+    """
+    the failure to resolve a global identifier, which is cached unless the
+    identifier was not allowed
+    """
+    def __init__(self, error, cached=True):
+        self.error = error
+        self.cached = cached
+
+
 class Encoder(object):
     """
     encodes replicable objects as python primitives
+
+    The constructor of each global identifier decoded is cached so that
+    decoding an object only imports modules the first time its type is
+    seen. The failures to find one are cached too, but only the
+    max_unresolved most recent ones since the identifiers come from the
+    payloads. Passing allowed_modules restricts the
+    constructors which can be decoded to those of the given modules (and
+    their submodules) along with the safe_identifiers, which the default
+    Composer uses for containers and builtin values. Only classes defined
+    in the allowed modules are allowed, not other names they import.
     """
     constructors_by_typeid = {}
     typeids_by_constructor = {}
+    safe_identifiers = frozenset([
+        'builtins.list', 'builtins.set', 'builtins.tuple', 'builtins.dict',
+        'builtins.frozenset', 'builtins.bytes', 'builtins.bytearray',
+        'builtins.memoryview', 'fractions.Fraction', 'datetime.datetime',
+        'datetime.date', 'datetime.time', 'datetime.timedelta',
+    ])
+
+    def __init__(self, allowed_modules=None, max_unresolved=256):
+        self.allowed_modules = None
+        if allowed_modules is not None:
+            self.allowed_modules = frozenset(allowed_modules)
+        self.resolved_types = {}
+        self.unresolved_types = LRUCache(max_unresolved)
 
     def encode(self, pair):
         """
@@ -50,7 +85,27 @@ class Encoder(object):
         if type_name in cls.constructors_by_typeid:
             raise KeyError(type_name)
         cls.constructors_by_typeid[type_name] = type_to_register
-        cls.typeids_by_constructor[type_name] = type_name
+        cls.typeids_by_constructor[type_to_register] = type_name
+
+    @classmethod
+    def custom_registrations(cls):
+        """
+        return the registered constructors whose identifier is not their
+        default one (and so can not be found by importing it)
+        """
+        return {type_name: constructor for type_name, constructor
+                in cls.constructors_by_typeid.items()
+                if type_name != cls.default_identifier(constructor)}
+
+    @classmethod
+    def restore_registrations(cls, registrations):
+        """
+        register constructors returned by custom_registrations (e.g. in
+        another process)
+        """
+        for type_name, constructor in registrations.items():
+            cls.constructors_by_typeid[type_name] = constructor
+            cls.typeids_by_constructor[constructor] = type_name
 
     @staticmethod
     def default_identifier(cls):
@@ -79,9 +134,86 @@ class Encoder(object):
         """
         return the constructor for a global identifier
         """
+        try:
+            return self.resolved_types[encoded_type]
+        except KeyError:
+            pass
+        resolved = self.unresolved_types.lookup(encoded_type)
+        # unless the constructor was registered since the type was resolved
+        if (resolved is MISSING or
+                encoded_type in self.constructors_by_typeid):
+            resolved = self._resolve(encoded_type)
+            if type(resolved) is not UnresolvedType:
+                self.unresolved_types.discard(encoded_type)
+                self.resolved_types[encoded_type] = resolved
+                return resolved
+            if resolved.cached:
+                self.unresolved_types.store(encoded_type, resolved)
+        raise resolved.error.with_traceback(None)
+
+    def is_allowed(self, encoded_type):
+        """
+        return whether a global identifier may be decoded
+        """
+        return (encoded_type in self.safe_identifiers or
+                self.is_allowed_module(encoded_type.rpartition(".")[0]))
+
+    def is_allowed_module(self, module_name):
+        """
+        return whether the constructors of a module may be decoded
+        """
+        if self.allowed_modules is None:
+            return True
+        while module_name:
+            if module_name in self.allowed_modules:
+                return True
+            module_name = module_name.rpartition(".")[0]
+        return False
+
+    def preload(self, module_names):
+        """
+        import modules and cache the constructors of the classes they define
+
+        Modules which are not allowed are skipped.
+        """
+        for module_name in module_names:
+            if not self.is_allowed_module(module_name):
+                continue
+            module = importlib.import_module(module_name)
+            for _name, member in inspect.getmembers(module, inspect.isclass):
+                if member.__module__ == module_name:
+                    encoded_type = self.encode_type(member)
+                    resolved = self._resolve(encoded_type)
+                    if type(resolved) is not UnresolvedType:
+                        self.resolved_types[encoded_type] = resolved
+
+    def clear_cache(self):
+        """
+        forget the resolved types (e.g. after sys.path changed)
+        """
+        self.resolved_types.clear()
+        self.unresolved_types.clear()
+
+    def _resolve(self, encoded_type):
+        if not self.is_allowed(encoded_type):
+            return UnresolvedType(ValueError("Type not allowed",
+                                             encoded_type), cached=False)
         if encoded_type in self.constructors_by_typeid:
-            return self.constructors_by_typeid[encoded_type]
-        return self.decode_default_identifier(encoded_type)
+            resolved = self.constructors_by_typeid[encoded_type]
+        else:
+            try:
+                resolved = self.decode_default_identifier(encoded_type)
+            except (ImportError, AttributeError, ValueError) as error:
+                return UnresolvedType(error)
+        # an allowed module may import other constructors (e.g. a process
+        # pool) so only the classes it defines are allowed
+        if (self.allowed_modules is not None and
+                encoded_type not in self.safe_identifiers and
+                not (isinstance(resolved, type) and
+                     self.is_allowed_module(resolved.__module__))):
+            return UnresolvedType(ValueError("Type not allowed",
+                                             encoded_type), cached=False)
+        return resolved
 
     def decode(self, encoded_o):
         """
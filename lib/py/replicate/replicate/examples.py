@@ -2,7 +2,8 @@
 example use of the replicate package
 """
 
-from replicate.replicable import Replicable, preprocessor
+from replicate.replicable import (primary_preprocessor, preprocessor,
+                                  Replicable)
 
 
 class Card(Replicable):
@@ -21,3 +22,16 @@ class Deck(Replicable):
     @preprocessor
     def preprocess(cards, brand):
         pass
+
+
+class Hand(Replicable):
+    """
+    a model of a hand of playing cards
+    """
+    @primary_preprocessor
+    def preprocess(player, *cards):
+        pass
+
+    @preprocessor
+    def preprocess_dealt(deck, player, count):
+        return dict(player=player, cards=tuple(deck.cards[:count]))
@@ -2,10 +2,19 @@
 tools for easy local persistence of replicable objects
 """
 
+import contextlib
+import fnmatch
 import functools
 import json
+import mmap
 import os
 import shutil
+import stat
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from functionals.caches import MISSING
 
 from replicate.replicator import Replicator
 
@@ -13,50 +22,441 @@ from replicate.replicator import Replicator
 pretty_dumps = functools.partial(json.dumps, indent=4)
 standard_replicator = Replicator(serializer=pretty_dumps)
 
+# the kinds of entries in a filespace
+ENCODED, PLAIN, DIRECTORY = 'encoded', 'plain', 'directory'
+
+# fsync policies (see atomic_open)
+FSYNC_NEVER, FSYNC_DATA, FSYNC_FULL = 'never', 'data', 'full'
+
+
+@contextlib.contextmanager
+def atomic_open(path, mode='w', fsync=FSYNC_NEVER, pending=None,
+                replaces=None):
+    """
+    open a temporary file in the directory of a path which is renamed to the
+    path once it is written, so that the path never holds a partial write
+
+    With the FSYNC_DATA policy the file is flushed to disk before it is
+    renamed and with FSYNC_FULL the directory is flushed afterwards too so
+    that the rename itself survives a crash. replaces is another path which
+    the file supersedes and which is removed once it is renamed. If a list
+    of pending writes is given, the write is appended to it rather than
+    completed so that many writes can be committed together (see
+    commit_writes). If writing fails the temporary file is removed.
+
+    The file gets the permissions of the file it replaces, or those of a
+    new file (given the current umask) if there is none, rather than the
+    private ones of a temporary file.
+    """
+    directory = os.path.dirname(path) or os.curdir
+    fd, temp_path = _create_temp_file(directory)
+    try:
+        replaced_mode = _existing_mode(path, replaces)
+        if replaced_mode is not None:
+            os.fchmod(fd, replaced_mode)
+        with os.fdopen(fd, mode) as f:
+            yield f
+            if fsync != FSYNC_NEVER and pending is None:
+                f.flush()
+                os.fsync(f.fileno())
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    if pending is None:
+        commit_writes([(temp_path, path, replaces)], fsync, synced=True)
+    else:
+        pending.append((temp_path, path, replaces))
+
+
+def _create_temp_file(directory):
+    # like tempfile.mkstemp but with the mode of a new file, which the
+    # kernel derives from the umask as the file is created
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_CLOEXEC', 0)
+    for _ in range(tempfile.TMP_MAX):
+        temp_path = os.path.join(directory,
+                                 '.{}.tmp'.format(os.urandom(8).hex()))
+        try:
+            return os.open(temp_path, flags, 0o666), temp_path
+        except FileExistsError:
+            continue
+    raise FileExistsError("No usable temporary file name found")
+
+
+def _existing_mode(*paths):
+    # the permissions of the first of the paths holding a file, if any
+    for path in paths:
+        if path is not None:
+            try:
+                return stat.S_IMODE(os.stat(path).st_mode)
+            except FileNotFoundError:
+                pass
+    return None
+
+
+def _remove_file(path):
+    # remove the file at a path if there is one (but not a directory)
+    if not os.path.isdir(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def commit_writes(pending, fsync=FSYNC_NEVER, synced=False):
+    """
+    complete the pending writes made by atomic_open, in order
+
+    Unless they are already synced, all the temporary files are flushed to
+    disk (as the fsync policy requires) before any is renamed and each
+    directory is flushed once after all are renamed, rather than once per
+    write.
+    """
+    if fsync != FSYNC_NEVER and not synced:
+        for temp_path, _path, _replaces in pending:
+            fd = os.open(temp_path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+    directories = set()
+    for temp_path, path, replaces in pending:
+        os.replace(temp_path, path)
+        if replaces is not None:
+            _remove_file(replaces)
+        directories.add(os.path.dirname(path) or os.curdir)
+    if fsync == FSYNC_FULL:
+        for directory in directories:
+            fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
 
 class Filespace(object):
     """
     provides a dict like interface for persisting files
+
+    The keys of a filespace are the names of its files, without the
+    encoded_suffix of encoded files, and of its subdirectories, whose values
+    are filespaces. Names starting with a dot (e.g. temporary files) are not
+    listed but may still be looked up.
+
+    With cache_index, the kinds of the entries of the root directory are
+    scanned once and kept, so that looking up a key does not check which
+    files exist. The index is kept up to date by the filespace's own writes
+    and deletions but changes made by others are only seen after
+    refresh_index. Keys in subdirectories are always checked on disk.
+
+    Encoded files are opened in binary mode if the replicator's format is
+    binary. With memory_map, files are mapped into memory rather than read:
+    encoded files in a binary format are deserialized from their mapping,
+    so that large files are not copied (and buffers in them, e.g.
+    memoryviews, decode as views of the mapping), and plain files are read
+    as memoryviews of the bytes of their mapping rather than as strs.
+    Encoded files in other formats are still loaded from the file. A
+    mapping lasts as long as views of it and truncating a mapped file
+    makes using them fault, so a filespace which maps files always writes
+    atomically (as if atomic were given), replacing files rather than
+    changing them in place.
+
+    With atomic, files are written to temporary files which are renamed into
+    place (see atomic_open) with the given fsync policy, so that a crash
+    never leaves a partially written entry. Writes made in a group_commit
+    (e.g. by put_many) are always atomic and are completed together. Writing
+    a key removes the file of the key with the other suffix, if any.
+
+    With a cache (a functionals.caches.Cache, e.g. an LRUCache), the values
+    of files read are kept in it by path along with the modification time,
+    size, and inode of the file, and a file is only read again once these
+    change. Writes and deletions through the filespace (and its
+    subspaces, which share the cache) discard the entries they replace.
+    Values are shared by every lookup so they should not be changed. The
+    cache counts a stale entry as a miss so its hits and misses are those
+    of the filespace. Since caches are not thread-safe, the filespace (and
+    its subspaces) use the cache under a lock of its own, so a cache should
+    not be shared with other filespaces or used directly while they may be
+    used from several threads (e.g. by get_many or an AsyncFilespace).
     """
-    # TODO a mechanism for listing the objects in a filespace (with globing)
     encoded_suffix = ".encoded"
 
     def __init__(self, root_dir, replicator=standard_replicator,
-                 encode_strs=False):
+                 encode_strs=False, cache_index=False, memory_map=False,
+                 atomic=False, fsync=FSYNC_NEVER, cache=None):
         self.root_dir = root_dir
         self.replicator = replicator
-        self.encode_strs = False
+        self.encode_strs = encode_strs
+        self.cache_index = cache_index
+        self.memory_map = memory_map
+        # mapped files must be replaced rather than truncated
+        self.atomic = atomic or memory_map
+        self.fsync = fsync
+        self.cache = cache
+        # caches are not thread-safe so all access to them is serialized
+        self.cache_lock = threading.Lock()
+        self._index = None
+        self._pending = None
 
     def __getitem__(self, item):
+        return self._read(item, self._kind(item))
+
+    def __setitem__(self, item, value):
         full_name = os.path.join(self.root_dir, item)
-        is_encoded = False
-        if os.path.exists(full_name + self.encoded_suffix):
-            full_name = full_name + self.encoded_suffix
-            is_encoded = True
 
-        if not os.path.exists(full_name):
-            os.mkdir(full_name)
+        # the file with the other suffix is removed once this one is written
+        is_encoded = not isinstance(value, str) or self.encode_strs
+        if is_encoded:
+            full_name, stale_name = (full_name + self.encoded_suffix,
+                                     full_name)
+        else:
+            stale_name = full_name + self.encoded_suffix
 
-        if os.path.isdir(full_name):
-            return type(self)(full_name, self.replicator)
+        # TODO should allow copying of entire filespaces
+        mode = 'wb' if is_encoded and self.replicator.binary else 'w'
+        if self.atomic or self._pending is not None:
+            opened = atomic_open(full_name, mode, self.fsync, self._pending,
+                                 stale_name)
+        else:
+            opened = open(full_name, mode)
+        with opened as f:
+            if is_encoded:
+                self.replicator.dump(value, f)
+            else:
+                f.write(value)
+        if not self.atomic and self._pending is None:
+            _remove_file(stale_name)
+        if self.cache is not None:
+            with self.cache_lock:
+                self.cache.discard(full_name)
+                self.cache.discard(stale_name)
+        self._update_index(item, ENCODED if is_encoded else PLAIN)
 
-        process = self.replicator.deserialize if is_encoded else (lambda x: x)
+    def __contains__(self, item):
+        return self._kind(item) is not None
 
-        with open(full_name, 'r') as f:
-            return process(f.read())
+    def __iter__(self):
+        return self.keys()
 
-    def __setitem__(self, item, value):
+    def __len__(self):
+        return sum(1 for _key in self.keys())
+
+    def keys(self):
+        """
+        yield the keys of the filespace in sorted order
+        """
+        for key in sorted(self._entries()):
+            if not key.startswith('.'):
+                yield key
+
+    def items(self):
+        """
+        yield the (key, value) pairs of the filespace in sorted order
+        """
+        entries = self._entries()
+        for key in self.keys():
+            yield key, self._read(key, entries[key])
+
+    def glob(self, pattern):
+        """
+        yield the keys matching a shell-style pattern (see fnmatch)
+
+        The components of a pattern separated by '/' are matched against the
+        keys of successive subdirectories, e.g. 'decks/*/hand?', and the keys
+        yielded are paths relative to the root directory.
+        """
+        head, _, rest = pattern.partition('/')
+        entries = self._entries()
+        for key in fnmatch.filter(self.keys(), head):
+            if not rest:
+                yield key
+            elif entries[key] == DIRECTORY:
+                for subkey in self._subspace(key).glob(rest):
+                    yield os.path.join(key, subkey)
+
+    def get_many(self, items, executor=None, chunksize=64):
+        """
+        return the values of many items, in order
+
+        The directories of the items are each scanned once, rather than
+        each item being checked, and files are read in chunks of chunksize
+        by the executor (by default a pool of threads, shut down once all
+        are read).
+        """
+        items = list(items)
+        scans = {}
+        kinds = []
+        for item in items:
+            directory, name = os.path.split(item)
+            if directory not in scans:
+                scans[directory] = (self._entries() if not directory else
+                                    self._scan(self / directory))
+            kinds.append(scans[directory].get(name))
+
+        owns_executor = executor is None
+        if owns_executor:
+            executor = ThreadPoolExecutor()
+        starts = range(0, len(items), chunksize)
+        try:
+            chunks = executor.map(
+                self._read_chunk, [items[i:i + chunksize] for i in starts],
+                [kinds[i:i + chunksize] for i in starts])
+            return [value for chunk in chunks for value in chunk]
+        finally:
+            if owns_executor:
+                executor.shutdown()
+
+    def _read_chunk(self, items, kinds):
+        return list(map(self._read, items, kinds))
+
+    def put_many(self, items):
+        """
+        set the values of many items, given as a mapping or as (item, value)
+        pairs, in a group_commit
+        """
+        if hasattr(items, 'items'):
+            items = items.items()
+        with self.group_commit():
+            for item, value in items:
+                self[item] = value
+
+    @contextlib.contextmanager
+    def group_commit(self):
+        """
+        defer the writes made in the context and commit them together (see
+        commit_writes) when it exits, or discard them all if it exits with
+        an exception
+
+        Within the group, keys written are only readable once it commits.
+        Groups may be nested, in which case the outermost one commits.
+        """
+        if self._pending is not None:
+            yield
+            return
+        pending = self._pending = []
+        try:
+            yield
+        except BaseException:
+            for temp_path, _path, _replaces in pending:
+                os.remove(temp_path)
+            raise
+        else:
+            commit_writes(pending, self.fsync)
+        finally:
+            self._pending = None
+
+    def refresh_index(self):
+        """
+        forget the index of the root directory (e.g. after others changed
+        it) so that it is scanned again when next needed
+        """
+        self._index = None
+
+    def _entries(self):
+        # the kind of each entry of the root directory by key
+        if self._index is not None:
+            return self._index
+        entries = self._scan(self.root_dir)
+        if self.cache_index:
+            self._index = entries
+        return entries
+
+    def _scan(self, directory):
+        entries = {}
+        try:
+            with os.scandir(directory) as scanned:
+                for entry in scanned:
+                    if entry.is_dir():
+                        entries.setdefault(entry.name, DIRECTORY)
+                    elif self.is_encoded_file(entry.name):
+                        key = entry.name[:-len(self.encoded_suffix)]
+                        # encoded files are read before others of the name
+                        entries[key] = ENCODED
+                    else:
+                        entries.setdefault(entry.name, PLAIN)
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def _kind(self, item):
+        # the kind of the entry for an item or None if there is none
+        if self.cache_index and os.sep not in item:
+            return self._entries().get(item)
         full_name = os.path.join(self.root_dir, item)
+        if os.path.exists(full_name + self.encoded_suffix):
+            return ENCODED
+        try:
+            mode = os.stat(full_name).st_mode
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return DIRECTORY if stat.S_ISDIR(mode) else PLAIN
 
-        # TODO should remove older string if present
-        # (since it may have a different suffix)
-        if not isinstance(value, str) or self.encode_strs:
+    def _update_index(self, item, kind):
+        if self._index is not None and os.sep not in item:
+            if kind is None:
+                self._index.pop(item, None)
+            else:
+                self._index[item] = kind
+
+    def _read(self, item, kind):
+        full_name = os.path.join(self.root_dir, item)
+        if kind is None:
+            os.mkdir(full_name)
+            self._update_index(item, DIRECTORY)
+            kind = DIRECTORY
+
+        if kind == DIRECTORY:
+            return self._subspace(item)
+        if kind == ENCODED:
             full_name = full_name + self.encoded_suffix
-            value = self.replicator.serialize(value)
+        if self.cache is None:
+            return self._read_file(full_name, kind)
 
-        # TODO should allow copying of entire filespaces
-        with open(full_name, 'w') as f:
-            f.write(value)
+        st = os.stat(full_name)
+        stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+        # an entry is stale if the file changed since it was cached
+        with self.cache_lock:
+            entry = self.cache.lookup(full_name,
+                                      valid=lambda entry: entry[0] == stamp)
+        if entry is not MISSING:
+            return entry[1]
+        value = self._read_file(full_name, kind)
+        with self.cache_lock:
+            self.cache.store(full_name, (stamp, value))
+        return value
+
+    def _read_file(self, full_name, kind):
+        if kind == ENCODED:
+            if not self.replicator.binary:
+                with open(full_name, 'r') as f:
+                    return self.replicator.load(f)
+            if self.memory_map:
+                return self.replicator.deserialize(self._map(full_name))
+            with open(full_name, 'rb') as f:
+                return self.replicator.load(f)
+        if self.memory_map:
+            return self._map(full_name)
+        with open(full_name, 'r') as f:
+            return f.read()
+
+    @staticmethod
+    def _map(full_name):
+        # a read-only memoryview of the mapping of a file
+        with open(full_name, 'rb') as f:
+            try:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty files can not be mapped
+                mapped = b''
+        return memoryview(mapped)
+
+    def _subspace(self, item):
+        subspace = type(self)(os.path.join(self.root_dir, item),
+                              self.replicator, self.encode_strs,
+                              cache_index=self.cache_index,
+                              memory_map=self.memory_map, atomic=self.atomic,
+                              fsync=self.fsync, cache=self.cache)
+        subspace.cache_lock = self.cache_lock
+        return subspace
 
     def is_encoded_file(self, item):
         return item.endswith(self.encoded_suffix)
@@ -65,10 +465,22 @@ class Filespace(object):
         return os.path.join(self.root_dir, filename)
 
     def __delitem__(self, item):
+        kind = self._kind(item)
         full_path = os.path.join(self.root_dir, item)
-        if not os.path.exists(full_path):
+        if kind is None:
             raise ValueError(item)
-        elif os.path.isdir(full_path):
+        elif kind == DIRECTORY:
             shutil.rmtree(full_path)
+        elif kind == ENCODED:
+            os.remove(full_path + self.encoded_suffix)
         else:
             os.remove(full_path)
+        self._update_index(item, None)
+        if self.cache is not None:
+            with self.cache_lock:
+                self.cache.discard(full_path)
+                self.cache.discard(full_path + self.encoded_suffix)
+                if kind == DIRECTORY:
+                    prefix = os.path.join(full_path, '')
+                    self.cache.discard_matching(
+                        lambda path: path.startswith(prefix))
@@ -0,0 +1,144 @@
+"""
+encoding of object graphs with shared references and cycles
+"""
+
+from replicate.direct import DirectCodec
+
+PENDING = object()
+
+
+class IdentityCodec(DirectCodec):
+    """
+    a DirectCodec which encodes each object once however many times it is
+    referred to
+
+    Objects (i.e. values which are decomposed, as opposed to primitives) are
+    numbered in the order they are first reached and every later occurrence
+    of an object is encoded as a back-reference {'ref': n} to its number, so
+    the encoding is linear in the number of distinct objects and cycles are
+    encoded rather than followed forever. Decoding numbers objects in the
+    same order and resolves each back-reference to the same decoded object.
+    A dict which is a part (rather than an encoded object) and looks like a
+    back-reference is encoded as an object of type dict instead.
+
+    Both walk objects with an explicit stack, so the graphs they encode are
+    not bound by the max_depth of other DirectCodecs (only, in the json
+    format, by that of the json module).
+
+    To rebuild cycles, lists and Replicables are allocated before their parts
+    are decoded (see Composer.allocate) so that parts may refer back to them.
+    Note that a Replicable referred to by its own parts is not initialized
+    yet when those parts are constructed. Other types (e.g. tuples) are only
+    constructed once their parts are decoded and a cycle through them can not
+    be decoded.
+    """
+    def encode(self, o, depth=0, memo=None):
+        """
+        decompose and encode an object as python primitives, with
+        back-references to the objects already in memo
+        """
+        if memo is None:
+            memo = {}
+        encoded_o, frame = self._encode_object(o, memo)
+        # frames are [encoded parts, iterator over the (key, part) pairs]
+        stack = [frame] if frame is not None else []
+        while stack:
+            encoded_parts, items = stack[-1]
+            try:
+                key, part = next(items)
+            except StopIteration:
+                stack.pop()
+                continue
+            encoded_part, frame = self._encode_object(part, memo)
+            self._put(encoded_parts, key, encoded_part)
+            if frame is not None:
+                stack.append(frame)
+        return encoded_o
+
+    def _encode_object(self, o, memo):
+        # return the encoding of an object and, if its parts still have to
+        # be encoded into it, its frame
+        action = self.composer.get_action(o)
+        if action is None:
+            if type(o) is dict and 'ref' in o and 'type' not in o:
+                # escaped so that it is not decoded as a back-reference
+                return {'type': 'builtins.dict', 'parts': o}, None
+            return o, None
+        # the object is kept in the memo so that its id is not reused
+        known = memo.get(id(o))
+        if known is not None:
+            return {'ref': known[0]}, None
+        memo[id(o)] = (len(memo), o)
+
+        parts = self.composer._do_action(action, o)
+        encoded_parts = type(parts)()
+        items = (iter(parts.items()) if hasattr(parts, 'items')
+                 else enumerate(parts))
+        return ({'type': self.encoder.encode_type(type(o)),
+                 'parts': encoded_parts}, [encoded_parts, items])
+
+    def decode(self, encoded_o, depth=0, objects=None):
+        """
+        decode and recompose an object encoded as python primitives,
+        resolving back-references to the objects already decoded
+        """
+        if objects is None:
+            objects = []
+        o, frame = self._decode_object(encoded_o, objects)
+        # frames are [type, index, allocated object, decoded parts,
+        # iterator over the (key, part) pairs, key of the part decoding]
+        stack = [frame] if frame is not None else []
+        while stack:
+            frame = stack[-1]
+            try:
+                key, part = next(frame[4])
+            except StopIteration:
+                o_type, index, o, decoded_parts, _items, _key = stack.pop()
+                o = objects[index] = self.composer.construct(
+                    o_type, decoded_parts, o)
+                if stack:
+                    self._put(stack[-1][3], stack[-1][5], o)
+                continue
+            frame[5] = key
+            decoded_part, child = self._decode_object(part, objects)
+            if child is None:
+                self._put(frame[3], key, decoded_part)
+            else:
+                stack.append(child)
+        return o
+
+    def _decode_object(self, encoded_o, objects):
+        # return the decoded value of a primitive or back-reference, or the
+        # frame of an object whose parts still have to be decoded
+        if not isinstance(encoded_o, dict):
+            return encoded_o, None
+        if 'ref' in encoded_o and 'type' not in encoded_o:
+            return self._dereference(encoded_o['ref'], objects), None
+
+        o_type = self.encoder.decode_type(encoded_o['type'])
+        index = len(objects)
+        o = self.composer.allocate(o_type)
+        objects.append(PENDING if o is None else o)
+
+        parts = encoded_o['parts']
+        items = (iter(parts.items()) if isinstance(parts, dict)
+                 else enumerate(parts))
+        return None, [o_type, index, o, type(parts)(), items, None]
+
+    @staticmethod
+    def _put(parts, key, part):
+        # add a part under its key, or at the end of a list of parts
+        if isinstance(parts, dict):
+            parts[key] = part
+        else:
+            parts.append(part)
+
+    @staticmethod
+    def _dereference(index, objects):
+        if not 0 <= index < len(objects):
+            raise ValueError("Reference to an unknown object", index)
+        o = objects[index]
+        if o is PENDING:
+            raise ValueError("Cycle through an object which can only be "
+                             "constructed whole", index)
+        return o
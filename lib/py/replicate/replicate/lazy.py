@@ -0,0 +1,146 @@
+"""
+lazy decoding of replicable objects
+"""
+
+from replicate.direct import DirectCodec
+from replicate.replicable import Replicable
+
+# the key under which a proxy keeps its codec and encoded parts
+LAZY_STATE = '_lazy_state'
+
+proxy_classes = {}
+
+
+def materialize(proxy):
+    """
+    decode the parts of a proxy and make it the object it stands for
+
+    The proxy's class is switched to the class it stands for and the
+    object is initialized in place so that references to the proxy become
+    references to the real object.
+    """
+    state = object.__getattribute__(proxy, '__dict__')
+    if LAZY_STATE not in state:
+        return
+    codec, parts = state.pop(LAZY_STATE)
+    proxy_class = type(proxy)
+    cls = proxy_class.__bases__[0]
+    object.__setattr__(proxy, '__class__', cls)
+    try:
+        decoded_parts = {key: codec.decode(part)
+                         for key, part in parts.items()}
+        cls.from_parts(decoded_parts, proxy)
+    except BaseException:
+        state.clear()
+        state[LAZY_STATE] = codec, parts
+        object.__setattr__(proxy, '__class__', proxy_class)
+        raise
+
+
+def _getattribute(self, name):
+    materialize(self)
+    return getattr(self, name)
+
+
+def _setattr(self, name, value):
+    materialize(self)
+    setattr(self, name, value)
+
+
+def _delattr(self, name):
+    materialize(self)
+    delattr(self, name)
+
+
+def _eq(self, other):
+    materialize(self)
+    return self == other
+
+
+def _ne(self, other):
+    materialize(self)
+    return self != other
+
+
+def _hash(self):
+    materialize(self)
+    return hash(self)
+
+
+def proxy_class(cls):
+    """
+    return the class of the proxies standing for instances of a replicable
+    class
+
+    The proxy class is a subclass of cls, so proxies pass isinstance checks,
+    and has the same name and identifier, so they are encoded as instances
+    of cls. It is made without calling the metaclass's __init__ so that it
+    is not registered as a globally identified class of its own.
+    """
+    try:
+        return proxy_classes[cls]
+    except KeyError:
+        pass
+    namespace = {
+        '__module__': cls.__module__,
+        '__qualname__': cls.__qualname__,
+        '__doc__': cls.__doc__,
+        '__getattribute__': _getattribute,
+        '__setattr__': _setattr,
+        '__delattr__': _delattr,
+        '__eq__': _eq,
+        '__ne__': _ne,
+        '__hash__': _hash,
+        '_is_proxy': True,
+    }
+    proxy = type.__new__(type(cls), cls.__name__, (cls, ), namespace)
+    # proxies of a class with a custom identifier are encoded under it
+    typeids = cls.registry.typeids_by_constructor
+    if cls in typeids:
+        typeids[proxy] = typeids[cls]
+    proxy_classes[cls] = proxy
+    return proxy
+
+
+def is_proxy(o):
+    """
+    return whether an object is a proxy which is not materialized yet
+    """
+    return getattr(type(o), '_is_proxy', False)
+
+
+class LazyCodec(DirectCodec):
+    """
+    a DirectCodec decoding replicables as proxies which only decode their
+    parts when they are first used
+
+    A proxy materializes (see materialize) on its first attribute access,
+    including the implicit ones of methods and properties, and when it is
+    compared or hashed. Until then only the type of the object is decoded so
+    loading a large object and using a few of its parts only decodes the
+    replicables on the way to those parts. Objects other than replicables
+    (e.g. lists) are decoded right away but their parts may be proxies.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # the proxy class (or None) for each encoded type
+        self.proxy_classes = {}
+
+    def decode(self, encoded_o, depth=0):
+        if not isinstance(encoded_o, dict):
+            return encoded_o
+        encoded_type = encoded_o['type']
+        parts = encoded_o['parts']
+        try:
+            lazy_class = self.proxy_classes[encoded_type]
+        except KeyError:
+            o_type = self.encoder.decode_type(encoded_type)
+            lazy_class = None
+            if isinstance(o_type, type) and issubclass(o_type, Replicable):
+                lazy_class = proxy_class(o_type)
+            self.proxy_classes[encoded_type] = lazy_class
+        if lazy_class is None or not isinstance(parts, dict):
+            return super().decode(encoded_o, depth)
+        proxy = object.__new__(lazy_class)
+        object.__setattr__(proxy, LAZY_STATE, (self, parts))
+        return proxy
@@ -3,6 +3,7 @@ tools for defining replicable objects
 """
 
 import inspect
+from operator import attrgetter
 
 from replicate.encoder import Encoder
 
@@ -32,6 +33,169 @@ class GloballyIdentifiedClass(type):
         return Encoder.default_identifier(cls)
 
 
+class ArgumentSlot(object):
+    """
+    a placeholder for the argument at a position or keyword of a call
+    """
+    def __init__(self, key):
+        self.key = key
+
+    def compile_getter(self):
+        key = self.key
+        if isinstance(key, int):
+            return lambda args, kwargs: args[key]
+        return lambda args, kwargs: kwargs[key]
+
+
+def compile_binder(f, nargs, kwnames):
+    """
+    compile a function which binds the arguments of calls to f to its
+    parameters like inspect.getcallargs
+
+    The way a call binds only depends on its number of positional arguments
+    and its keyword names so the binder is only valid for calls with nargs
+    positional arguments and keyword arguments named kwnames. None is
+    returned if such calls do not match f.
+    """
+    slots = [ArgumentSlot(i) for i in range(nargs)]
+    keyword_slots = {name: ArgumentSlot(name) for name in kwnames}
+    try:
+        layout = inspect.getcallargs(f, *slots, **keyword_slots)
+    except TypeError:
+        return None
+
+    # the parameters of a bound method (e.g. cls) are not in its signature
+    kinds = {name: parameter.kind for name, parameter
+             in inspect.signature(f).parameters.items()}
+    getters = []
+    for name, bound in layout.items():
+        kind = kinds.get(name)
+        if isinstance(bound, ArgumentSlot):
+            getter = bound.compile_getter()
+        elif kind is inspect.Parameter.VAR_POSITIONAL:
+            start = bound[0].key if bound else nargs
+            getter = (lambda start: lambda args, kwargs: args[start:])(start)
+        elif kind is inspect.Parameter.VAR_KEYWORD:
+            names = tuple(bound)
+            getter = (lambda names: lambda args, kwargs: {
+                name: kwargs[name] for name in names})(names)
+        else:
+            getter = (lambda default: lambda args, kwargs: default)(bound)
+        getters.append((name, getter))
+
+    def bind(args, kwargs):
+        return {name: getter(args, kwargs) for name, getter in getters}
+    return bind
+
+
+class ReplicableClass(GloballyIdentifiedClass):
+    """
+    metaclass for replicable classes
+
+    Everything a replicable class needs to find out about itself by
+    reflection (its preprocessors, its primary preprocessor and that
+    preprocessor's argspec) is found once, when the class is created. A parts
+    extractor and a constructor from parts specialized to the class are
+    compiled at the same time so that encoding and decoding instances needs
+    no reflection at all.
+
+    Which preprocessor a call to the class selects, and how the call binds to
+    that preprocessor, only depends on the call's number of positional
+    arguments and keyword names so both are compiled on the first call of
+    each such shape and cached in the class's dispatch table.
+    """
+    def __init__(cls, name, bases, nmspc):
+        super().__init__(name, bases, nmspc)
+        cls._dispatch = {}
+        cls._preprocessors = tuple(
+            attr for _name, attr in inspect.getmembers(cls)
+            if getattr(attr, '_is_preprocessor', False))
+
+        primary = None
+        for primary in cls._preprocessors:
+            if getattr(primary, '_is_primary', False):
+                break
+        cls._primary_preprocessor = primary
+
+        if primary is None:
+            cls._argspec = None
+            cls._extract_parts = staticmethod(lambda o: {})
+            cls._construct = staticmethod(cls._compile_kwargs_constructor())
+            return
+        cls._argspec = inspect.getfullargspec(primary)
+        cls._extract_parts = staticmethod(cls._compile_extractor())
+        cls._construct = staticmethod(cls._compile_constructor())
+
+    def _compile_extractor(cls):
+        argspec = cls._argspec
+        names = tuple(argspec.args)
+        names += tuple(name for name in [argspec.varargs, argspec.varkw]
+                       if name)
+
+        if not names:
+            return lambda o: {}
+        if len(names) == 1:
+            name, = names
+            return lambda o: {name: getattr(o, name)}
+        get_parts = attrgetter(*names)
+        return lambda o: dict(zip(names, get_parts(o)))
+
+    def _compile_constructor(cls):
+        primary = cls._primary_preprocessor
+        names = cls._argspec.args
+        varargs = cls._argspec.varargs
+        varkw = cls._argspec.varkw
+        has_default_init = cls.__init__ is Replicable.__init__
+
+        def construct(parts, o=None):
+            args = [parts[name] for name in names]
+            context = dict(zip(names, args))
+            kwargs = {}
+            if varargs:
+                context[varargs] = tuple(parts[varargs])
+                args.extend(context[varargs])
+            if varkw:
+                kwargs = context[varkw] = dict(parts[varkw])
+
+            if not has_default_init:
+                if o is None:
+                    return cls(*args, **kwargs)
+                o.__init__(*args, **kwargs)
+                return o
+
+            if o is None:
+                o = cls.__new__(cls)
+            processed_attrs = primary(*args, **kwargs)
+            if processed_attrs is None:
+                processed_attrs = context
+            for attr_name, attr in processed_attrs.items():
+                setattr(o, attr_name, attr)
+            return o
+
+        return construct
+
+    def _compile_kwargs_constructor(cls):
+        # without a primary preprocessor parts are passed by keyword
+        def construct(parts, o=None):
+            if o is None:
+                return cls(**parts)
+            o.__init__(**parts)
+            return o
+
+        return construct
+
+    def _compile_dispatch(cls, nargs, kwnames):
+        # the last matching preprocessor is selected, with the primary one
+        # considered first
+        selected = None
+        processors = (cls._primary_preprocessor, ) + cls._preprocessors
+        for preprocessor in processors:
+            binder = compile_binder(preprocessor, nargs, kwnames)
+            if binder is not None:
+                selected = preprocessor, binder
+        return selected
+
+
 def preprocessor(f):
     """
     decorator denoting a preprocessor method (see Replicable)
@@ -44,12 +208,11 @@ def primary_preprocessor(f):
     """
     decorator denoting the primary preprocessor method (see Replicable)
     """
-    f = preprocessor(f)
     f._is_primary = True
-    return f
+    return preprocessor(f)
 
 
-class Replicable(object, metaclass=GloballyIdentifiedClass):
+class Replicable(object, metaclass=ReplicableClass):
     """
     Base class for replicable objects
 
@@ -61,43 +224,48 @@ class Replicable(object, metaclass=GloballyIdentifiedClass):
     If None is returned, a dict is made from the call context of the function.
     """
     def __init__(self, *args, **kwargs):
-        processors = [self.primary_preprocessor] + list(self.preprocessors)
-        selected_preprocessor = None
-        for preprocessor in processors:
-            try:
-                context = inspect.getcallargs(preprocessor, *args, **kwargs)
-                selected_preprocessor = preprocessor
-            except Exception:
-                pass
+        cls = type(self)
+        shape = (len(args), frozenset(kwargs)) if kwargs else len(args)
+        try:
+            selected = cls._dispatch[shape]
+        except KeyError:
+            selected = cls._dispatch[shape] = cls._compile_dispatch(
+                len(args), frozenset(kwargs))
 
-        if not selected_preprocessor:
+        if selected is None:
             raise TypeError("Invalid instantiation arguments", args, kwargs)
 
+        selected_preprocessor, bind = selected
         processed_attrs = selected_preprocessor(*args, **kwargs)
         if processed_attrs is None:
-            processed_attrs = context
+            processed_attrs = bind(args, kwargs)
         for attr_name, attr in processed_attrs.items():
             setattr(self, attr_name, attr)
 
+    @classmethod
+    def from_parts(cls, parts, o=None):
+        """
+        construct a replicable from its parts (see Replicable.parts)
+
+        The parts are passed straight to the primary preprocessor rather than
+        to whichever preprocessor matches them. If an object made with
+        cls.__new__ is given it is initialized in place of a new one.
+        """
+        return cls._construct(parts, o)
+
     @property
     def preprocessors(self):
         """
         yield all preprocessors for a replicable
         """
-        for _name, attr in inspect.getmembers(type(self)):
-            if getattr(attr, '_is_preprocessor', False):
-                yield attr
+        return iter(type(self)._preprocessors)
 
     @property
     def primary_preprocessor(self):
         """
         return the primary preprocessor for the replicable
         """
-        preprocessor = None
-        for preprocessor in self.preprocessors:
-            if getattr(preprocessor, '_is_primary', False):
-                return preprocessor
-        return preprocessor
+        return type(self)._primary_preprocessor
 
     @property
     def parts(self):
@@ -107,18 +275,9 @@ class Replicable(object, metaclass=GloballyIdentifiedClass):
         by default these are the parameters to the replicable's primary
         preprocessor (or any preprocessor if there is no primary one)
         """
-        if hasattr(self, '_parts'):
+        if '_parts' in self.__dict__:
             return self._parts
-        argspec = inspect.getargspec(self.primary_preprocessor)
-        needed_attrs = {attr_name: getattr(self, attr_name)
-                        for attr_name in argspec.args}
-        if argspec.varargs:
-            needed_attrs[argspec.varargs] = getattr(self, argspec.varargs)
-
-        if argspec.keywords:
-            needed_attrs[argspec.keywords] = getattr(self, argspec.keywords)
-
-        return needed_attrs
+        return type(self)._extract_parts(self)
 
     def __eq__(self, other):
         return type(self) == type(other) and self.parts == other.parts
@@ -3,39 +3,212 @@ tools to replicate objects
 """
 
 
+import collections
+import itertools
 import json
+import os
+from concurrent.futures import ProcessPoolExecutor
 
 from functionals.recursive import CyclicRecursor
 
+from replicate import binary
 from replicate.composer import Composer
+from replicate.direct import DirectCodec
 from replicate.encoder import Encoder
+from replicate.identity import IdentityCodec
+from replicate.lazy import LazyCodec
+from replicate.streaming import is_json_dumps, JSONStreamCodec
 
 
 class Replicator(object):
     """
     object replicator
+
+    Objects are encoded with a DirectCodec when the composer and encoder are
+    not customized. Objects too deeply nested for it (and all objects when
+    the composer or encoder is customized) go through the composer and
+    encoder's pseudo-recursive cycles, which have no depth limit.
+
+    The wire format is json by default. Passing binary.dumps and
+    binary.loads as the serializer and deserializer selects the compact
+    binary format of the binary module, which the direct path writes and
+    reads without building the intermediate primitives. Such binary formats
+    are flagged by binary, in which case files should be opened in binary
+    mode and serializations may be deserialized from any buffer.
+
+    dump and load write objects to files and read them from files. With the
+    default json format (indented or not, see streaming.is_json_dumps) and
+    an uncustomized composer and encoder they do so incrementally, never
+    holding the whole encoding in memory.
+
+    With preserve_identity, objects referred to several times are encoded
+    once and decoded as a single object, and cyclic objects can be
+    replicated (see IdentityCodec). This needs an uncustomized composer and
+    encoder.
+
+    With lazy, deserialized replicables are proxies which only decode their
+    parts when they are first used (see LazyCodec). This also needs an
+    uncustomized composer and encoder.
+
+    serialize_many and deserialize_many spread the work on many independent
+    objects over a pool of processes. The replicator is pickled along with
+    each chunk of work so its composer, encoder, serializer, and
+    deserializer must be picklable (e.g. defined at the top level of a
+    module), as must the objects and the classes they are instances of.
     """
+    codecs_by_format = {
+        (json.dumps, json.loads): JSONStreamCodec,
+        (binary.dumps, binary.loads): binary.BinaryCodec,
+    }
+    # formats whose serializations are bytes and whose deserializer reads
+    # any buffer (e.g. a memoryview or mmap) without copying it
+    binary_formats = frozenset([(binary.dumps, binary.loads)])
+
     def __init__(self, composer=Composer(), encoder=Encoder(),
-                 serializer=json.dumps, deserializer=json.loads):
+                 serializer=json.dumps, deserializer=json.loads,
+                 preserve_identity=False, lazy=False):
         self.serializer = CyclicRecursor([composer.decompose, encoder.encode],
                                          postprocessor=serializer)
         self.deserializer = CyclicRecursor([encoder.decode, composer.compose],
                                            preprocessor=deserializer)
+        self.composer = composer
+        self.encoder = encoder
+        self.dumps = serializer
+        self.loads = deserializer
+        self.codec = None
+        self.binary = (serializer, deserializer) in self.binary_formats
+        self.preserve_identity = preserve_identity
+        if preserve_identity or lazy:
+            if preserve_identity and lazy:
+                raise ValueError("Lazy decoding does not preserve identity")
+            if not DirectCodec.supports(composer, encoder):
+                raise ValueError("Identity preservation and lazy decoding "
+                                 "need an uncustomized composer and encoder")
+            codec_class = IdentityCodec if preserve_identity else LazyCodec
+            self.codec = codec_class(composer, encoder, serializer,
+                                     deserializer)
+        elif DirectCodec.supports(composer, encoder):
+            wire_format = (serializer, deserializer)
+            if is_json_dumps(serializer):
+                # e.g. indented json, as written by filespaces
+                wire_format = (json.dumps, deserializer)
+            codec_class = self.codecs_by_format.get(wire_format, DirectCodec)
+            self.codec = codec_class(composer, encoder, serializer,
+                                     deserializer)
 
     def serialize(self, o):
         """
         serialize a replicable object
         """
+        if self.codec is not None:
+            try:
+                return self.codec.serialize(o)
+            except RecursionError:
+                if self.preserve_identity:
+                    raise
         return self.serializer.recurse(o)
 
     def deserialize(self, encoded_o):
         """
         deserialize a replicable object
         """
+        if self.codec is not None:
+            try:
+                return self.codec.deserialize(encoded_o)
+            except RecursionError:
+                if self.preserve_identity:
+                    raise
         return self.deserializer.recurse(encoded_o)
 
+    def dump(self, o, f):
+        """
+        serialize a replicable object to a file
+        """
+        if self.codec is not None and self.codec.streams:
+            self.codec.dump(o, f)
+        else:
+            f.write(self.serialize(o))
+
+    def load(self, f):
+        """
+        deserialize a replicable object from a file
+        """
+        if self.codec is not None and self.codec.streams:
+            return self.codec.load(f)
+        return self.deserialize(f.read())
+
     def replicate(self, o):
         """
         replicate an object
         """
         return self.deserialize(self.serialize(o))
+
+    def serialize_many(self, objects, executor=None, chunksize=256,
+                       max_in_flight=None):
+        """
+        serialize objects in parallel, yielding their serializations in
+        order
+
+        The objects are sent to the executor (by default a pool with a
+        process per CPU, shut down once the iterator is exhausted or closed)
+        in chunks of chunksize. Only max_in_flight chunks (by default a few
+        per CPU) are in flight at once so objects may be generated lazily.
+        """
+        return _map_chunks(_serialize_chunk, self, objects, executor,
+                           chunksize, max_in_flight)
+
+    def deserialize_many(self, encoded_objects, executor=None,
+                         chunksize=256, max_in_flight=None):
+        """
+        deserialize objects in parallel, yielding them in order (see
+        serialize_many)
+
+        Lazy replicators are not supported as their proxies are not
+        picklable.
+        """
+        if isinstance(self.codec, LazyCodec):
+            raise ValueError("Lazy replicators can not deserialize in "
+                             "other processes")
+        return _map_chunks(_deserialize_chunk, self, encoded_objects,
+                           executor, chunksize, max_in_flight)
+
+
+def _serialize_chunk(replicator, registrations, chunk):
+    Encoder.restore_registrations(registrations)
+    return [replicator.serialize(o) for o in chunk]
+
+
+def _deserialize_chunk(replicator, registrations, chunk):
+    Encoder.restore_registrations(registrations)
+    return [replicator.deserialize(encoded_o) for encoded_o in chunk]
+
+
+def _map_chunks(process_chunk, replicator, items, executor, chunksize,
+                max_in_flight):
+    # the registrations are sent with each chunk since workers, unlike
+    # forked ones, do not inherit them and the executor may not be ours
+    registrations = Encoder.custom_registrations()
+    owns_executor = executor is None
+    if owns_executor:
+        executor = ProcessPoolExecutor()
+    if max_in_flight is None:
+        max_in_flight = 2 * (os.cpu_count() or 1) + 1
+
+    items = iter(items)
+    in_flight = collections.deque()
+    try:
+        while True:
+            while len(in_flight) < max_in_flight:
+                chunk = list(itertools.islice(items, chunksize))
+                if not chunk:
+                    break
+                in_flight.append(executor.submit(process_chunk, replicator,
+                                                 registrations, chunk))
+            if not in_flight:
+                return
+            yield from in_flight.popleft().result()
+    finally:
+        for future in in_flight:
+            future.cancel()
+        if owns_executor:
+            executor.shutdown()
@@ -0,0 +1,340 @@
+"""
+streaming serialization of objects to and from files as json
+"""
+
+import functools
+import json
+import re
+from json.encoder import encode_basestring_ascii
+from json.scanner import make_scanner
+
+from replicate.direct import DirectCodec
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+NUMBER_CHARS = re.compile(r'[0-9.eE+-]*')
+
+# the roles of the containers being read (see JSONStreamCodec.load)
+RAW, OBJECT, PARTS = range(3)
+
+MISSING = object()
+
+
+def dumps_scalar(o):
+    """
+    json.dumps with shortcuts for the most common values
+    """
+    if type(o) is str:
+        return encode_basestring_ascii(o)
+    if type(o) is int:
+        return int.__repr__(o)
+    return json.dumps(o)
+
+
+def is_json_dumps(dumps):
+    """
+    return whether a serializer is json.dumps or a partial of it which only
+    sets an indent (e.g. functools.partial(json.dumps, indent=4))
+    """
+    if isinstance(dumps, functools.partial):
+        return (dumps.func is json.dumps and not dumps.args and
+                set(dumps.keywords) <= {'indent'})
+    return dumps is json.dumps
+
+
+def json_indent(dumps):
+    """
+    return the indent of the json written by a serializer for which
+    is_json_dumps holds
+    """
+    return getattr(dumps, 'keywords', {}).get('indent')
+
+
+class TokenStream(object):
+    """
+    reads the tokens of a json document from a file one chunk at a time
+
+    Scalars are parsed by the json module's scanner so only the structure of
+    containers is handled in python. A token cut by the end of a chunk is
+    parsed again once more of the file is read.
+    """
+    scan_once = staticmethod(make_scanner(json.JSONDecoder()))
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, size=None):
+        """
+        read the next chunk (of size characters if given), returning whether
+        there was one
+        """
+        if self.eof:
+            return False
+        chunk = self.f.read(size or self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """
+        skip whitespace and return the next character ('' at the end)
+        """
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise self.error("Expecting {!r}".format(char))
+        self.pos += 1
+
+    def scalar(self):
+        """
+        read a string, number, or literal
+
+        A scalar cut by the end of the buffer is scanned again after reading
+        as much as the buffer holds of it, so that the reads double in size
+        and a long scalar is scanned a number of times logarithmic in its
+        length.
+        """
+        while True:
+            try:
+                value, end = self.scan_once(self.buffer, self.pos)
+            except (StopIteration, json.JSONDecodeError):
+                if self.fill(self._refill_size()):
+                    continue
+                raise self.error("Expecting value") from None
+            # a number may go on in the next chunk
+            if (NUMBER_CHARS.match(self.buffer, end).end() ==
+                    len(self.buffer) and self.fill(self._refill_size())):
+                continue
+            self.pos = end
+            return value
+
+    def _refill_size(self):
+        return max(self.chunk_size, len(self.buffer) - self.pos)
+
+    def error(self, message):
+        return json.JSONDecodeError(message, self.buffer, self.pos)
+
+
+class JSONStreamCodec(DirectCodec):
+    """
+    a DirectCodec which also writes objects to files and reads them from
+    files in the json format without holding their encoding in memory
+
+    dump writes the encoding of each part as soon as it is reached and load
+    constructs each object as soon as the end of its encoding is read, so
+    besides the object itself only the stack of the containers being
+    written or read is kept. Both walk objects with an explicit stack and so
+    have no depth limit. The json written is the same as that of serialize,
+    including its indentation if dumps is a partial of json.dumps giving an
+    indent (see is_json_dumps).
+    """
+    streams = True
+    chunk_size = 1 << 16
+    window_size = 1 << 10
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # the indent of the json written (see json_indent)
+        self.indent = json_indent(self.dumps)
+        self._newlines = []
+
+    def dump(self, o, f):
+        """
+        encode an object to a (text) file
+        """
+        get_action = self.composer.get_action
+        indent = self.indent
+        item_separator = ', ' if indent is None else ','
+        type_ids = {}
+        chunks = []
+        write = chunks.append
+        # frames are (items, closing, depth of their items)
+        stack = []
+        depth = 0
+        while True:
+            action = get_action(o)
+            if action is None:
+                if indent is None or type(o) in (str, int):
+                    write(dumps_scalar(o))
+                else:
+                    write(json.dumps(o, indent=indent).replace(
+                        '\n', self._newline(depth)))
+            else:
+                o_type = type(o)
+                if o_type not in type_ids:
+                    type_ids[o_type] = encode_basestring_ascii(
+                        self.encoder.encode_type(o_type))
+                inner = self._newline(depth + 1)
+                write('{' + inner + '"type": ' + type_ids[o_type] +
+                      item_separator + inner + '"parts": ')
+                parts = self.composer._do_action(action, o)
+                first = self._newline(depth + 2)
+                later = item_separator + first
+                # empty containers are written without newlines
+                closing = ((inner if parts else '') +
+                           ('}' if hasattr(parts, 'items') else ']') +
+                           self._newline(depth) + '}')
+                if hasattr(parts, 'items'):
+                    write('{')
+                    items = self._entries(parts, first, later)
+                else:
+                    write('[')
+                    items = self._items(parts, first, later)
+                stack.append((items, closing, depth + 2))
+
+            if len(chunks) > 4096:
+                f.write(''.join(chunks))
+                chunks.clear()
+
+            while stack:
+                items, closing, depth = stack[-1]
+                try:
+                    separator, o = next(items)
+                except StopIteration:
+                    write(closing)
+                    stack.pop()
+                else:
+                    write(separator)
+                    break
+            else:
+                break
+        f.write(''.join(chunks))
+
+    def _newline(self, depth):
+        # the separator starting a line of the given depth when indenting
+        if self.indent is None:
+            return ''
+        newlines = self._newlines
+        while len(newlines) <= depth:
+            newlines.append('\n' + ' ' * (self.indent * len(newlines)))
+        return newlines[depth]
+
+    @staticmethod
+    def _entries(parts, first, later):
+        separator = first
+        for key, part in parts.items():
+            yield separator + encode_basestring_ascii(key) + ': ', part
+            separator = later
+
+    @staticmethod
+    def _items(parts, first, later):
+        separator = first
+        for part in parts:
+            yield separator, part
+            separator = later
+
+    def load(self, f):
+        """
+        decode an object from a (text) file
+
+        Values are decoded as by decode: a dict is an encoded object if it
+        is the top level value or a part of an encoded object, the value
+        under the 'parts' key of an encoded object is the container of its
+        parts, and every other value is left as it is. The role of each
+        container is known when it is opened so that encoded objects are
+        constructed as soon as they are closed.
+
+        Since most containers are small, each one is first parsed whole by
+        the json module's scanner if it ends within window_size characters
+        and only read token by token otherwise.
+        """
+        tokens = TokenStream(f, self.chunk_size)
+        # frames are [container, key, role]
+        stack = []
+        while True:
+            char = tokens.peek()
+            if char == '{' or char == '[':
+                is_dict = char == '{'
+                role = self._role_of(stack, is_dict)
+                value = self._scan_window(tokens, role)
+                if value is MISSING:
+                    tokens.pos += 1
+                    value = {} if is_dict else []
+                    if tokens.peek() != ('}' if is_dict else ']'):
+                        key = self._read_key(tokens) if is_dict else None
+                        stack.append([value, key, role])
+                        continue
+                    tokens.pos += 1
+                    value = self._finish(value, role)
+            else:
+                value = tokens.scalar()
+
+            while True:
+                if not stack:
+                    if tokens.peek() != '':
+                        raise tokens.error("Extra data")
+                    return value
+                frame = stack[-1]
+                container = frame[0]
+                if type(container) is list:
+                    container.append(value)
+                else:
+                    container[frame[1]] = value
+
+                char = tokens.peek()
+                tokens.pos += 1
+                if char == ',':
+                    if type(container) is dict:
+                        frame[1] = self._read_key(tokens)
+                    break
+                if char != ('}' if type(container) is dict else ']'):
+                    tokens.pos -= 1
+                    raise tokens.error("Expecting ',' delimiter")
+                stack.pop()
+                value = self._finish(container, frame[2])
+
+    def _scan_window(self, tokens, role):
+        # return the decoded container starting at the current position if
+        # it ends within the window and MISSING otherwise
+        window = tokens.buffer[tokens.pos:tokens.pos + self.window_size]
+        try:
+            value, end = tokens.scan_once(window, 0)
+            if role == OBJECT:
+                value = self.decode(value)
+            elif role == PARTS:
+                if isinstance(value, dict):
+                    value = {key: self.decode(part, 1)
+                             for key, part in value.items()}
+                else:
+                    value = [self.decode(part, 1) for part in value]
+        except (StopIteration, ValueError, RecursionError):
+            return MISSING
+        tokens.pos += end
+        return value
+
+    @staticmethod
+    def _role_of(stack, is_dict):
+        if not stack:
+            return OBJECT if is_dict else RAW
+        _container, key, parent_role = stack[-1]
+        if parent_role == OBJECT:
+            return PARTS if key == 'parts' else RAW
+        if parent_role == PARTS and is_dict:
+            return OBJECT
+        return RAW
+
+    @staticmethod
+    def _read_key(tokens):
+        if tokens.peek() != '"':
+            raise tokens.error("Expecting property name")
+        key = tokens.scalar()
+        tokens.expect(':')
+        return key
+
+    def _finish(self, container, role):
+        if role != OBJECT:
+            return container
+        o_type = self.encoder.decode_type(container['type'])
+        return self.composer.construct(o_type, container['parts'])
@@ -0,0 +1,115 @@
+"""
+unit tests for the aiofilespace module
+"""
+
+import asyncio
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from replicate import examples
+from replicate.aiofilespace import AsyncFilespace
+from replicate.filespace import Filespace
+
+
+class TracingFilespace(Filespace):
+    """
+    a Filespace counting the reads it makes and how many run at once
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+        self.reads = 0
+        self.running = 0
+        self.max_running = 0
+
+    def __getitem__(self, item):
+        with self.lock:
+            self.reads += 1
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            time.sleep(0.02)
+            return super().__getitem__(item)
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+class AsyncFilespaceTestCase(unittest.IsolatedAsyncioTestCase):
+    """
+    Abstract base class for AsyncFilespace test cases
+    """
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.filespace = TracingFilespace(self.working_dir)
+        self.async_filespace = AsyncFilespace(self.filespace, per_directory=2)
+
+    def tearDown(self):
+        self.async_filespace.close()
+        shutil.rmtree(self.working_dir)
+
+
+class AsyncOperations(AsyncFilespaceTestCase):
+    async def test_set_get_delete(self):
+        card = examples.Card(1, 'clubs')
+        await self.async_filespace.set("card", card)
+        await self.async_filespace.set("text", "text")
+        self.assertEqual(await self.async_filespace.get("card"), card)
+        self.assertEqual(await self.async_filespace.get("text"), "text")
+        self.assertEqual(await self.async_filespace.keys(), ["card", "text"])
+        self.assertEqual(await self.async_filespace.glob("c*"), ["card"])
+        await self.async_filespace.delete("card")
+        self.assertFalse(await self.async_filespace.contains("card"))
+
+    async def test_subspace(self):
+        subspace = await self.async_filespace.get("sub")
+        self.assertIsInstance(subspace, AsyncFilespace)
+        await subspace.set("text", "text")
+        self.assertEqual(await self.async_filespace.get("sub/text"), "text")
+
+    async def test_coalesced_reads(self):
+        card = examples.Card(1, 'clubs')
+        await self.async_filespace.set("card", card)
+        values = await asyncio.gather(
+            *[self.async_filespace.get("card") for _ in range(10)])
+        self.assertEqual(values, [card] * 10)
+        self.assertEqual(self.filespace.reads, 1)
+        await self.async_filespace.get("card")
+        self.assertEqual(self.filespace.reads, 2)
+
+    async def test_read_after_write(self):
+        await self.async_filespace.set("text", "old")
+        read = asyncio.ensure_future(self.async_filespace.get("text"))
+        await asyncio.sleep(0)
+        await self.async_filespace.set("text", "new")
+        self.assertEqual(await self.async_filespace.get("text"), "new")
+        await read
+
+    async def test_read_during_write(self):
+        for _ in range(20):
+            await self.async_filespace.set("deck", examples.Deck([], 'old'))
+            deck = examples.Deck([examples.Card(rank, 'clubs')
+                                  for rank in range(1000)], 'new')
+            write = self.async_filespace.set("deck", deck)
+            self.assertEqual(await self.async_filespace.get("deck"), deck)
+            await write
+            delete = self.async_filespace.delete("deck")
+            self.assertFalse(await self.async_filespace.contains("deck"))
+            await delete
+        self.assertEqual(self.async_filespace._paths, {})
+
+    async def test_per_directory_limit(self):
+        for i in range(8):
+            await self.async_filespace.set(str(i), str(i))
+        values = await asyncio.gather(
+            *[self.async_filespace.get(str(i)) for i in range(8)])
+        self.assertEqual(values, [str(i) for i in range(8)])
+        self.assertEqual(self.filespace.max_running, 2)
+
+    async def test_errors(self):
+        await self.async_filespace.set("text", "text")
+        with self.assertRaises(NotADirectoryError):
+            await self.async_filespace.get("text/nested")
@@ -0,0 +1,129 @@
+"""
+unit tests for the binary wire format
+"""
+
+import json
+import unittest
+
+from functionals.recursive import CyclicRecursor
+
+from replicate import binary, examples
+from replicate.composer import Composer
+from replicate.direct import DirectCodec
+from replicate.encoder import Encoder
+from replicate.replicator import Replicator
+
+
+def make_deck(size=20):
+    return examples.Deck([examples.Card(rank, ['clubs', 'hearts'][rank % 2])
+                          for rank in range(size)], 'Acme')
+
+
+class Primitives(unittest.TestCase):
+    """
+    test the round trip of python primitives through dumps and loads
+    """
+    def assertRoundTrips(self, o):
+        self.assertEqual(binary.loads(binary.dumps(o)), o)
+
+    def test_ints(self):
+        for n in [0, 1, 127, 128, 300, -1, -32, -33, -300, 2 ** 64,
+                  -2 ** 100]:
+            self.assertRoundTrips(n)
+
+    def test_scalars(self):
+        for o in [None, True, False, 1.5, -0.0, float('inf'), b'\x00\xff']:
+            self.assertRoundTrips(o)
+
+    def test_strings(self):
+        for s in ['', 'a', 'x' * 31, 'x' * 32, 'x' * 1000, 'caf\xe9']:
+            self.assertRoundTrips(s)
+
+    def test_containers(self):
+        self.assertRoundTrips([])
+        self.assertRoundTrips(list(range(100)))
+        self.assertRoundTrips({i: str(i) for i in range(20)})
+        self.assertRoundTrips({'a': [1, {'b': None}], 'c': {}})
+        self.assertEqual(binary.loads(binary.dumps((1, (2, )))), [1, [2]])
+
+    def test_small_values_fit_in_tag(self):
+        body = binary.dumps([1, -1, 'a', {}])[len(binary.MAGIC) + 1:]
+        self.assertEqual(len(body), 1 + 1 + 1 + 2 + 1)
+
+    def test_unserializable(self):
+        with self.assertRaises(TypeError):
+            binary.dumps(object())
+
+    def test_invalid_streams(self):
+        with self.assertRaises(binary.DecodeError):
+            binary.loads(b'{}')
+        data = binary.dumps(['abc', 300])
+        for end in range(len(binary.MAGIC), len(data)):
+            with self.assertRaises(binary.DecodeError):
+                binary.loads(data[:end])
+        with self.assertRaises(binary.DecodeError):
+            binary.loads(data + b'\x00')
+
+
+class TypeTable(unittest.TestCase):
+    """
+    test the interning of type identifiers
+    """
+    def test_objects_round_trip(self):
+        encoded = {'type': 'a.B', 'parts': {'c': {'type': 'a.B',
+                                                  'parts': [1]}}}
+        self.assertEqual(binary.loads(binary.dumps(encoded)), encoded)
+
+    def test_type_written_once(self):
+        data = binary.dumps([{'type': 'some.module.Type', 'parts': [i]}
+                             for i in range(10)])
+        self.assertEqual(data.count(b'some.module.Type'), 1)
+
+    def test_only_objects_interned(self):
+        for o in [{'type': 1, 'parts': 2}, {'type': 'a', 'other': 2},
+                  {'type': 'a'}]:
+            self.assertEqual(binary.loads(binary.dumps(o)), o)
+            self.assertNotIn(bytes([binary.OBJECT]), binary.dumps(o))
+
+
+class BinaryReplication(unittest.TestCase):
+    """
+    test replicating objects in the binary format
+    """
+    def setUp(self):
+        self.replicator = Replicator(serializer=binary.dumps,
+                                     deserializer=binary.loads)
+        composer, encoder = Composer(), Encoder()
+        self.trampoline = CyclicRecursor([composer.decompose, encoder.encode],
+                                         postprocessor=binary.dumps)
+
+    def test_codec(self):
+        self.assertIsInstance(self.replicator.codec, binary.BinaryCodec)
+        self.assertNotIsInstance(Replicator().codec, binary.BinaryCodec)
+
+    def test_same_stream_as_dumps(self):
+        for o in [1, 'a', [1, (2, {3})], make_deck(), {'a': 1}]:
+            self.assertEqual(self.replicator.serialize(o),
+                             self.trampoline.recurse(o))
+
+    def test_replicate(self):
+        for o in [1, None, 'a', [1, [2]], make_deck(),
+                  examples.Hand('Ann', examples.Card(1, 'clubs'))]:
+            self.assertEqual(self.replicator.replicate(o), o)
+
+    def test_deep_objects_fall_back(self):
+        o = []
+        for _ in range(DirectCodec.max_depth + 10):
+            o = [o]
+        self.assertEqual(self.replicator.replicate(o), o)
+
+    def test_smaller_than_json(self):
+        deck = make_deck(1000)
+        self.assertLess(len(self.replicator.serialize(deck)) * 2,
+                        len(Replicator().serialize(deck)))
+
+    def test_compatible_with_json_encoding(self):
+        deck = make_deck()
+        encoded = json.loads(Replicator().serialize(deck))
+        self.assertEqual(self.replicator.deserialize(binary.dumps(encoded)),
+                         deck)
@@ -0,0 +1,120 @@
+"""
+unit tests for the cache module
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from functionals.caches import LRUCache, MISSING, TieredCache
+from functionals.dynamic import Memoizer
+from functionals.keys import KWARGS_MARK
+
+from replicate import binary, examples
+from replicate.cache import FilespaceCache
+from replicate.filespace import Filespace
+from replicate.replicator import Replicator
+
+
+class FilespaceCacheTestCase(unittest.TestCase):
+    """
+    Abstract base class for FilespaceCache test cases
+    """
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.cache = FilespaceCache(self.working_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+
+class PersistEntries(FilespaceCacheTestCase):
+    def test_store_and_lookup(self):
+        key = (1, 'clubs', KWARGS_MARK, frozenset({('brand', 'Acme')}))
+        deck = examples.Deck([examples.Card(1, 'clubs')], 'Acme')
+        self.assertIs(self.cache.lookup(key), MISSING)
+        self.cache.store(key, deck)
+        self.assertIn(key, self.cache)
+        self.assertEqual(self.cache.lookup(key), deck)
+        self.assertEqual(len(self.cache), 1)
+
+    def test_strings_stay_strings(self):
+        self.cache.store('key', '12')
+        self.assertEqual(self.cache.lookup('key'), '12')
+
+    def test_stable_digest(self):
+        items = [('a', 1), ('b', 2), ('c', 3), ('d', 4)]
+        self.assertEqual(self.cache.digest(((), frozenset(items))),
+                         self.cache.digest(((), frozenset(items[::-1]))))
+        self.assertNotEqual(self.cache.digest((1,)),
+                            self.cache.digest((2,)))
+
+    def test_kwargs_mark_is_not_a_string(self):
+        kwargs = frozenset({('b', 2)})
+        self.assertNotEqual(self.cache.digest((1, KWARGS_MARK, kwargs)),
+                            self.cache.digest((1, 'KWARGS_MARK', kwargs)))
+        self.cache.store((1, KWARGS_MARK, kwargs), 'keywords')
+        self.assertIs(self.cache.lookup((1, 'KWARGS_MARK', kwargs)),
+                      MISSING)
+
+    def test_no_temporary_files_left(self):
+        self.cache.store(1, 2)
+        self.assertEqual(os.listdir(self.working_dir),
+                         [self.cache.digest(1) + '.encoded'])
+
+    def test_discard_and_clear(self):
+        self.cache.store(1, 2)
+        self.cache.store(2, 3)
+        self.cache.discard(1)
+        self.cache.discard(1)
+        self.assertNotIn(1, self.cache)
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+
+
+class BinaryEntries(FilespaceCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.replicator = Replicator(serializer=binary.dumps,
+                                     deserializer=binary.loads)
+        self.cache = FilespaceCache(Filespace(self.working_dir,
+                                              self.replicator))
+
+    def test_store_and_lookup(self):
+        key = (1, KWARGS_MARK, frozenset({('a', 1), ('b', 2)}))
+        deck = examples.Deck([examples.Card(1, 'clubs')], 'Acme')
+        self.cache.store(key, deck)
+        self.assertEqual(self.cache.lookup(key), deck)
+        self.assertIs(self.cache.lookup((2, )), MISSING)
+        with open(self.cache.path_of(key), 'rb') as f:
+            self.assertEqual(self.replicator.deserialize(f.read()), deck)
+
+
+class MemoizeToDisk(FilespaceCacheTestCase):
+    def memoize(self, cache):
+        calls = []
+
+        @Memoizer.configure(cache=cache)
+        def deal(rank, suit='clubs'):
+            calls.append(rank)
+            return examples.Card(rank, suit)
+
+        return deal, calls
+
+    def test_results_outlive_memoizer(self):
+        deal, calls = self.memoize(self.cache)
+        self.assertEqual(deal(1, suit='hearts'), examples.Card(1, 'hearts'))
+
+        deal, calls = self.memoize(FilespaceCache(self.working_dir))
+        self.assertEqual(deal(1, suit='hearts'), examples.Card(1, 'hearts'))
+        self.assertEqual(calls, [])
+
+    def test_memory_tier(self):
+        memory = LRUCache(maxsize=1)
+        deal, calls = self.memoize(TieredCache(memory, self.cache))
+        deal(1)
+        deal(2)
+        deal(1)
+        self.assertEqual(calls, [1, 2])
+        self.assertEqual((memory.hits, self.cache.hits), (0, 1))
@@ -0,0 +1,145 @@
+"""
+unit tests for the composer module
+"""
+
+import datetime
+import unittest
+from fractions import Fraction
+
+from replicate import binary, examples
+from replicate.composer import Composer
+from replicate.replicator import Replicator
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def point_parts(p):
+    return [p.x, p.y]
+
+
+def construct_point(o_type, parts):
+    return o_type(*parts)
+
+
+class Point(object):
+    def __init__(self, x, y):
+        self.x, self.y = x, y
+
+    def __eq__(self, other):
+        return (type(self), self.x, self.y) == (type(other), other.x, other.y)
+
+
+class LabeledPoint(Point):
+    pass
+
+
+VALUES = [
+    None, True, False, b'ab\x00\xff', bytearray(b'xy'), Fraction(-3, 7),
+    datetime.datetime(2020, 1, 2, 3, 4, 5, 6),
+    datetime.datetime(2020, 1, 2, tzinfo=datetime.timezone.utc),
+    datetime.date(2020, 1, 2), datetime.time(1, 2, 3),
+    datetime.timedelta(days=-3, seconds=5, microseconds=7),
+    {1, 2, 3}, frozenset(['a']), (1, [2, {3}]),
+]
+
+
+class Dispatch(unittest.TestCase):
+    """
+    test the lookup of the action for each type
+    """
+    def test_follows_mro(self):
+        composer = Composer()
+        self.assertIsNone(composer.get_action(True))
+        self.assertEqual(composer.get_action(datetime.datetime.now()),
+                         composer.get_action(datetime.date.today()))
+        self.assertEqual(composer.get_action(examples.Card(1, 'clubs')),
+                         'parts')
+
+        composer.register(Point, point_parts, construct_point)
+        self.assertIs(composer.get_action(LabeledPoint(1, 2)), point_parts)
+        self.assertIs(composer.get_constructor(LabeledPoint),
+                      construct_point)
+        self.assertIsNone(composer.get_constructor(list))
+
+    def test_register(self):
+        composer = Composer()
+        self.assertIsNone(composer.get_action(Point(1, 2)))
+        composer.register(Point, point_parts, construct_point)
+        replicator = Replicator(composer=composer)
+        for o in [Point(1, 2), LabeledPoint(3, 4), [Point(5, 6)]]:
+            self.assertEqual(replicator.replicate(o), o)
+        self.assertIsNone(Composer().get_action(Point(1, 2)))
+
+
+class Builtins(unittest.TestCase):
+    """
+    test the replication of builtin values
+    """
+    replicators = {
+        'json': Replicator(),
+        'binary': Replicator(serializer=binary.dumps,
+                             deserializer=binary.loads),
+        'identity': Replicator(preserve_identity=True),
+    }
+
+    def test_round_trip(self):
+        for name, replicator in self.replicators.items():
+            for value in VALUES:
+                with self.subTest(format=name, value=value):
+                    replicated = replicator.replicate(value)
+                    self.assertEqual(replicated, value)
+                    self.assertIs(type(replicated), type(value))
+
+    def test_memoryview(self):
+        for name, replicator in self.replicators.items():
+            with self.subTest(format=name):
+                replicated = replicator.replicate(memoryview(b'abc'))
+                self.assertIsInstance(replicated, memoryview)
+                self.assertEqual(replicated.tobytes(), b'abc')
+
+    def test_strided_memoryview(self):
+        for name, replicator in self.replicators.items():
+            with self.subTest(format=name):
+                replicated = replicator.replicate(memoryview(b'abcdef')[::2])
+                self.assertEqual(replicated.tobytes(), b'ace')
+
+    def test_json_buffers(self):
+        self.assertEqual(Replicator().serialize(b'ab'),
+                         '{"type": "builtins.bytes", "parts": ["YWI="]}')
+
+    def test_binary_buffers_zero_copy(self):
+        replicator = self.replicators['binary']
+        serialized = replicator.serialize(memoryview(b'abc'))
+        self.assertIn(b'\xc4\x03abc', serialized)
+        self.assertIs(replicator.deserialize(serialized).obj, serialized)
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class Arrays(unittest.TestCase):
+    """
+    test the replication of numpy arrays
+    """
+    def test_round_trip(self):
+        arrays = [numpy.arange(12, dtype='<i4').reshape(3, 4),
+                  numpy.arange(12.).reshape(3, 4).T, numpy.array(1.5),
+                  numpy.zeros((0, 2), dtype=bool)]
+        for replicator in Builtins.replicators.values():
+            for array in arrays:
+                replicated = replicator.replicate(array)
+                self.assertEqual(replicated.dtype, array.dtype)
+                numpy.testing.assert_array_equal(replicated, array)
+
+    def test_binary_zero_copy(self):
+        replicator = Builtins.replicators['binary']
+        serialized = replicator.serialize(numpy.arange(4.))
+        base = replicator.deserialize(serialized)
+        while isinstance(base, numpy.ndarray):
+            base = base.base
+        self.assertIs(base.obj, serialized)
+
+    def test_object_arrays(self):
+        with self.assertRaises(TypeError):
+            Replicator().serialize(numpy.array([object()]))
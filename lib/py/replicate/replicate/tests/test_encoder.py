@@ -0,0 +1,120 @@
+"""
+unit tests for the encoder module
+"""
+
+import collections
+import json
+import unittest
+from unittest import mock
+
+from replicate import examples
+from replicate.encoder import Encoder
+from replicate.replicator import Replicator
+
+
+class TypeResolution(unittest.TestCase):
+    """
+    test the decoding and caching of global identifiers
+    """
+    def setUp(self):
+        self.encoder = Encoder()
+
+    def test_decode_type(self):
+        self.assertIs(self.encoder.decode_type('replicate.examples.Card'),
+                      examples.Card)
+        self.assertIs(self.encoder.decode_type('collections.OrderedDict'),
+                      collections.OrderedDict)
+
+    def test_imports_once(self):
+        with mock.patch.object(Encoder, 'decode_default_identifier',
+                               wraps=Encoder.decode_default_identifier) as f:
+            for _ in range(3):
+                self.encoder.decode_type('collections.OrderedDict')
+        self.assertEqual(f.call_count, 1)
+
+    def test_negative_caching(self):
+        with mock.patch.object(Encoder, 'decode_default_identifier',
+                               wraps=Encoder.decode_default_identifier) as f:
+            for _ in range(3):
+                with self.assertRaises(ImportError):
+                    self.encoder.decode_type('no.such.module.Type')
+                with self.assertRaises(AttributeError):
+                    self.encoder.decode_type('collections.NoSuchType')
+        self.assertEqual(f.call_count, 2)
+
+        self.encoder.clear_cache()
+        with self.assertRaises(ImportError):
+            self.encoder.decode_type('no.such.module.Type')
+
+    def test_bounded_negative_caching(self):
+        encoder = Encoder(max_unresolved=8)
+        for i in range(100):
+            with self.assertRaises(ImportError):
+                encoder.decode_type('no.such.module{}.Type'.format(i))
+        self.assertEqual(len(encoder.unresolved_types), 8)
+
+        encoder = Encoder(allowed_modules=['replicate'])
+        for i in range(100):
+            with self.assertRaises(ValueError):
+                encoder.decode_type('os.Type{}'.format(i))
+            with self.assertRaises(ValueError):
+                encoder.decode_type('replicate.filespace.shutil')
+        self.assertEqual(len(encoder.unresolved_types), 0)
+        self.assertEqual(encoder.resolved_types, {})
+
+    def test_registration_after_negative_caching(self):
+        with self.assertRaises(ImportError):
+            self.encoder.decode_type('late.Registered')
+        registrations = {'late.Registered': examples.Card}
+        Encoder.restore_registrations(registrations)
+        try:
+            self.assertIs(self.encoder.decode_type('late.Registered'),
+                          examples.Card)
+        finally:
+            del Encoder.constructors_by_typeid['late.Registered']
+            Encoder.typeids_by_constructor[examples.Card] = (
+                'replicate.examples.Card')
+
+    def test_allowed_modules(self):
+        encoder = Encoder(allowed_modules=['replicate'])
+        self.assertIs(encoder.decode_type('replicate.examples.Card'),
+                      examples.Card)
+        self.assertIs(encoder.decode_type('builtins.list'), list)
+        for encoded_type in ['builtins.open', 'os.system',
+                             'replicated.Type', 'Card']:
+            with self.assertRaises(ValueError):
+                encoder.decode_type(encoded_type)
+
+    def test_reexported_names(self):
+        encoder = Encoder(allowed_modules=['replicate'])
+        for encoded_type in ['replicate.replicator.ProcessPoolExecutor',
+                             'replicate.filespace.shutil',
+                             'replicate.replicable.inspect']:
+            with self.assertRaises(ValueError):
+                encoder.decode_type(encoded_type)
+        replicator = Replicator(encoder=encoder)
+        encoded = json.dumps({
+            'type': 'replicate.replicator.ProcessPoolExecutor',
+            'parts': {'max_workers': 1}})
+        with self.assertRaises(ValueError):
+            replicator.deserialize(encoded)
+
+    def test_allowed_modules_in_replicator(self):
+        replicator = Replicator(encoder=Encoder(allowed_modules=[]))
+        self.assertEqual(replicator.replicate([1, (2, )]), [1, (2, )])
+        encoded = json.dumps({'type': 'builtins.open',
+                              'parts': {'file': '/dev/null'}})
+        with self.assertRaises(ValueError):
+            replicator.deserialize(encoded)
+
+    def test_preload(self):
+        self.encoder.preload(['replicate.examples'])
+        self.assertIs(self.encoder.resolved_types['replicate.examples.Card'],
+                      examples.Card)
+        self.assertNotIn('replicate.examples.Replicable',
+                         self.encoder.resolved_types)
+
+        encoder = Encoder(allowed_modules=['collections'])
+        encoder.preload(['replicate.examples', 'collections.abc'])
+        self.assertNotIn('replicate.examples.Card', encoder.resolved_types)
+        self.assertIn('collections.abc.Mapping', encoder.resolved_types)
@@ -55,3 +55,15 @@ class BasicInterfacing(ReplicatorTestCase):
         self.assertEqual(deck_copy.brand, deck.brand)
 
         self.assertNotEqual(id(deck_copy.cards[0]), id(deck.cards[0]))
+
+    def test_replicate_varargs(self):
+        """
+        test replication of example Hand object
+        """
+        cards = [examples.Card(1, 'clubs'), examples.Card(2, 'hearts')]
+        hand = examples.Hand(examples.Deck(cards, 'Acme'), 'Ann', 2)
+        self.assertEqual(hand.cards, tuple(cards))
+
+        hand_copy = self.replicator.replicate(hand)
+        self.assertEqual(hand_copy, hand)
+        self.assertEqual(hand_copy.player, 'Ann')
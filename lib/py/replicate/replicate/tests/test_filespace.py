@@ -2,13 +2,23 @@
 unit tests for filespace module
 """
 
+import mmap
 import os
 import shutil
+import stat
 import tempfile
+import threading
+import time
 import unittest
+from unittest import mock
 
-from replicate import examples
-from replicate.filespace import Filespace, standard_replicator
+from functionals.caches import Cache, LRUCache, TieredCache
+
+from replicate import binary, examples
+from replicate.filespace import (FSYNC_FULL, Filespace,
+                                 standard_replicator)
+from replicate.replicator import Replicator
+from replicate.streaming import JSONStreamCodec
 
 
 class FilespaceTestCase(unittest.TestCase):
@@ -26,8 +36,8 @@ class FilespaceTestCase(unittest.TestCase):
         with open(os.path.join(self.working_dir, filename), 'w') as f:
             f.write(contents)
 
-    def read_from(self, filename):
-        with open(os.path.join(self.working_dir, filename), 'r') as f:
+    def read_from(self, filename, mode='r'):
+        with open(os.path.join(self.working_dir, filename), mode) as f:
             return f.read()
 
 
@@ -93,3 +103,334 @@ class DeleteInFilespace(FilespaceTestCase):
         self.assertTrue(os.path.exists(full_path))
         del self.filespace["foodir"]
         self.assertFalse(os.path.exists(full_path))
+
+
+class ListFilespace(FilespaceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.filespace["b"] = "plain"
+        self.filespace["a"] = examples.Card(1, 'clubs')
+        os.mkdir(os.path.join(self.working_dir, "decks"))
+        self.filespace["decks/acme"] = examples.Card(2, 'hearts')
+        self.filespace["decks/bold"] = "bold"
+        self.write_to(".hidden.tmp")
+
+    def test_keys(self):
+        self.assertEqual(list(self.filespace.keys()), ["a", "b", "decks"])
+        self.assertEqual(len(self.filespace), 3)
+        self.assertIn("a", self.filespace)
+        self.assertIn("decks/bold", self.filespace)
+        self.assertNotIn("c", self.filespace)
+
+    def test_items(self):
+        items = dict(self.filespace.items())
+        self.assertEqual(items["a"], examples.Card(1, 'clubs'))
+        self.assertEqual(items["b"], "plain")
+        self.assertEqual(items["decks"].root_dir,
+                         os.path.join(self.working_dir, "decks"))
+
+    def test_glob(self):
+        self.assertEqual(list(self.filespace.glob("[ab]")), ["a", "b"])
+        self.assertEqual(list(self.filespace.glob("*/a*")), ["decks/acme"])
+        self.assertEqual(list(self.filespace.glob("b/*")), [])
+
+
+class BulkFilespace(FilespaceTestCase):
+    def test_put_and_get_many(self):
+        values = {"card{}".format(i): examples.Card(i, 'clubs')
+                  for i in range(20)}
+        values["text"] = "text"
+        self.filespace.put_many(values)
+        self.assertEqual(self.filespace.get_many(values),
+                         list(values.values()))
+        os.mkdir(os.path.join(self.working_dir, "sub"))
+        self.filespace["sub/card"] = values["card1"]
+        self.assertEqual(self.filespace.get_many(["sub/card", "card1"]),
+                         [values["card1"]] * 2)
+
+
+class IndexedFilespace(FilespaceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.filespace = Filespace(self.working_dir, cache_index=True)
+
+    def test_index(self):
+        self.filespace["card"] = examples.Card(1, 'clubs')
+        self.assertIn("card", self.filespace)
+        self.write_to("outside", "text")
+        self.assertNotIn("outside", self.filespace)
+        self.filespace.refresh_index()
+        self.assertEqual(self.filespace["outside"], "text")
+
+    def test_index_follows_own_changes(self):
+        self.assertNotIn("card", self.filespace)
+        self.filespace["card"] = examples.Card(1, 'clubs')
+        self.assertEqual(self.filespace["card"], examples.Card(1, 'clubs'))
+        del self.filespace["card"]
+        self.assertNotIn("card", self.filespace)
+        self.assertFalse(os.listdir(self.working_dir))
+
+
+class MappedFilespace(FilespaceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.binary_replicator = Replicator(serializer=binary.dumps,
+                                            deserializer=binary.loads)
+
+    def test_read_unencoded_file(self):
+        self.write_to("Aeneid", "ARMA VIRVMQVE CANO")
+        self.write_to("empty")
+        filespace = Filespace(self.working_dir, memory_map=True)
+        contents = filespace["Aeneid"]
+        self.assertIsInstance(contents, memoryview)
+        self.assertIsInstance(contents.obj, mmap.mmap)
+        self.assertEqual(contents, b"ARMA VIRVMQVE CANO")
+        self.assertEqual(filespace["empty"], b"")
+
+    def test_read_binary_file(self):
+        deck = examples.Deck([examples.Card(1, 'clubs')], 'Acme')
+        for memory_map in [False, True]:
+            filespace = Filespace(self.working_dir, self.binary_replicator,
+                                  memory_map=memory_map)
+            filespace["deck"] = deck
+            self.assertEqual(filespace["deck"], deck)
+        self.assertEqual(
+            self.read_from("deck.encoded", 'rb'),
+            self.binary_replicator.serialize(deck))
+
+    def test_zero_copy_buffers(self):
+        filespace = Filespace(self.working_dir, self.binary_replicator,
+                              memory_map=True)
+        filespace["buffer"] = memoryview(b"\x00\x01" * 1000)
+        read = filespace["buffer"]
+        self.assertEqual(read, b"\x00\x01" * 1000)
+        self.assertIsInstance(read.obj, mmap.mmap)
+
+    def test_text_encoded_file(self):
+        deck = examples.Deck([examples.Card(1, 'clubs')], 'Acme')
+        filespace = Filespace(self.working_dir, memory_map=True)
+        filespace["deck"] = deck
+        self.assertEqual(filespace["deck"], deck)
+
+    def test_rewrite_keeps_mapped_values(self):
+        filespace = Filespace(self.working_dir, memory_map=True)
+        self.assertTrue(filespace.atomic)
+        filespace["x"] = "a" * 100000
+        mapped = filespace["x"]
+        filespace["x"] = "b"
+        # the earlier mapping still holds the replaced file
+        self.assertEqual(bytes(mapped[-10:]), b"a" * 10)
+        self.assertEqual(filespace["x"], b"b")
+
+
+class ExclusiveCache(LRUCache):
+    """
+    an LRUCache noting whether it is ever used by two threads at once
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.users = 0
+        self.overlapped = False
+
+    def _use(self, f, *args):
+        self.users += 1
+        self.overlapped = self.overlapped or self.users > 1
+        try:
+            time.sleep(0.0005)
+            return f(*args)
+        finally:
+            self.users -= 1
+
+    def _get(self, key):
+        return self._use(super()._get, key)
+
+    def _set(self, key, value):
+        return self._use(super()._set, key, value)
+
+    def _delete(self, key):
+        return self._use(super()._delete, key)
+
+
+class StreamingFilespace(FilespaceTestCase):
+    def test_streams_encoded_files(self):
+        self.assertIsInstance(standard_replicator.codec, JSONStreamCodec)
+        deck = examples.Deck([examples.Card(1, 'clubs')], 'Acme')
+        with mock.patch.object(JSONStreamCodec, 'dump',
+                               wraps=standard_replicator.codec.dump) as dump:
+            self.filespace["deck"] = deck
+        dump.assert_called_once()
+        with mock.patch.object(JSONStreamCodec, 'load',
+                               wraps=standard_replicator.codec.load) as load:
+            self.assertEqual(self.filespace["deck"], deck)
+        load.assert_called_once()
+        # still written as indented json
+        self.assertEqual(self.read_from("deck.encoded"),
+                         standard_replicator.serialize(deck))
+
+
+class AtomicWrites(FilespaceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.filespace = Filespace(self.working_dir, atomic=True)
+
+    def test_write(self):
+        card = examples.Card(1, 'clubs')
+        self.filespace["card"] = card
+        self.assertEqual(os.listdir(self.working_dir), ["card.encoded"])
+        self.assertEqual(self.read_from("card.encoded"),
+                         standard_replicator.serialize(card))
+
+    def test_failed_write_keeps_value(self):
+        for filespace in [self.filespace, Filespace(self.working_dir)]:
+            filespace["value"] = [1, 2]
+            with self.assertRaises(TypeError):
+                filespace["value"] = [1, object()]
+        self.assertEqual(os.listdir(self.working_dir), ["value.encoded"])
+
+    def test_replaces_other_suffix(self):
+        for atomic in [False, True]:
+            filespace = Filespace(self.working_dir, atomic=atomic)
+            filespace["x"] = "text"
+            filespace["x"] = examples.Card(1, 'clubs')
+            self.assertEqual(os.listdir(self.working_dir), ["x.encoded"])
+            filespace["x"] = "text"
+            self.assertEqual(os.listdir(self.working_dir), ["x"])
+
+    def test_permissions(self):
+        def mode(name):
+            return stat.S_IMODE(os.stat(os.path.join(self.working_dir,
+                                                     name)).st_mode)
+
+        Filespace(self.working_dir)["plain"] = "text"
+        self.filespace["atomic"] = "text"
+        self.assertEqual(mode("atomic"), mode("plain"))
+
+        os.chmod(os.path.join(self.working_dir, "atomic"), 0o640)
+        self.filespace["atomic"] = "more text"
+        self.assertEqual(mode("atomic"), 0o640)
+        # a file replacing one of another suffix keeps its permissions
+        self.filespace["atomic"] = examples.Card(1, 'clubs')
+        self.assertEqual(mode("atomic.encoded"), 0o640)
+
+        # the umask is that of the time the file is created
+        umask = os.umask(0o077)
+        try:
+            self.filespace["private"] = "text"
+        finally:
+            os.umask(umask)
+        self.assertEqual(mode("private"), 0o600)
+
+    def test_encode_strs(self):
+        Filespace(self.working_dir, encode_strs=True)["s"] = "text"
+        self.assertEqual(os.listdir(self.working_dir), ["s.encoded"])
+        self.assertEqual(self.filespace["s"], "text")
+
+    def test_fsync_policy(self):
+        filespace = Filespace(self.working_dir, atomic=True, fsync=FSYNC_FULL)
+        with mock.patch('os.fsync') as fsync:
+            filespace["a"] = "a"
+        # the file and then its directory
+        self.assertEqual(fsync.call_count, 2)
+        with mock.patch('os.fsync') as fsync:
+            filespace.put_many({str(i): str(i) for i in range(5)})
+        self.assertEqual(fsync.call_count, 6)
+        self.assertEqual(sorted(filespace.keys()),
+                         ["0", "1", "2", "3", "4", "a"])
+
+
+class GroupCommit(FilespaceTestCase):
+    def test_commit(self):
+        with self.filespace.group_commit():
+            self.filespace["x"] = "text"
+            self.filespace["card"] = examples.Card(1, 'clubs')
+            self.filespace["x"] = examples.Card(2, 'clubs')
+            self.assertEqual(list(self.filespace.keys()), [])
+        self.assertEqual(sorted(os.listdir(self.working_dir)),
+                         ["card.encoded", "x.encoded"])
+        self.assertEqual(self.filespace["x"], examples.Card(2, 'clubs'))
+
+    def test_discard(self):
+        self.filespace["x"] = "old"
+        with self.assertRaises(KeyError):
+            with self.filespace.group_commit():
+                self.filespace["x"] = "new"
+                self.filespace["y"] = "new"
+                raise KeyError("y")
+        self.assertEqual(os.listdir(self.working_dir), ["x"])
+        self.assertEqual(self.filespace["x"], "old")
+
+
+class CachedFilespace(FilespaceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache = LRUCache(16)
+        self.filespace = Filespace(self.working_dir, cache=self.cache)
+
+    def test_read_through(self):
+        card = examples.Card(1, 'clubs')
+        self.filespace["card"] = card
+        with mock.patch.object(standard_replicator, 'load',
+                               wraps=standard_replicator.load) as load:
+            for _ in range(3):
+                self.assertEqual(self.filespace["card"], card)
+        self.assertEqual(load.call_count, 1)
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 1))
+
+    def test_changed_file(self):
+        self.write_to("text", "old")
+        self.assertEqual(self.filespace["text"], "old")
+        self.write_to("text", "newer")
+        self.assertEqual(self.filespace["text"], "newer")
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+
+    def test_own_writes(self):
+        self.filespace["text"] = "old"
+        self.assertEqual(self.filespace["text"], "old")
+        self.filespace["text"] = "new"
+        self.assertEqual(self.filespace["text"], "new")
+        self.filespace["text"] = examples.Card(1, 'clubs')
+        self.assertEqual(self.filespace["text"], examples.Card(1, 'clubs'))
+        del self.filespace["text"]
+        self.assertNotIn("text", self.filespace)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_threads(self):
+        cache = ExclusiveCache(8)
+        filespace = Filespace(self.working_dir, cache=cache)
+        subspace = filespace["sub"]
+        errors = []
+
+        def work(n):
+            try:
+                for i in range(20):
+                    space = subspace if i % 2 else filespace
+                    key = '{}-{}'.format(n, i % 4)
+                    space[key] = key * i
+                    self.assertEqual(space[key], key * i)
+                    if i % 5 == 0:
+                        del space[key]
+            except BaseException as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=work, args=(n, ))
+                   for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertFalse(cache.overlapped)
+
+    def test_subspaces(self):
+        tiered = TieredCache(LRUCache(1), Cache())
+        for cache in [self.cache, tiered]:
+            with self.subTest(cache=cache):
+                filespace = Filespace(self.working_dir, cache=cache)
+                filespace["sub"]["text"] = "text"
+                self.assertEqual(filespace["sub"]["text"], "text")
+                self.assertEqual(filespace["sub/text"], "text")
+                self.assertEqual(len(cache), 1)
+                del filespace["sub"]
+                self.assertEqual(len(cache), 0)
+                self.assertNotIn(os.path.join(self.working_dir, "sub",
+                                              "text"), cache)
@@ -0,0 +1,138 @@
+"""
+unit tests for preserving shared references and cycles
+"""
+
+import json
+import unittest
+
+from replicate import binary, examples
+from replicate.composer import Composer
+from replicate.replicator import Replicator
+
+
+class Node(examples.Replicable):
+    """
+    a mutable node of a graph
+    """
+    @examples.preprocessor
+    def preprocess(name, children):
+        pass
+
+
+class IdentityPreservation(unittest.TestCase):
+    """
+    test replicating graphs of objects with preserve_identity
+    """
+    def setUp(self):
+        self.replicator = Replicator(preserve_identity=True)
+
+    def test_shared_references(self):
+        card = examples.Card(1, 'clubs')
+        deck = examples.Deck([card, card], 'Acme')
+        replicated = self.replicator.replicate([deck, deck, card])
+        self.assertEqual(replicated, [deck, deck, card])
+        self.assertIs(replicated[0], replicated[1])
+        self.assertIs(replicated[0].cards[0], replicated[0].cards[1])
+        self.assertIs(replicated[0].cards[0], replicated[2])
+
+    def test_size_linear_in_unique_objects(self):
+        card = examples.Card(1, 'clubs')
+        shared = [card] * 1000
+        encoded = json.loads(self.replicator.serialize(shared))
+        self.assertEqual(encoded['parts'][0]['type'],
+                         'replicate.examples.Card')
+        self.assertEqual(encoded['parts'][1:], [{'ref': 1}] * 999)
+
+        # a chain of pairs of references grows exponentially without it
+        o = card
+        for _ in range(30):
+            o = [o, o]
+        self.assertLess(len(self.replicator.serialize(o)), 2000)
+
+    def test_cycles(self):
+        root = Node('root', [])
+        child = Node('child', [root])
+        root.children.append(child)
+        root.children.append(root)
+
+        replicated = self.replicator.replicate(root)
+        self.assertIsNot(replicated, root)
+        self.assertEqual(replicated.name, 'root')
+        replicated_child, same_root = replicated.children
+        self.assertIs(same_root, replicated)
+        self.assertEqual(replicated_child.name, 'child')
+        self.assertIs(replicated_child.children[0], replicated)
+
+    def test_cyclic_lists(self):
+        o = [1]
+        o.append(o)
+        replicated = self.replicator.replicate(o)
+        self.assertEqual(replicated[0], 1)
+        self.assertIs(replicated[1], replicated)
+
+    def test_cycle_through_tuple(self):
+        o = []
+        o.append((o, ))
+        encoded = self.replicator.serialize(o)
+        # the list is allocated first so the cycle can be rebuilt
+        replicated = self.replicator.deserialize(encoded)
+        self.assertIs(replicated[0][0], replicated)
+
+        t = ([], )
+        t[0].append(t)
+        with self.assertRaises(ValueError):
+            self.replicator.replicate(t)
+
+    def test_deep_graphs(self):
+        # deeper than the max_depth of the direct path
+        node = Node('leaf', [])
+        for i in range(2000):
+            node = Node(str(i), [node, node])
+        binary_replicator = Replicator(serializer=binary.dumps,
+                                       deserializer=binary.loads,
+                                       preserve_identity=True)
+        replicated = binary_replicator.replicate(node)
+        for _ in range(1000):
+            self.assertIs(replicated.children[0], replicated.children[1])
+            replicated = replicated.children[0]
+        self.assertEqual(replicated.name, '999')
+
+        chain = examples.Card(1, 'clubs')
+        for _ in range(300):
+            chain = (chain, [chain])
+        replicated = self.replicator.replicate(chain)
+        for _ in range(300):
+            self.assertIs(replicated[0], replicated[1][0])
+            replicated = replicated[0]
+        self.assertEqual(replicated, examples.Card(1, 'clubs'))
+
+    def test_dicts_like_references(self):
+        o = Node('node', {'ref': 0})
+        replicated = self.replicator.replicate([o, o])
+        self.assertEqual(replicated[0].children, {'ref': 0})
+        self.assertIs(replicated[0], replicated[1])
+
+    def test_invalid_reference(self):
+        with self.assertRaises(ValueError):
+            self.replicator.deserialize(json.dumps({'ref': 0}))
+
+    def test_other_formats(self):
+        replicator = Replicator(serializer=binary.dumps,
+                                deserializer=binary.loads,
+                                preserve_identity=True)
+        card = examples.Card(1, 'clubs')
+        replicated = replicator.replicate([card, card])
+        self.assertIs(replicated[0], replicated[1])
+
+    def test_requires_direct_codec(self):
+        class TracingComposer(Composer):
+            def decompose(self, o):
+                return (yield from super().decompose(o))
+
+        with self.assertRaises(ValueError):
+            Replicator(composer=TracingComposer(), preserve_identity=True)
+
+    def test_without_identity(self):
+        card = examples.Card(1, 'clubs')
+        replicated = Replicator().replicate([card, card])
+        self.assertIsNot(replicated[0], replicated[1])
@@ -0,0 +1,134 @@
+"""
+unit tests for lazy decoding
+"""
+
+import io
+import shutil
+import tempfile
+import unittest
+
+from replicate import binary, examples
+from replicate.filespace import Filespace
+from replicate.lazy import is_proxy, materialize
+from replicate.replicable import preprocessor, Replicable
+from replicate.replicator import Replicator
+
+
+class Renamed(Replicable):
+    """
+    a replicable registered under an identifier other than its default one
+    """
+    @classmethod
+    def get_cls_identifier(cls):
+        return 'lazily.renamed'
+
+    @preprocessor
+    def preprocess(value):
+        pass
+
+
+class LazyDecoding(unittest.TestCase):
+    """
+    test decoding replicables as proxies
+    """
+    def setUp(self):
+        self.replicator = Replicator(lazy=True)
+        self.deck = examples.Deck([examples.Card(rank, 'clubs')
+                                   for rank in range(10)], 'Acme')
+        self.encoded = self.replicator.serialize(self.deck)
+
+    def test_looks_like_the_class(self):
+        deck = self.replicator.deserialize(self.encoded)
+        self.assertTrue(is_proxy(deck))
+        self.assertIsInstance(deck, examples.Deck)
+        self.assertEqual(type(deck).__name__, 'Deck')
+
+    def test_materializes_on_attribute_access(self):
+        deck = self.replicator.deserialize(self.encoded)
+        self.assertEqual(deck.brand, 'Acme')
+        self.assertFalse(is_proxy(deck))
+        self.assertIs(type(deck), examples.Deck)
+        # parts which are replicables stay lazy
+        self.assertTrue(all(map(is_proxy, deck.cards)))
+        self.assertEqual(deck.cards[3].rank, 3)
+        self.assertTrue(is_proxy(deck.cards[4]))
+
+    def test_equality(self):
+        self.assertEqual(self.replicator.deserialize(self.encoded),
+                         self.deck)
+        self.assertEqual(self.deck,
+                         self.replicator.deserialize(self.encoded))
+        self.assertFalse(self.replicator.deserialize(self.encoded) !=
+                         self.deck)
+        card = examples.Card(1, 'clubs')
+        self.assertEqual(hash(self.replicator.replicate(card)), hash(card))
+
+    def test_methods_and_setters(self):
+        card = examples.Card(1, 'clubs')
+        hand = self.replicator.replicate(examples.Hand('Ann', card, card,
+                                                       card))
+        self.assertTrue(is_proxy(hand))
+        self.assertEqual(hand.parts, {'player': 'Ann',
+                                      'cards': (card, card, card)})
+
+        card = self.replicator.replicate(examples.Card(1, 'clubs'))
+        card.rank = 2
+        self.assertEqual(card, examples.Card(2, 'clubs'))
+
+    def test_serializing_proxies(self):
+        deck = self.replicator.deserialize(self.encoded)
+        self.assertEqual(Replicator().serialize(deck), self.encoded)
+
+    def test_custom_identifiers(self):
+        renamed = [Renamed(1), Renamed(2)]
+        encoded = Replicator().serialize(renamed)
+        binary_replicator = Replicator(serializer=binary.dumps,
+                                       deserializer=binary.loads)
+        for replicator in [Replicator(), binary_replicator]:
+            with self.subTest(binary=replicator.binary):
+                expected = replicator.serialize(renamed)
+                proxies = self.replicator.deserialize(encoded)
+                self.assertTrue(is_proxy(proxies[0]))
+                self.assertEqual(replicator.serialize(proxies), expected)
+
+                # the streaming writers
+                proxies = self.replicator.deserialize(encoded)
+                f = io.BytesIO() if replicator.binary else io.StringIO()
+                replicator.dump(proxies, f)
+                self.assertEqual(f.getvalue(), expected)
+                f.seek(0)
+                reloaded = replicator.load(f)
+                self.assertEqual(reloaded, renamed)
+                self.assertIs(type(reloaded[0]), Renamed)
+
+    def test_failed_materialization(self):
+        encoded = self.encoded.replace('"rank": 0, ', '')
+        deck = self.replicator.deserialize(encoded)
+        card = deck.cards[0]
+        with self.assertRaises(KeyError):
+            materialize(card)
+        self.assertTrue(is_proxy(card))
+        self.assertEqual(deck.cards[1].rank, 1)
+
+    def test_options(self):
+        with self.assertRaises(ValueError):
+            Replicator(lazy=True, preserve_identity=True)
+
+
+class LazyFilespace(unittest.TestCase):
+    """
+    test loading files lazily
+    """
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def test_load(self):
+        deck = examples.Deck([examples.Card(1, 'clubs')], 'Acme')
+        Filespace(self.working_dir)['deck'] = deck
+        filespace = Filespace(self.working_dir, Replicator(lazy=True))
+        loaded = filespace['deck']
+        self.assertTrue(is_proxy(loaded))
+        self.assertEqual(loaded, deck)
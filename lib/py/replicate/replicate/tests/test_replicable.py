@@ -0,0 +1,134 @@
+"""
+unit tests for the replicable module
+"""
+
+import unittest
+
+from replicate import examples
+from replicate.replicable import (preprocessor, primary_preprocessor,
+                                  Replicable)
+
+
+class Counter(Replicable):
+    """
+    a replicable whose preprocessor transforms its arguments
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.initialized = True
+
+    @preprocessor
+    def preprocess(count, **labels):
+        return dict(count=count, labels=labels, doubled=2 * count)
+
+
+class CompiledClasses(unittest.TestCase):
+    """
+    test the reflection done when replicable classes are created
+    """
+    def test_primary_preprocessor(self):
+        hand = examples.Hand('Ann')
+        self.assertIs(hand.primary_preprocessor,
+                      examples.Hand.__dict__['preprocess'].__func__)
+        self.assertEqual(len(list(hand.preprocessors)), 2)
+
+    def test_parts(self):
+        card = examples.Card(1, 'clubs')
+        self.assertEqual(card.parts, {'rank': 1, 'suit': 'clubs'})
+        self.assertEqual(examples.Hand('Ann', card).parts,
+                         {'player': 'Ann', 'cards': (card, )})
+        self.assertEqual(Counter(3, color='red').parts,
+                         {'count': 3, 'labels': {'color': 'red'}})
+
+    def test_parts_setter(self):
+        card = examples.Card(1, 'clubs')
+        card.parts = {'rank': 2}
+        self.assertEqual(card.parts, {'rank': 2})
+
+    def test_from_parts(self):
+        card = examples.Card(1, 'clubs')
+        self.assertEqual(examples.Hand.from_parts({'player': 'Ann',
+                                                   'cards': [card]}),
+                         examples.Hand('Ann', card))
+        counter = Counter.from_parts({'count': 3,
+                                      'labels': {'color': 'red'}})
+        self.assertEqual((counter.doubled, counter.labels),
+                         (6, {'color': 'red'}))
+        self.assertTrue(counter.initialized)
+
+    def test_from_parts_in_place(self):
+        card = examples.Card.__new__(examples.Card)
+        self.assertIs(examples.Card.from_parts({'rank': 1, 'suit': 'clubs'},
+                                               card), card)
+        self.assertEqual(card, examples.Card(1, 'clubs'))
+        counter = Counter.__new__(Counter)
+        Counter.from_parts({'count': 3, 'labels': {}}, counter)
+        self.assertEqual((counter.doubled, counter.initialized), (6, True))
+
+
+class Point(Replicable):
+    """
+    a replicable with defaults and several preprocessors
+    """
+    @primary_preprocessor
+    def preprocess(x, y=0, *rest, **labels):
+        pass
+
+    @preprocessor
+    def preprocess_polar(r, theta, polar):
+        return dict(x=r, y=theta)
+
+
+class Segment(Replicable):
+    """
+    a replicable whose defaults are containers
+    """
+    @primary_preprocessor
+    def preprocess(start, end=(1, 2), options={'closed': True}):
+        pass
+
+
+class Dispatch(unittest.TestCase):
+    """
+    test the selection of preprocessors and binding of their arguments
+    """
+    def test_binding(self):
+        point = Point(1)
+        self.assertEqual(point.parts,
+                         {'x': 1, 'y': 0, 'rest': (), 'labels': {}})
+        point = Point(1, 2, 3, 4, color='red')
+        self.assertEqual(point.parts, {'x': 1, 'y': 2, 'rest': (3, 4),
+                                       'labels': {'color': 'red'}})
+        self.assertEqual(Point(y=2, x=1).parts,
+                         {'x': 1, 'y': 2, 'rest': (), 'labels': {}})
+
+    def test_container_defaults(self):
+        self.assertEqual(Segment(0).parts, {
+            'start': 0, 'end': (1, 2), 'options': {'closed': True}})
+        self.assertEqual(Segment(0, ()).parts['end'], ())
+
+    def test_selection(self):
+        # the last matching preprocessor is selected
+        for point in [Point(1, 2, polar=True), Point(1, 2, True)]:
+            self.assertEqual((point.x, point.y), (1, 2))
+            self.assertFalse(hasattr(point, 'polar'))
+            self.assertFalse(hasattr(point, 'rest'))
+        self.assertEqual(Point(1, 2, color='red').rest, ())
+
+    def test_cached_per_shape(self):
+        Point(1, 2)
+        Point(3, 4)
+        Point(1, 2, polar=True)
+        self.assertIn(2, Point._dispatch)
+        self.assertIn((2, frozenset(['polar'])), Point._dispatch)
+        # the binding of cached shapes is not shared between calls
+        self.assertEqual(Point(5, 6).parts['x'], 5)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(TypeError):
+            Point()
+        with self.assertRaises(TypeError):
+            examples.Card(1)
+        # failures are cached too
+        with self.assertRaises(TypeError):
+            examples.Card(1)
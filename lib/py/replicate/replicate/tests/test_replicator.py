@@ -1,3 +1,149 @@
 """
 Test replication of python primitives and Replicables
 """
+
+import json
+import multiprocessing
+import pickle
+import unittest
+from unittest import mock
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from functionals.recursive import CyclicRecursor
+
+from replicate import examples
+from replicate.composer import Composer
+from replicate.direct import DirectCodec
+from replicate.encoder import Encoder
+from replicate.replicable import preprocessor, Replicable
+from replicate.replicator import Replicator
+
+
+class Renamed(Replicable):
+    """
+    a replicable registered under an identifier other than its default one
+    """
+    @classmethod
+    def get_cls_identifier(cls):
+        return 'renamed'
+
+    @preprocessor
+    def preprocess(value):
+        pass
+
+
+class ReplicatorTestCase(unittest.TestCase):
+    """
+    Abstract base class for Replicator tests
+    """
+    def setUp(self):
+        self.replicator = Replicator()
+        composer, encoder = Composer(), Encoder()
+        self.trampoline = CyclicRecursor([composer.decompose, encoder.encode],
+                                         postprocessor=json.dumps)
+
+    def assertReplicates(self, o):
+        self.assertEqual(self.replicator.replicate(o), o)
+
+    def nested(self, depth):
+        o = []
+        for _ in range(depth):
+            o = [o]
+        return o
+
+
+class DirectEncoding(ReplicatorTestCase):
+    """
+    test that the direct codec matches the pseudo-recursive cycles
+    """
+    def test_same_wire_format(self):
+        deck = examples.Deck([examples.Card(rank, suit)
+                              for rank in range(3)
+                              for suit in ['clubs', 'hearts']], 'Acme')
+        for o in [1, 'a', [1, (2, {3})], deck, {'a': 1}]:
+            self.assertEqual(self.replicator.serialize(o),
+                             self.trampoline.recurse(o))
+
+    def test_replicate(self):
+        self.assertReplicates([1, 'a', (2.5, {3})])
+        self.assertReplicates(examples.Deck([examples.Card(1, 'clubs')],
+                                            'Acme'))
+
+    def test_deep_objects_fall_back(self):
+        depth = DirectCodec.max_depth + 10
+        with self.assertRaises(RecursionError):
+            self.replicator.codec.encode(self.nested(depth))
+        self.assertEqual(self.replicator.serialize(self.nested(depth)),
+                         self.trampoline.recurse(self.nested(depth)))
+        self.assertReplicates(self.nested(depth))
+
+    def test_customized_composer_uses_trampoline(self):
+        class TracingComposer(Composer):
+            def decompose(self, o):
+                return (yield from super().decompose(o))
+
+        replicator = Replicator(composer=TracingComposer())
+        self.assertIsNone(replicator.codec)
+        card = examples.Card(1, 'clubs')
+        self.assertEqual(replicator.replicate(card), card)
+
+
+class ParallelReplication(ReplicatorTestCase):
+    """
+    test serializing and deserializing many objects in worker processes
+    """
+    def setUp(self):
+        super().setUp()
+        self.cards = [examples.Card(rank, 'clubs') for rank in range(50)]
+
+    def test_replicator_pickles(self):
+        replicator = pickle.loads(pickle.dumps(self.replicator))
+        self.assertEqual(replicator.replicate(self.cards), self.cards)
+
+    def test_order_and_chunking(self):
+        with ProcessPoolExecutor(2) as executor:
+            encoded = self.replicator.serialize_many(self.cards, executor,
+                                                     chunksize=7)
+            encoded = list(encoded)
+            self.assertEqual(encoded,
+                             list(map(self.replicator.serialize, self.cards)))
+            decoded = self.replicator.deserialize_many(iter(encoded),
+                                                       executor, chunksize=3)
+            self.assertEqual(list(decoded), self.cards)
+
+    def test_default_executor(self):
+        encoded = self.replicator.serialize_many(iter(self.cards))
+        self.assertEqual(list(self.replicator.deserialize_many(encoded)),
+                         self.cards)
+
+    def test_empty(self):
+        with ThreadPoolExecutor(1) as executor:
+            self.assertEqual(list(self.replicator.serialize_many(
+                [], executor)), [])
+
+    def test_max_in_flight(self):
+        with ThreadPoolExecutor(1) as executor:
+            with mock.patch.object(executor, 'submit',
+                                   wraps=executor.submit) as submit:
+                serialized = self.replicator.serialize_many(
+                    iter(self.cards), executor, chunksize=2,
+                    max_in_flight=3)
+                next(serialized)
+                self.assertEqual(submit.call_count, 3)
+                self.assertEqual(len(list(serialized)),
+                                 len(self.cards) - 1)
+
+    def test_custom_registrations_in_fresh_workers(self):
+        renamed = [Renamed(value) for value in range(5)]
+        encoded = list(map(self.replicator.serialize, renamed))
+        self.assertEqual(json.loads(encoded[0])['type'], 'renamed')
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(1, mp_context=context) as executor:
+            self.assertEqual(list(self.replicator.serialize_many(
+                renamed, executor, chunksize=2)), encoded)
+            self.assertEqual(list(self.replicator.deserialize_many(
+                encoded, executor, chunksize=2)), renamed)
+
+    def test_lazy_replicators(self):
+        with self.assertRaises(ValueError):
+            Replicator(lazy=True).deserialize_many([])
@@ -0,0 +1,135 @@
+"""
+unit tests for streaming serialization
+"""
+
+import functools
+import io
+import json
+import unittest
+from unittest import mock
+
+from replicate import examples
+from replicate.composer import Composer
+from replicate.direct import DirectCodec
+from replicate.encoder import Encoder
+from replicate.replicator import Replicator
+from replicate.streaming import JSONStreamCodec
+
+
+class OneCharAtATime(io.StringIO):
+    """
+    a file returning at most one character per read
+    """
+    def read(self, size=-1):
+        return super().read(1)
+
+
+class Streaming(unittest.TestCase):
+    """
+    test dumping objects to files and loading them back
+    """
+    def setUp(self):
+        self.replicator = Replicator()
+        self.deck = examples.Deck([examples.Card(rank, suit)
+                                   for rank in range(20)
+                                   for suit in ['clubs', 'h\xe9arts']],
+                                  'Acme')
+        self.values = [1, -2.5, 1e300, 'a"b', None, True, [1, [2, (3, )]],
+                       {3}, self.deck,
+                       examples.Hand('Ann', examples.Card(1, 'clubs')),
+                       examples.Card(10 ** 30, 'clubs')]
+
+    def dump(self, o):
+        f = io.StringIO()
+        self.replicator.dump(o, f)
+        return f.getvalue()
+
+    def test_uses_streaming_codec(self):
+        self.assertTrue(self.replicator.codec.streams)
+        self.assertFalse(Replicator(serializer=json.dumps,
+                                    deserializer=json.loads,
+                                    composer=type('C', (Composer, ), {
+                                        'decompose': lambda self, o: o})()
+                                    ).codec)
+
+    def test_same_as_serialize(self):
+        for o in self.values + [{'a': [1, 2]}]:
+            self.assertEqual(self.dump(o), self.replicator.serialize(o))
+
+    def test_round_trip(self):
+        for o in self.values:
+            self.assertEqual(self.replicator.load(io.StringIO(self.dump(o))),
+                             o)
+
+    def test_tokens_split_across_chunks(self):
+        for o in self.values:
+            f = OneCharAtATime(self.dump(o))
+            self.assertEqual(self.replicator.load(f), o)
+
+    def test_indented_json(self):
+        replicator = Replicator(
+            serializer=functools.partial(json.dumps, indent=4))
+        self.assertIsInstance(replicator.codec, JSONStreamCodec)
+        for o in self.values + [examples.Deck([], ''), [[], [[1], ()]]]:
+            f = io.StringIO()
+            replicator.dump(o, f)
+            self.assertEqual(f.getvalue(), replicator.serialize(o))
+            self.assertEqual(replicator.load(io.StringIO(f.getvalue())), o)
+        self.assertIs(type(Replicator(serializer=functools.partial(
+            json.dumps, sort_keys=True)).codec), DirectCodec)
+
+    def test_long_scalars(self):
+        self.replicator.codec.chunk_size = 16
+        for o in ['x' * 10000, 10 ** 4000, ['a' * 5000, 'b' * 5000]]:
+            f = io.StringIO(self.dump(o))
+            with mock.patch.object(f, 'read', wraps=f.read) as read:
+                self.assertEqual(self.replicator.load(f), o)
+            # the reads grow with the scalar rather than one chunk at a time
+            self.assertLess(read.call_count, 40)
+
+    def test_whitespace(self):
+        text = json.dumps(json.loads(self.dump(self.deck)), indent=4)
+        self.assertEqual(self.replicator.load(io.StringIO(text)), self.deck)
+
+    def test_deep_objects(self):
+        o = []
+        for _ in range(10000):
+            o = [o]
+        f = io.StringIO()
+        self.replicator.dump(o, f)
+        f.seek(0)
+        loaded = self.replicator.load(f)
+        for _ in range(10000):
+            self.assertEqual(len(loaded), 1)
+            loaded = loaded[0]
+        self.assertEqual(loaded, [])
+
+    def test_invalid_json(self):
+        for text in ['', '[1, 2', '[1 2]', '{"a" 1}', '{1: 2}', '[1]]',
+                     '"abc', 'tru']:
+            with self.assertRaises(json.JSONDecodeError):
+                self.replicator.load(io.StringIO(text))
+
+    def test_write_in_chunks(self):
+        writes = []
+
+        class Sink(object):
+            def write(self, text):
+                writes.append(text)
+
+        codec = JSONStreamCodec(Composer(), Encoder())
+        deck = examples.Deck([examples.Card(rank, 'clubs')
+                              for rank in range(2000)], 'Acme')
+        codec.dump(deck, Sink())
+        self.assertGreater(len(writes), 1)
+        self.assertEqual(''.join(writes), self.replicator.serialize(deck))
+
+    def test_non_streaming_formats(self):
+        replicator = Replicator(serializer=json.dumps,
+                                deserializer=json.loads,
+                                encoder=type('E', (Encoder, ), {
+                                    'encode': Encoder.encode})())
+        f = io.StringIO()
+        replicator.dump(self.deck, f)
+        f.seek(0)
+        self.assertEqual(replicator.load(f), self.deck)